@@ -166,7 +166,11 @@ if SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY:
 # EMAIL (Gmail SMTP)
 # =============================================================================
 
-EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+# Transactional mail is queued in the outbox and sent by `manage.py run_outbox`.
+# Locally, use django.core.mail.backends.console.EmailBackend or
+# django.core.mail.backends.filebased.EmailBackend (writes to EMAIL_FILE_PATH).
+EMAIL_BACKEND = os.getenv('EMAIL_BACKEND', 'django.core.mail.backends.smtp.EmailBackend')
+EMAIL_FILE_PATH = os.getenv('EMAIL_FILE_PATH', str(BASE_DIR / 'sent_emails'))
 EMAIL_HOST = 'smtp.gmail.com'
 EMAIL_PORT = 587
 EMAIL_USE_TLS = True
@@ -181,6 +185,11 @@ DEFAULT_FROM_EMAIL = os.getenv('DEFAULT_FROM_EMAIL', EMAIL_HOST_USER)
 
 RAZORPAY_KEY_ID = os.getenv('RAZORPAY_KEY_ID', '')
 RAZORPAY_KEY_SECRET = os.getenv('RAZORPAY_KEY_SECRET', '')
+# Point at `manage.py razorpay_simulator` (e.g. http://127.0.0.1:8765) to load-test offline
+RAZORPAY_BASE_URL = os.getenv('RAZORPAY_BASE_URL') or None
+RAZORPAY_CONNECT_TIMEOUT = float(os.getenv('RAZORPAY_CONNECT_TIMEOUT', '3.05'))
+RAZORPAY_READ_TIMEOUT = float(os.getenv('RAZORPAY_READ_TIMEOUT', '10'))
+RAZORPAY_POOL_SIZE = int(os.getenv('RAZORPAY_POOL_SIZE', '10'))
 
 
 # =============================================================================
@@ -224,6 +233,12 @@ SHIPPING_COST = int(os.getenv('SHIPPING_COST', '50'))
 # H7: Configurable country default
 DEFAULT_COUNTRY = os.getenv('DEFAULT_COUNTRY', 'India')
 
+# Shop pagination: 'offset' (numbered pages) or 'cursor' (keyset, no COUNT/OFFSET)
+SHOP_PAGINATION = os.getenv('SHOP_PAGINATION', 'offset')
+
+# How long checkout holds cart stock while the customer pays
+STOCK_RESERVATION_TTL = int(os.getenv('STOCK_RESERVATION_TTL', '900'))  # 15 minutes
+
 # Token expiry settings
 VERIFICATION_TOKEN_EXPIRY_HOURS = 24
 OTP_EXPIRY_SECONDS = 600  # 10 minutes
@@ -1,8 +1,10 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from django.db.models import DecimalField, F, Sum
 from .models import (
     User, Address, Category, SubCategory, Product, Cart, CartItem,
-    Wishlist, Coupon, CouponUsage, Order, OrderItem, Review, ContactMessage
+    Wishlist, Coupon, CouponUsage, Order, OrderItem, Review, ContactMessage,
+    OutboxEmail,
 )
 
 # M8: Inline for viewing user addresses in admin
@@ -46,11 +48,12 @@ class SubCategoryAdmin(admin.ModelAdmin):
 
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
-    list_display = ['name', 'category', 'price', 'original_price', 'stock', 'is_active']
+    list_display = ['name', 'category', 'price', 'original_price', 'stock', 'rating_avg', 'is_active']
     list_filter = ['category', 'is_active', 'created_at']
     search_fields = ['name', 'description']
     prepopulated_fields = {'slug': ('name',)}
     list_editable = ['price', 'stock', 'is_active']
+    readonly_fields = ['rating_avg', 'rating_count', 'rating_histogram']
 
 
 class CartItemInline(admin.TabularInline):
@@ -63,6 +66,21 @@ class CartAdmin(admin.ModelAdmin):
     list_display = ['user', 'total_items', 'subtotal', 'updated_at']
     inlines = [CartItemInline]
 
+    def get_queryset(self, request):
+        # Totals for the whole changelist page in the same query
+        return super().get_queryset(request).select_related('user').annotate(
+            _total_items=Sum('items__quantity'),
+            _subtotal=Sum(F('items__quantity') * F('items__product__price'), output_field=DecimalField()),
+        )
+
+    @admin.display(description='Total items', ordering='_total_items')
+    def total_items(self, obj):
+        return obj._total_items or 0
+
+    @admin.display(description='Subtotal', ordering='_subtotal')
+    def subtotal(self, obj):
+        return obj._subtotal or 0
+
 
 @admin.register(Wishlist)
 class WishlistAdmin(admin.ModelAdmin):
@@ -111,3 +129,11 @@ class ContactMessageAdmin(admin.ModelAdmin):
     list_display = ['name', 'email', 'subject', 'is_read', 'created_at']
     list_filter = ['is_read', 'created_at']
     list_editable = ['is_read']
+
+
+@admin.register(OutboxEmail)
+class OutboxEmailAdmin(admin.ModelAdmin):
+    list_display = ['subject', 'status', 'attempts', 'next_attempt_at', 'created_at', 'sent_at']
+    list_filter = ['status', 'created_at']
+    search_fields = ['subject', 'recipients']
+    readonly_fields = ['subject', 'body', 'from_email', 'recipients', 'sensitive', 'attempts', 'last_error', 'created_at', 'sent_at']
@@ -0,0 +1,91 @@
+"""
+Amanzon Catalog Caching
+
+Shared helpers for caches derived from catalog data. Cached entries are
+keyed by a catalog version number that signal handlers bump whenever a
+catalog row changes, so stale entries are simply never read again and
+expire on their own TTL.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import time
+from typing import Any, Callable, Mapping, Optional
+
+from django.core.cache import cache
+
+CATALOG_VERSION_KEY = 'catalog:version'
+LISTING_CACHE_TIMEOUT = 60 * 15
+
+
+def get_version(key: str) -> int:
+    """Return the version number stored under ``key``, initialising it if missing."""
+    version = cache.get(key)
+    if version is None:
+        # Time-based seed so a cache flush never reuses an old version number
+        cache.add(key, int(time.time() * 1000), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(key: str) -> int:
+    """Move the version number stored under ``key`` forward and return it."""
+    try:
+        return cache.incr(key)
+    except ValueError:
+        return get_version(key)
+
+
+def get_catalog_version() -> int:
+    """Return the current catalog version, initialising it if missing."""
+    return get_version(CATALOG_VERSION_KEY)
+
+
+def bump_catalog_version() -> None:
+    """Invalidate every catalog-derived cache entry."""
+    bump_version(CATALOG_VERSION_KEY)
+
+
+def filter_signature(params: Mapping[str, Any]) -> str:
+    """
+    Stable hash of a set of filter parameters.
+
+    Empty values are dropped and keys sorted, so equivalent filter sets
+    produce the same signature regardless of query-string order.
+    """
+    normalized = '&'.join(
+        f'{key}={str(value).strip()}'
+        for key, value in sorted(params.items())
+        if value not in (None, '')
+    )
+    return hashlib.sha1(normalized.encode()).hexdigest()
+
+
+def catalog_key(prefix: str, params: Mapping[str, Any]) -> str:
+    """Cache key for ``params`` under the current catalog version."""
+    return f'{prefix}:{get_catalog_version()}:{filter_signature(params)}'
+
+
+def get_or_build(prefix: str, params: Mapping[str, Any], builder: Callable[[], Any], timeout: int) -> Any:
+    """Return the cached value for ``params``, building and storing it on a miss."""
+    key = catalog_key(prefix, params)
+    value = cache.get(key)
+    if value is None:
+        value = builder()
+        cache.set(key, value, timeout)
+    return value
+
+
+def hydrate_products(ids: list[int], queryset: Optional[Any] = None) -> list:
+    """
+    Load products by primary key, preserving the order of ``ids``.
+
+    Ids whose product has since disappeared are skipped.
+    """
+    from .models import Product
+
+    if queryset is None:
+        queryset = Product.objects.select_related('category', 'subcategory')
+    products = queryset.in_bulk(ids)
+    return [products[pk] for pk in ids if pk in products]
@@ -0,0 +1,126 @@
+"""
+Amanzon Category Tree
+
+Categories and subcategories change rarely but are read on most pages.
+Each worker process keeps an immutable snapshot of the tree, with active
+product counts, and reloads it when the shared version number in the
+cache moves. ``store.signals`` bumps that version on category, subcategory
+and product edits, so the per-request cost is a single cache read.
+
+The version only reaches other workers through a shared cache backend.
+With the default per-process LocMemCache, and for bulk updates that skip
+signals, a snapshot is also reloaded after ``TREE_TTL`` seconds.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from typing import Mapping, Optional
+
+from django.db.models import Count
+
+from . import caching
+
+CATEGORY_VERSION_KEY = 'catalog:categories:version'
+TREE_TTL = 60 * 5
+
+_tree: Optional['CategoryTree'] = None
+_lock = threading.Lock()
+
+
+@dataclass(frozen=True)
+class SubCategoryNode:
+    id: int
+    name: str
+    slug: str
+    category_id: int
+    product_count: int = 0
+
+
+@dataclass(frozen=True)
+class CategoryNode:
+    id: int
+    name: str
+    slug: str
+    product_count: int = 0
+    subcategories: tuple[SubCategoryNode, ...] = ()
+
+    def __str__(self):
+        return self.name
+
+
+@dataclass(frozen=True)
+class CategoryTree:
+    """Read-only snapshot of all categories, in display order."""
+    version: int
+    loaded_at: float
+    categories: tuple[CategoryNode, ...]
+    by_slug: Mapping[str, CategoryNode] = field(default_factory=dict)
+    by_id: Mapping[int, CategoryNode] = field(default_factory=dict)
+
+    def get(self, slug: str) -> Optional[CategoryNode]:
+        return self.by_slug.get(slug)
+
+    def is_fresh(self, version: int) -> bool:
+        return self.version == version and time.monotonic() - self.loaded_at < TREE_TTL
+
+
+def load_tree(version: int) -> CategoryTree:
+    """Build a tree snapshot from the database (three queries)."""
+    from .models import Category, Product, SubCategory
+
+    category_counts: dict[int, int] = {}
+    subcategory_counts: dict[int, int] = {}
+    rows = (
+        Product.objects.filter(is_active=True)
+        .values('category_id', 'subcategory_id')
+        .annotate(n=Count('id'))
+        .order_by()
+    )
+    for row in rows:
+        category_counts[row['category_id']] = category_counts.get(row['category_id'], 0) + row['n']
+        if row['subcategory_id'] is not None:
+            subcategory_counts[row['subcategory_id']] = row['n']
+
+    subcategories: dict[int, list[SubCategoryNode]] = {}
+    for sub in SubCategory.objects.values('id', 'name', 'slug', 'category_id'):
+        subcategories.setdefault(sub['category_id'], []).append(
+            SubCategoryNode(product_count=subcategory_counts.get(sub['id'], 0), **sub)
+        )
+
+    categories = tuple(
+        CategoryNode(
+            product_count=category_counts.get(cat['id'], 0),
+            subcategories=tuple(subcategories.get(cat['id'], ())),
+            **cat,
+        )
+        for cat in Category.objects.values('id', 'name', 'slug')
+    )
+    return CategoryTree(
+        version=version,
+        loaded_at=time.monotonic(),
+        categories=categories,
+        by_slug=MappingProxyType({c.slug: c for c in categories}),
+        by_id=MappingProxyType({c.id: c for c in categories}),
+    )
+
+
+def get_tree() -> CategoryTree:
+    """Return this process's tree, reloading it if stale."""
+    global _tree
+    version = caching.get_version(CATEGORY_VERSION_KEY)
+    tree = _tree
+    if tree is None or not tree.is_fresh(version):
+        with _lock:
+            tree = _tree
+            if tree is None or not tree.is_fresh(version):
+                tree = _tree = load_tree(version)
+    return tree
+
+
+def invalidate() -> None:
+    """Make every worker reload its tree on its next request."""
+    caching.bump_version(CATEGORY_VERSION_KEY)
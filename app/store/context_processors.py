@@ -1,24 +1,29 @@
 """Context processor for cart and wishlist counts."""
 
-from django.db.models import Sum
+from django.utils.functional import SimpleLazyObject
+
+from . import services
 
 
 def cart_wishlist_count(request):
-    """Add cart and wishlist counts to all templates."""
+    """
+    Add cart and wishlist counts to all templates.
+    
+    The counts are lazy: they are only looked up (from the per-user cache,
+    see services.get_user_counts) if the template actually renders them.
+    """
     cart_count = 0
     wishlist_count = 0
+    # Page cache shells are user-neutral; counts are overlaid per request
+    page_shell = getattr(request, 'page_shell', False)
     
-    if request.user.is_authenticated:
-        # CQ-01: Use aggregation to avoid N+1 query
-        if hasattr(request.user, 'cart'):
-            result = request.user.cart.items.aggregate(total=Sum('quantity'))
-            cart_count = result['total'] or 0
-        
-        # Get wishlist count
-        wishlist_count = request.user.wishlist.count()
+    if request.user.is_authenticated and not page_shell:
+        counts = SimpleLazyObject(lambda: services.get_user_counts(request.user))
+        cart_count = SimpleLazyObject(lambda: counts['cart'])
+        wishlist_count = SimpleLazyObject(lambda: counts['wishlist'])
     
     return {
         'cart_count': cart_count,
         'wishlist_count': wishlist_count,
+        'page_shell': page_shell,
     }
-
@@ -0,0 +1,121 @@
+"""
+Amanzon Coupon Registry
+
+Coupons are looked up on every cart and checkout view. Each worker keeps
+the active coupons in a dict keyed by normalized code and reloads it when
+``store.signals`` bumps the shared version on a ``Coupon`` save or delete
+(or after ``REGISTRY_TTL`` seconds, for bulk updates that skip signals).
+
+Each user's set of used coupon ids is cached too and dropped when a
+``CouponUsage`` row is written, so revalidating the session coupon on a
+page view costs no queries.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import TYPE_CHECKING, Mapping, Optional
+
+from django.core.cache import cache
+
+from . import caching
+
+if TYPE_CHECKING:
+    from .models import Coupon, User
+
+COUPON_VERSION_KEY = 'coupons:version'
+REGISTRY_TTL = 60 * 5
+USAGE_CACHE_TIMEOUT = 60 * 60
+
+_registry: Optional['CouponRegistry'] = None
+_lock = threading.Lock()
+
+
+def normalize_code(code: str) -> str:
+    return code.strip().upper()
+
+
+@dataclass(frozen=True)
+class CouponRegistry:
+    """Snapshot of the active coupons. The Coupon instances must not be mutated."""
+    version: int
+    loaded_at: float
+    by_code: Mapping[str, 'Coupon']
+
+    def is_fresh(self, version: int) -> bool:
+        return self.version == version and time.monotonic() - self.loaded_at < REGISTRY_TTL
+
+
+def load_registry(version: int) -> CouponRegistry:
+    """Build a registry from the active coupons (one query)."""
+    from .models import Coupon
+
+    coupons = {normalize_code(c.code): c for c in Coupon.objects.filter(is_active=True)}
+    return CouponRegistry(version, time.monotonic(), MappingProxyType(coupons))
+
+
+def get_registry() -> CouponRegistry:
+    """Return this process's registry, reloading it if stale."""
+    global _registry
+    version = caching.get_version(COUPON_VERSION_KEY)
+    registry = _registry
+    if registry is None or not registry.is_fresh(version):
+        with _lock:
+            registry = _registry
+            if registry is None or not registry.is_fresh(version):
+                registry = _registry = load_registry(version)
+    return registry
+
+
+def get_coupon(code: str) -> Optional['Coupon']:
+    """Active coupon for ``code`` (case-insensitive), or None. Dates are not checked."""
+    if not code:
+        return None
+    return get_registry().by_code.get(normalize_code(code))
+
+
+def invalidate() -> None:
+    """Make every worker reload its registry on its next lookup."""
+    caching.bump_version(COUPON_VERSION_KEY)
+
+
+# ============================================================================
+# USAGE
+# ============================================================================
+
+def _usage_key(user_id: int) -> str:
+    return f'user:{user_id}:used_coupons'
+
+
+def used_coupon_ids(user: 'User') -> frozenset[int]:
+    """Ids of the coupons ``user`` has already redeemed (cached)."""
+    key = _usage_key(user.pk)
+    used = cache.get(key)
+    if used is None:
+        from .models import CouponUsage
+
+        used = frozenset(CouponUsage.objects.filter(user=user).values_list('coupon_id', flat=True))
+        cache.set(key, used, USAGE_CACHE_TIMEOUT)
+    return used
+
+
+def has_used(user: 'User', coupon: 'Coupon', fresh: bool = False) -> bool:
+    """
+    Whether ``user`` has redeemed ``coupon``.
+
+    The cached set is per process and can lag behind another worker's
+    checkout; pass ``fresh=True`` to ask the database wherever money is
+    at stake (pricing the Razorpay order, creating the order).
+    """
+    if fresh:
+        from .models import CouponUsage
+
+        return CouponUsage.objects.filter(user=user, coupon=coupon).exists()
+    return coupon.pk in used_coupon_ids(user)
+
+
+def invalidate_usage(user_id: int) -> None:
+    cache.delete(_usage_key(user_id))
@@ -30,6 +30,14 @@ class OrderError(AmanzonException):
     pass
 
 
+class DuplicateOrderError(OrderError):
+    """Raised when an order already exists for a Razorpay order id."""
+
+    def __init__(self, order_id):
+        super().__init__(f'Order #{order_id} already exists for this payment.')
+        self.order_id = order_id
+
+
 class StorageError(AmanzonException):
     """Raised when file storage operations fail."""
     pass
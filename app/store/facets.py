@@ -0,0 +1,118 @@
+"""
+Amanzon Shop Facets
+
+Per-category, per-subcategory, price-bucket, rating-bucket and in-stock
+counts for the shop sidebar, computed in a single grouped query.
+
+Counts are disjunctive: each facet is counted under every active filter
+except its own, so selecting a price range still shows how many products
+the other ranges hold. This is done with conditional aggregates over one
+``GROUP BY category, subcategory`` query. Results are cached by filter
+signature under the catalog version, so any Product or Review change
+invalidates them.
+"""
+
+from __future__ import annotations
+
+from decimal import Decimal
+from functools import reduce
+from operator import and_
+from typing import Any, Optional
+
+from django.db.models import Count, Q
+
+from . import caching, services
+
+# (min, max) price ranges matching the sidebar buttons; None is open-ended
+PRICE_BUCKETS = [
+    (None, Decimal('500')),
+    (Decimal('500'), Decimal('1000')),
+    (Decimal('1000'), Decimal('5000')),
+    (Decimal('5000'), None),
+]
+RATING_THRESHOLDS = [4, 3, 2, 1]  # "N stars & up"
+FACET_CACHE_TIMEOUT = 60 * 60
+
+
+def _price_q(low: Optional[Decimal], high: Optional[Decimal]) -> Q:
+    q = Q()
+    if low is not None:
+        q &= Q(price__gte=low)
+    if high is not None:
+        q &= Q(price__lte=high)
+    return q
+
+
+def _count(*conditions: Q) -> Count:
+    """Count rows matching all non-empty ``conditions``."""
+    conditions = [c for c in conditions if c]
+    if not conditions:
+        return Count('id')
+    return Count('id', filter=reduce(and_, conditions))
+
+
+def compute_facets(params: Any, category_id: Optional[int] = None) -> dict[str, Any]:
+    """Run the grouped facet query for a filter set (uncached)."""
+    from .models import Product
+
+    # Search narrows every facet; the other filters are applied per-count
+    queryset = services.filter_products(
+        Product.objects.filter(is_active=True), {'q': params.get('q')}
+    )
+    conditions = services.product_filter_conditions(params)
+    price = conditions.get('price', Q())
+    rating = conditions.get('rating', Q())
+    in_stock = conditions.get('in_stock', Q())
+
+    aggregates = {
+        'matching': _count(price, rating, in_stock),
+        'in_stock': _count(Q(stock__gt=0), price, rating),
+    }
+    for i, (low, high) in enumerate(PRICE_BUCKETS):
+        aggregates[f'price_{i}'] = _count(_price_q(low, high), rating, in_stock)
+    for t in RATING_THRESHOLDS:
+        aggregates[f'rating_{t}'] = _count(Q(rating_avg__gte=t), price, in_stock)
+
+    rows = (
+        queryset.order_by()
+        .values('category_id', 'subcategory_id')
+        .annotate(**aggregates)
+    )
+
+    subcategory_id = services.parse_int_param(params.get('subcategory'))
+    facets = {
+        'all': 0,
+        'categories': {},
+        'subcategories': {},
+        'price': [0] * len(PRICE_BUCKETS),
+        'rating': {t: 0 for t in RATING_THRESHOLDS},
+        'in_stock': 0,
+        'total': 0,
+    }
+    for row in rows:
+        cat, sub = row['category_id'], row['subcategory_id']
+        facets['all'] += row['matching']
+        facets['categories'][cat] = facets['categories'].get(cat, 0) + row['matching']
+        if category_id is not None and cat != category_id:
+            continue
+        if sub is not None:
+            facets['subcategories'][sub] = facets['subcategories'].get(sub, 0) + row['matching']
+        if subcategory_id is not None and sub != subcategory_id:
+            continue
+        # Row is inside the current category/subcategory scope
+        facets['total'] += row['matching']
+        facets['in_stock'] += row['in_stock']
+        for i in range(len(PRICE_BUCKETS)):
+            facets['price'][i] += row[f'price_{i}']
+        for t in RATING_THRESHOLDS:
+            facets['rating'][t] += row[f'rating_{t}']
+    return facets
+
+
+def get_facets(params: Any, category_id: Optional[int] = None) -> dict[str, Any]:
+    """Facet counts for a filter set, served from cache when possible."""
+    signature = {key: params.get(key) for key in services.PRODUCT_FILTERS}
+    signature['category'] = category_id
+    return caching.get_or_build(
+        'facets', signature, lambda: compute_facets(params, category_id), FACET_CACHE_TIMEOUT
+    )
@@ -0,0 +1,34 @@
+"""
+Management command to rebuild "customers also bought" recommendations.
+
+Run periodically (e.g. nightly via cron) to refresh the RelatedProduct
+table from order history.
+"""
+from django.core.management.base import BaseCommand
+
+from store import recommendations
+
+
+class Command(BaseCommand):
+    help = 'Build product co-purchase neighbours from order history'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--top-k',
+            type=int,
+            default=recommendations.DEFAULT_TOP_K,
+            help=f'Neighbours to keep per product (default: {recommendations.DEFAULT_TOP_K})',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=recommendations.DEFAULT_CHUNK_SIZE,
+            help=f'Orders to read per query (default: {recommendations.DEFAULT_CHUNK_SIZE})',
+        )
+
+    def handle(self, *args, **options):
+        matrix = recommendations.build_co_purchase_matrix(chunk_size=options['chunk_size'])
+        written = recommendations.store_neighbours(matrix, top_k=options['top_k'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Stored {written} neighbours for {len(matrix)} products.'
+        ))
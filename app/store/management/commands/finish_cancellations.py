@@ -0,0 +1,24 @@
+"""
+Management command to finish interrupted order cancellations.
+
+A paid order is refunded before its stock goes back. If restocking
+failed or the process died in between, the order stays 'cancelling'
+with its refund id recorded; run this periodically (e.g. every few
+minutes via cron) to restock those orders and mark them cancelled.
+"""
+from django.core.management.base import BaseCommand
+
+from store import services
+
+
+class Command(BaseCommand):
+    help = 'Restock and close cancellations that were refunded but not finished'
+
+    def handle(self, *args, **options):
+        finished, unresolved = services.finish_cancellations()
+        self.stdout.write(self.style.SUCCESS(f'Finished {finished} cancellations.'))
+        if unresolved:
+            self.stdout.write(self.style.WARNING(
+                f'{unresolved} orders are cancelling with no recorded refund; '
+                f'check their payments in Razorpay before resolving them in the admin.'
+            ))
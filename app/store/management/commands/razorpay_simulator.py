@@ -0,0 +1,134 @@
+"""
+Management command to run a local Razorpay API simulator.
+
+Serves the endpoints the store uses (order creation and refunds) with
+configurable latency and failure rate, so checkout throughput can be
+load-tested offline. Point the store at it with
+RAZORPAY_BASE_URL=http://127.0.0.1:8765 and any non-empty Razorpay keys.
+"""
+import json
+import random
+import re
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.core.management.base import BaseCommand
+
+REFUND_PATH = re.compile(r'^/v1/payments/(?P<payment_id>[\w-]+)/refund$')
+
+
+class SimulatorHandler(BaseHTTPRequestHandler):
+    """Razorpay-shaped JSON responses; the server carries the knobs."""
+
+    protocol_version = 'HTTP/1.1'  # Keep-alive, like the real API
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            data = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            return self._error(400, 'BAD_REQUEST_ERROR', 'Malformed JSON body')
+
+        latency = self.server.latency
+        if latency:
+            time.sleep(max(0.0, random.gauss(latency, self.server.jitter)))
+        if random.random() < self.server.failure_rate:
+            return self._error(502, 'GATEWAY_ERROR', 'Simulated gateway failure')
+
+        if self.path == '/v1/orders':
+            return self._json(200, {
+                'id': f'order_sim_{uuid.uuid4().hex[:14]}',
+                'entity': 'order',
+                'amount': data.get('amount'),
+                'currency': data.get('currency', 'INR'),
+                'status': 'created',
+                'created_at': int(time.time()),
+            })
+        match = REFUND_PATH.match(self.path)
+        if match:
+            return self._json(200, {
+                'id': f'rfnd_sim_{uuid.uuid4().hex[:14]}',
+                'entity': 'refund',
+                'payment_id': match['payment_id'],
+                'amount': data.get('amount'),
+                'status': 'processed',
+                'created_at': int(time.time()),
+            })
+        return self._error(404, 'BAD_REQUEST_ERROR', 'The requested URL was not found on the server.')
+
+    def _error(self, status, code, description):
+        self._json(status, {'error': {'code': code, 'description': description}})
+
+    def _json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # The client gave up waiting, e.g. on its read timeout
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+def make_server(host='127.0.0.1', port=8765, latency_ms=0.0, jitter_ms=0.0, failure_rate=0.0, verbose=False):
+    """Build (but don't start) a simulator server."""
+    server = ThreadingHTTPServer((host, port), SimulatorHandler)
+    server.daemon_threads = True
+    server.latency = latency_ms / 1000
+    server.jitter = jitter_ms / 1000
+    server.failure_rate = failure_rate
+    server.verbose = verbose
+    return server
+
+
+class Command(BaseCommand):
+    help = 'Run a local Razorpay API simulator for offline load testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument(
+            '--latency-ms',
+            type=float,
+            default=150.0,
+            help='Mean response latency in milliseconds (default: 150)',
+        )
+        parser.add_argument(
+            '--jitter-ms',
+            type=float,
+            default=50.0,
+            help='Standard deviation of the latency in milliseconds (default: 50)',
+        )
+        parser.add_argument(
+            '--failure-rate',
+            type=float,
+            default=0.0,
+            help='Fraction of requests answered with a 502 gateway error (default: 0)',
+        )
+
+    def handle(self, *args, **options):
+        server = make_server(
+            options['host'],
+            options['port'],
+            latency_ms=options['latency_ms'],
+            jitter_ms=options['jitter_ms'],
+            failure_rate=options['failure_rate'],
+            verbose=options['verbosity'] > 1,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Razorpay simulator on http://{options["host"]}:{options["port"]} '
+            f'(latency {options["latency_ms"]:.0f}±{options["jitter_ms"]:.0f}ms, '
+            f'failure rate {options["failure_rate"]:.0%})'
+        ))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
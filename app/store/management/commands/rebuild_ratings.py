@@ -0,0 +1,40 @@
+"""
+Management command to rebuild the denormalized product rating aggregates.
+
+Reviews created through the ORM keep the aggregates up to date via signals;
+run this after bulk imports or raw SQL changes to the reviews table.
+"""
+from django.core.management.base import BaseCommand
+
+from store import services
+from store.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Recompute rating_avg, rating_count and rating_histogram for all products'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=500,
+            help='Number of products to rebuild per transaction (default: 500)',
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        last_pk = 0
+        updated = 0
+
+        while True:
+            product_ids = list(
+                Product.objects.filter(pk__gt=last_pk)
+                .order_by('pk')
+                .values_list('pk', flat=True)[:chunk_size]
+            )
+            if not product_ids:
+                break
+            updated += services.rebuild_rating_aggregates(product_ids)
+            last_pk = product_ids[-1]
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt rating aggregates for {updated} products.'))
@@ -0,0 +1,17 @@
+"""
+Management command to rebuild the product full-text search index.
+
+Product saves keep the index in sync via signals; run this after bulk
+imports or raw SQL changes to the products table.
+"""
+from django.core.management.base import BaseCommand
+
+from store import search
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the product full-text search index'
+
+    def handle(self, *args, **options):
+        search.rebuild_index()
+        self.stdout.write(self.style.SUCCESS('Search index rebuilt.'))
@@ -0,0 +1,62 @@
+"""
+Management command to send queued transactional emails.
+
+Run it as a long-lived worker next to the web process, or with --once
+from cron. Emails are sent through EMAIL_BACKEND, so the console or
+file backend can stand in for SMTP locally.
+"""
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+
+from store import outbox
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Send pending emails from the outbox, retrying failures with backoff'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=outbox.BATCH_SIZE,
+            help=f'Emails to send per SMTP connection (default: {outbox.BATCH_SIZE})',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=5.0,
+            help='Seconds to sleep when the outbox is empty (default: 5)',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Drain everything currently due, then exit',
+        )
+
+    def handle(self, *args, **options):
+        total_sent = total_failed = 0
+        while True:
+            try:
+                sent, failed = outbox.drain(batch_size=options['batch_size'])
+            except Exception as e:
+                # E.g. the database is unavailable; claimed rows are retried once their lease expires
+                logger.exception(f'Outbox batch failed: {e}')
+                if options['once']:
+                    raise
+                time.sleep(options['interval'])
+                continue
+
+            total_sent += sent
+            total_failed += failed
+            if sent + failed == 0:
+                if options['once']:
+                    break
+                time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Sent {total_sent} emails ({total_failed} failed attempts).'
+        ))
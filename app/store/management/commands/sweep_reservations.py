@@ -0,0 +1,17 @@
+"""
+Management command to delete expired checkout stock reservations.
+
+Expired holds already stop counting against available stock; run this
+periodically (e.g. every few minutes via cron) to keep the table small.
+"""
+from django.core.management.base import BaseCommand
+
+from store import reservations
+
+
+class Command(BaseCommand):
+    help = 'Delete expired checkout stock reservations'
+
+    def handle(self, *args, **options):
+        deleted = reservations.sweep_expired()
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} expired reservations.'))
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:06
+
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_rating_aggregates(apps, schema_editor):
+    Product = apps.get_model('store', 'Product')
+    Review = apps.get_model('store', 'Review')
+
+    histograms = {}
+    rows = Review.objects.values_list('product_id', 'rating').annotate(n=Count('id')).order_by()
+    for product_id, rating, n in rows:
+        histograms.setdefault(product_id, [0] * 5)[rating - 1] = n
+
+    products = []
+    for product_id, histogram in histograms.items():
+        count = sum(histogram)
+        total = sum(stars * n for stars, n in enumerate(histogram, start=1))
+        products.append(Product(
+            pk=product_id,
+            rating_avg=(Decimal(total) / count).quantize(Decimal('0.1'), rounding=ROUND_HALF_UP),
+            rating_count=count,
+            rating_histogram=histogram,
+        ))
+    Product.objects.bulk_update(products, ['rating_avg', 'rating_count', 'rating_histogram'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0007_make_product_image_optional'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='rating_avg',
+            field=models.DecimalField(db_index=True, decimal_places=1, default=0, max_digits=2),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_histogram',
+            field=models.JSONField(blank=True, default=list, help_text='Review counts for 1-5 stars'),
+        ),
+        migrations.RunPython(backfill_rating_aggregates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0014_email_outbox'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='order',
+            constraint=models.UniqueConstraint(condition=models.Q(('razorpay_order_id', ''), _negated=True), fields=('razorpay_order_id',), name='order_razorpay_order_id_uniq'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:51
+
+from django.db import migrations, models
+
+
+def backfill_item_summaries(apps, schema_editor):
+    Order = apps.get_model('store', 'Order')
+    OrderItem = apps.get_model('store', 'OrderItem')
+
+    summaries = {}
+    rows = OrderItem.objects.order_by('order_id', 'pk').values_list(
+        'order_id', 'product_name', 'product__image', 'quantity'
+    )
+    for order_id, name, image, quantity in rows.iterator(chunk_size=2000):
+        summary = summaries.setdefault(order_id, Order(pk=order_id, item_count=0, preview_name=name, preview_image=image or None))
+        summary.item_count += quantity
+    Order.objects.bulk_update(summaries.values(), ['item_count', 'preview_name', 'preview_image'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0015_order_razorpay_order_id_unique'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='item_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='preview_image',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to='products/'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='preview_name',
+            field=models.CharField(blank=True, max_length=200),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='order_user_keyset_idx'),
+        ),
+        migrations.RunPython(backfill_item_summaries, migrations.RunPython.noop),
+    ]
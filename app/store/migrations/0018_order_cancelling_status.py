@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0017_outbox_sending_status'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='order',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('confirmed', 'Confirmed'), ('shipped', 'Shipped'), ('delivered', 'Delivered'), ('cancelling', 'Cancelling'), ('cancelled', 'Cancelled')], db_index=True, default='pending', max_length=20),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:27
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0019_review_product_keyset_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='relatedproduct',
+            name='built_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
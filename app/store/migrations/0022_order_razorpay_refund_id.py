@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0021_outboxemail_sensitive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='razorpay_refund_id',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:37
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0023_product_rating_keyset_idx'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='product',
+            name='product_stock_non_negative',
+        ),
+    ]
@@ -1,9 +1,11 @@
 import logging
+from decimal import Decimal
 
 from django.conf import settings
 from django.contrib.auth.models import AbstractUser
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
-from django.db.models import Avg
+from django.db.models import F, Sum
 from django.utils import timezone
 
 logger = logging.getLogger(__name__)
@@ -109,19 +111,31 @@ class Product(models.Model):
     image = models.ImageField(upload_to='products/', blank=True, null=True)
     stock = models.PositiveIntegerField(default=0)
     is_active = models.BooleanField(default=True, db_index=True)
+    # Denormalized review aggregates, maintained by store.signals
+    rating_avg = models.DecimalField(max_digits=2, decimal_places=1, default=0, db_index=True)
+    rating_count = models.PositiveIntegerField(default=0)
+    rating_histogram = models.JSONField(default=list, blank=True, help_text="Review counts for 1-5 stars")
+    # Full-text search vector (PostgreSQL only, maintained by store.search)
+    search_vector = SearchVectorField(null=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['-created_at']
+        # Composite (sort key, id) indexes back the shop's keyset pagination
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='product_created_keyset_idx'),
+            models.Index(fields=['name', 'id'], name='product_name_keyset_idx'),
+            models.Index(fields=['price', 'id'], name='product_price_keyset_idx'),
+            models.Index(fields=['-rating_avg', '-rating_count', '-id'], name='product_rating_keyset_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
     @property
     def average_rating(self):
-        avg = self.reviews.aggregate(avg=Avg('rating'))['avg']
-        return round(avg, 1) if avg else 0
+        return self.rating_avg
 
     @property
     def discount_percent(self):
@@ -152,13 +166,33 @@ class Cart(models.Model):
     def __str__(self):
         return f"Cart for {self.user.username}"
 
+    def get_totals(self, items=None):
+        """
+        Return (total_items, subtotal) for the cart.
+
+        Uses ``items`` (or prefetched items) when already loaded, otherwise
+        a single aggregate query over the items and their prices.
+        """
+        if items is None:
+            items = getattr(self, '_prefetched_objects_cache', {}).get('items')
+        if items is not None:
+            return (
+                sum(item.quantity for item in items),
+                sum((item.total_price for item in items), Decimal('0.00')),
+            )
+        totals = self.items.aggregate(
+            total_items=Sum('quantity'),
+            subtotal=Sum(F('quantity') * F('product__price'), output_field=models.DecimalField()),
+        )
+        return totals['total_items'] or 0, totals['subtotal'] or Decimal('0.00')
+
     @property
     def total_items(self):
-        return sum(item.quantity for item in self.items.all())
+        return self.get_totals()[0]
 
     @property
     def subtotal(self):
-        return sum(item.total_price for item in self.items.all())
+        return self.get_totals()[1]
 
 
 class CartItem(models.Model):
@@ -222,6 +256,25 @@ class CouponUsage(models.Model):
         return f"{self.user.username} used {self.coupon.code}"
 
 
+class StockReservation(models.Model):
+    """Stock held for a user's cart between checkout and payment."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='stock_reservations')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='reservations')
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ['user', 'product']
+        indexes = [
+            # Active holds per product, and the expiry sweep
+            models.Index(fields=['product', 'expires_at'], name='reservation_active_idx'),
+            models.Index(fields=['expires_at'], name='reservation_expiry_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity}x {self.product_id} held for {self.user_id}"
+
+
 class Order(models.Model):
     """Customer order."""
     STATUS_CHOICES = [
@@ -229,6 +282,7 @@ class Order(models.Model):
         ('confirmed', 'Confirmed'),
         ('shipped', 'Shipped'),
         ('delivered', 'Delivered'),
+        ('cancelling', 'Cancelling'),  # Claimed by cancel_order, refund in flight
         ('cancelled', 'Cancelled'),
     ]
 
@@ -255,18 +309,42 @@ class Order(models.Model):
     # Payment
     razorpay_order_id = models.CharField(max_length=100, blank=True)
     razorpay_payment_id = models.CharField(max_length=100, blank=True)
+    razorpay_refund_id = models.CharField(max_length=100, blank=True)
     is_paid = models.BooleanField(default=False)
     
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending', db_index=True)
+    # Denormalized item summary for the order history list, written at creation
+    item_count = models.PositiveIntegerField(default=0)
+    preview_name = models.CharField(max_length=200, blank=True)
+    preview_image = models.ImageField(upload_to='products/', blank=True, null=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True, db_index=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['-created_at']
+        # Backs the keyset-paginated order history
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-id'], name='order_user_keyset_idx'),
+        ]
+        constraints = [
+            # One order per Razorpay order: replayed payment callbacks collide here
+            models.UniqueConstraint(
+                fields=['razorpay_order_id'],
+                condition=~models.Q(razorpay_order_id=''),
+                name='order_razorpay_order_id_uniq',
+            ),
+        ]
 
     def __str__(self):
         return f"Order #{self.id} by {self.user.username}"
 
+    @property
+    def is_cancellable(self):
+        """Pending/confirmed, or refunded by a cancellation that didn't get to restock."""
+        return self.status in ['pending', 'confirmed'] or (
+            self.status == 'cancelling' and bool(self.razorpay_refund_id)
+        )
+
 
 class OrderItem(models.Model):
     """Individual item in an order."""
@@ -284,6 +362,26 @@ class OrderItem(models.Model):
         return self.price * self.quantity
 
 
+class RelatedProduct(models.Model):
+    """Precomputed "customers also bought" neighbour of a product."""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='neighbours')
+    related = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='recommended_with')
+    score = models.PositiveIntegerField(help_text="Number of orders containing both products")
+    rank = models.PositiveSmallIntegerField()
+    # Shared by every row of one build_recommendations run
+    built_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['product', 'rank']
+        unique_together = ['product', 'related']
+        indexes = [
+            models.Index(fields=['product', 'rank'], name='relatedproduct_rank_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} -> {self.related_id} ({self.score})"
+
+
 class Review(models.Model):
     """Product review by a user."""
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='reviews')
@@ -295,6 +393,10 @@ class Review(models.Model):
     class Meta:
         unique_together = ['user', 'product']
         ordering = ['-created_at']
+        # Backs the keyset-paginated reviews on the product page
+        indexes = [
+            models.Index(fields=['product', '-created_at', '-id'], name='review_product_keyset_idx'),
+        ]
 
     def __str__(self):
         return f"Review by {self.user.username} for {self.product.name}"
@@ -314,3 +416,36 @@ class ContactMessage(models.Model):
 
     def __str__(self):
         return f"Message from {self.name}: {self.subject}"
+
+
+class OutboxEmail(models.Model):
+    """Transactional email queued for the run_outbox worker."""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sending', 'Sending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ]
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=255)
+    recipients = models.JSONField(default=list)
+    # Body holds a secret (OTP, verification link); cleared once no longer needed
+    sensitive = models.BooleanField(default=False)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            # The worker's "due" scan
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} -> {', '.join(self.recipients)} ({self.status})"
@@ -0,0 +1,168 @@
+"""
+Amanzon Email Outbox
+
+Transactional emails (order confirmations, verification links, password
+reset OTPs) are not sent inside the request. Call sites ``enqueue`` them
+and the row is written once the surrounding transaction commits, so a
+rolled-back order never emails its customer.
+
+``manage.py run_outbox`` drains due rows in batches over a single
+connection from ``get_connection()``. Rows are leased to the worker
+before sending rather than locked, so no transaction stays open across
+SMTP round trips; a lease left behind by a crashed worker expires and the
+rows are picked up again. Failed sends are retried with exponential
+backoff until ``MAX_ATTEMPTS``, then marked failed. Point
+``EMAIL_BACKEND`` at the console or file backend to try it locally.
+"""
+
+from __future__ import annotations
+
+import logging
+from datetime import datetime, timedelta
+from typing import Optional
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import connection, transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 50
+MAX_ATTEMPTS = 5
+BACKOFF_BASE = 60  # Seconds before the first retry, doubled on each one
+BACKOFF_MAX = 60 * 60
+LEASE = 5 * 60  # Seconds a claimed batch is reserved for its worker
+REDACTED_BODY = '[redacted after sending]'
+
+
+def enqueue(
+    subject: str,
+    body: str,
+    recipients: list[str],
+    from_email: Optional[str] = None,
+    sensitive: bool = False,
+) -> None:
+    """
+    Queue an email to be sent by the outbox worker after the current transaction commits.
+
+    ``sensitive`` bodies (OTPs, verification links) are redacted once the
+    email is sent or given up on, so the secret doesn't linger in the table.
+    """
+    from .models import OutboxEmail
+
+    email = OutboxEmail(
+        subject=subject,
+        body=body,
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        recipients=list(recipients),
+        sensitive=sensitive,
+    )
+    transaction.on_commit(email.save)
+
+
+def backoff(attempts: int) -> timedelta:
+    """Delay before retrying an email that has failed ``attempts`` times."""
+    return timedelta(seconds=min(BACKOFF_BASE * 2 ** (attempts - 1), BACKOFF_MAX))
+
+
+def _claim(batch_size: int, now: datetime) -> list:
+    """
+    Lease up to ``batch_size`` due emails to this worker.
+
+    Due rows are pending ones whose retry time has come, plus 'sending'
+    rows whose lease ran out because their worker died mid-batch. They are
+    marked 'sending' until ``now + LEASE`` in a short transaction, so other
+    workers skip them while this one talks to the mail server.
+    """
+    from .models import OutboxEmail
+
+    due = OutboxEmail.objects.filter(
+        status__in=['pending', 'sending'], next_attempt_at__lte=now
+    ).order_by('next_attempt_at', 'pk')
+    if connection.features.has_select_for_update_skip_locked:
+        due = due.select_for_update(skip_locked=True)
+
+    lease_until = now + timedelta(seconds=LEASE)
+    with transaction.atomic():
+        ids = list(due.values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return []
+        # Re-check the due condition so a worker without SKIP LOCKED can't
+        # take over rows another worker claimed since the select
+        OutboxEmail.objects.filter(
+            pk__in=ids, status__in=['pending', 'sending'], next_attempt_at__lte=now
+        ).update(status='sending', next_attempt_at=lease_until)
+    return list(
+        OutboxEmail.objects.filter(pk__in=ids, status='sending', next_attempt_at=lease_until).order_by('pk')
+    )
+
+
+def _redact(email) -> None:
+    if email.sensitive:
+        email.body = REDACTED_BODY
+
+
+def _record_failure(email, error: Exception, now: datetime) -> None:
+    email.attempts += 1
+    email.last_error = str(error)
+    if email.attempts >= MAX_ATTEMPTS:
+        email.status = 'failed'
+        _redact(email)
+        logger.error(f'Giving up on outbox email {email.pk} after {email.attempts} attempts: {error}')
+    else:
+        email.status = 'pending'
+        email.next_attempt_at = now + backoff(email.attempts)
+
+
+def drain(batch_size: int = BATCH_SIZE, now: Optional[datetime] = None) -> tuple[int, int]:
+    """
+    Send one batch of due emails.
+
+    The batch is claimed in its own short transaction (see ``_claim``),
+    so several workers can drain the outbox side by side and no database
+    transaction or row lock is held while the mail server is slow. Results
+    are written back once the batch has been sent. If the connection can't
+    be opened at all, every claimed email backs off as a failed attempt.
+
+    Returns (sent, failed), where failed counts sends that will be retried
+    or were given up on.
+    """
+    from .models import OutboxEmail
+
+    now = now or timezone.now()
+    batch = _claim(batch_size, now)
+    if not batch:
+        return 0, 0
+
+    sent = failed = 0
+    try:
+        smtp = get_connection()
+        smtp.open()
+    except Exception as e:
+        logger.warning(f'Outbox could not connect to the mail server: {e}')
+        for email in batch:
+            _record_failure(email, e, now)
+        failed = len(batch)
+    else:
+        try:
+            for email in batch:
+                message = EmailMessage(email.subject, email.body, email.from_email, email.recipients)
+                try:
+                    smtp.send_messages([message])
+                except Exception as e:
+                    failed += 1
+                    _record_failure(email, e, now)
+                else:
+                    sent += 1
+                    email.attempts += 1
+                    email.status = 'sent'
+                    email.sent_at = timezone.now()
+                    _redact(email)
+        finally:
+            smtp.close()
+
+    OutboxEmail.objects.bulk_update(
+        batch, ['body', 'status', 'attempts', 'next_attempt_at', 'last_error', 'sent_at']
+    )
+    return sent, failed
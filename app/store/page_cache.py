@@ -0,0 +1,147 @@
+"""
+Amanzon Page Cache
+
+Full-page cache for the catalog pages (home and shop). The page is
+rendered once per path and normalized query string as a user-neutral
+"shell" and stored under the catalog version, so any catalog edit
+retires it.
+
+The shell differs from a normal render in two places, both filled in per
+request by ``apply_overlay``:
+
+- the user part of the navbar is a ``<!--nav-user-->`` marker, replaced
+  with ``store/_nav_user.html`` (login links, or cart/wishlist counts);
+- each product card's wishlist button keeps its ``<!--wishlist:ID-->``
+  block with ``__wishlist_*__`` tokens.
+
+Anonymous visitors are served without any database query; signed-in
+users cost the two count queries and one wishlist id query.
+
+Per-request side effects of a view (counting a search for the popular
+queries) are registered with ``on_serve`` and stored with the shell, so
+they run on every cache hit too, not only when the page is rendered.
+"""
+
+from __future__ import annotations
+
+import re
+from functools import wraps
+from typing import Iterable, Optional
+
+from django.contrib import messages
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.template.loader import render_to_string
+from django.utils.cache import patch_vary_headers
+
+from . import caching
+
+PAGE_CACHE_TIMEOUT = caching.LISTING_CACHE_TIMEOUT
+NAV_USER_MARKER = '<!--nav-user-->'
+WISHLIST_BLOCK = re.compile(r'<!--wishlist:(\d+)-->(.*?)<!--/wishlist-->', re.DOTALL)
+
+_WISHLIST_TOKENS = {
+    True: {'__wishlist_class__': 'text-danger', '__wishlist_action__': 'Remove',
+           '__wishlist_preposition__': 'from', '__wishlist_icon__': '-fill'},
+    False: {'__wishlist_class__': '', '__wishlist_action__': 'Add',
+            '__wishlist_preposition__': 'to', '__wishlist_icon__': ''},
+}
+
+
+def is_shell_render(request) -> bool:
+    """True while a view is rendering a shell for the page cache."""
+    return getattr(request, 'page_shell', False)
+
+
+def apply_wishlist(html: str, user, wishlist_ids: Iterable[int] = ()) -> str:
+    """
+    Resolve every wishlist block in ``html`` for ``user``.
+
+    Anonymous users get no wishlist button; signed-in users get a filled
+    or empty heart depending on ``wishlist_ids``.
+    """
+    if user is None or not user.is_authenticated:
+        return WISHLIST_BLOCK.sub('', html)
+
+    wishlist_ids = set(wishlist_ids)
+
+    def fill(match):
+        block = match.group(2)
+        for token, value in _WISHLIST_TOKENS[int(match.group(1)) in wishlist_ids].items():
+            block = block.replace(token, value)
+        return block
+
+    return WISHLIST_BLOCK.sub(fill, html)
+
+
+def apply_overlay(request, shell: str) -> str:
+    """Fill the per-user parts of a cached shell for ``request``."""
+    from .context_processors import cart_wishlist_count
+
+    wishlist_ids = ()
+    if request.user.is_authenticated and WISHLIST_BLOCK.search(shell):
+        wishlist_ids = request.user.wishlist.values_list('product_id', flat=True)
+
+    nav = render_to_string('store/_nav_user.html', {
+        'user': request.user,
+        **cart_wishlist_count(request),
+    })
+    html = shell.replace(NAV_USER_MARKER, nav, 1)
+    return apply_wishlist(html, request.user, wishlist_ids)
+
+
+def on_serve(request, func, *args) -> None:
+    """
+    Call ``func(*args)`` now and again each time this page is served from
+    the cache. ``func`` must be a module-level function (it is pickled).
+    """
+    func(*args)
+    hooks = getattr(request, 'page_shell_hooks', None)
+    if hooks is not None:
+        hooks.append((func, args))
+
+
+def page_key(request) -> str:
+    """Cache key for the page at ``request``'s path and query string."""
+    return caching.catalog_key('page', {**request.GET.dict(), '__path__': request.path})
+
+
+def _cacheable(request) -> bool:
+    # Pending flash messages are part of the page body
+    return request.method in ('GET', 'HEAD') and not len(messages.get_messages(request))
+
+
+def cache_page_shell(view_func):
+    """
+    Serve a view from the page cache, rendering its shell on a miss.
+
+    Only successful HTML responses are stored.
+    """
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        if not _cacheable(request):
+            return view_func(request, *args, **kwargs)
+
+        key = page_key(request)
+        entry: Optional[tuple[str, list]] = cache.get(key)
+        if entry is None:
+            request.page_shell = True
+            request.page_shell_hooks = []
+            try:
+                response = view_func(request, *args, **kwargs)
+            finally:
+                request.page_shell = False
+            if response.status_code != 200 or response.streaming:
+                return response
+            entry = (response.content.decode(response.charset), request.page_shell_hooks)
+            cache.set(key, entry, PAGE_CACHE_TIMEOUT)
+        else:
+            for func, hook_args in entry[1]:
+                func(*hook_args)
+        shell = entry[0]
+
+        response = HttpResponse(apply_overlay(request, shell))
+        patch_vary_headers(response, ['Cookie'])
+        return response
+
+    return wrapper
@@ -0,0 +1,243 @@
+"""
+Amanzon Keyset Pagination
+
+Cursor-based pagination for product listings. Pages are fetched with a
+``WHERE (sort_key, id) > (last_sort_key, last_id)`` filter instead of
+OFFSET, so page N costs the same as page 1 and no COUNT(*) is needed.
+
+Cursors are opaque, signed tokens carrying the sort key of the last (or
+first) row on the current page. A cursor is only valid for the sort it
+was issued for.
+"""
+
+from __future__ import annotations
+
+import json
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Optional
+
+from django.core import signing
+from django.core.paginator import Paginator
+from django.core.exceptions import FieldDoesNotExist
+from django.db import connection
+from django.db.models import Q, QuerySet
+from django.utils.functional import cached_property
+
+CURSOR_SALT = 'store.pagination.cursor'
+PAGE_SIZE = 12
+REVIEW_PAGE_SIZE = 10
+ORDER_PAGE_SIZE = 10
+APPROX_COUNT_CAP = 1000
+
+# Sort key -> ordering, always ending in a unique tie-breaker on id
+SORT_ORDERINGS = {
+    '-created_at': ['-created_at', '-id'],
+    'price_low': ['price', 'id'],
+    'price_high': ['-price', '-id'],
+    'name': ['name', 'id'],
+    'rating': ['-rating_avg', '-rating_count', '-id'],
+    'relevance': ['-search_rank', '-id'],
+}
+DEFAULT_SORT = '-created_at'
+
+
+def get_ordering(sort: str) -> list[str]:
+    """Return the full ordering (with id tie-breaker) for a sort key."""
+    return SORT_ORDERINGS.get(sort, SORT_ORDERINGS[DEFAULT_SORT])
+
+
+# ============================================================================
+# CURSORS
+# ============================================================================
+
+def _encode_value(value: Any) -> Any:
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _decode_value(queryset: QuerySet, field_name: str, value: Any) -> Any:
+    try:
+        field = queryset.model._meta.get_field(field_name)
+    except FieldDoesNotExist:
+        return value  # Annotation such as search_rank
+    return field.to_python(value)
+
+
+def encode_cursor(sort: str, obj: Any, reverse: bool = False) -> str:
+    """Build a signed cursor pointing just past ``obj`` in ``sort`` order."""
+    values = [_encode_value(getattr(obj, f.lstrip('-'))) for f in get_ordering(sort)]
+    return signing.dumps({'s': sort, 'v': values, 'r': reverse}, salt=CURSOR_SALT, compress=True)
+
+
+def decode_cursor(cursor: str, sort: str) -> Optional[dict[str, Any]]:
+    """
+    Decode a cursor issued for ``sort``.
+
+    Returns None for tampered, malformed or mismatched cursors so callers
+    fall back to the first page.
+    """
+    try:
+        data = signing.loads(cursor, salt=CURSOR_SALT)
+    except signing.BadSignature:
+        return None
+    if not isinstance(data, dict) or data.get('s') != sort:
+        return None
+    if len(data.get('v', [])) != len(get_ordering(sort)):
+        return None
+    return data
+
+
+def _keyset_filter(queryset: QuerySet, ordering: list[str], values: list[Any]) -> Q:
+    """
+    Build the lexicographic "comes after" filter for an ordering:
+
+        (a > x) OR (a = x AND b > y) OR (a = x AND b = y AND c > z) ...
+
+    with each comparison flipped for descending fields.
+    """
+    condition = Q()
+    equal_so_far = Q()
+    for order, raw in zip(ordering, values):
+        field = order.lstrip('-')
+        value = _decode_value(queryset, field, raw)
+        lookup = 'lt' if order.startswith('-') else 'gt'
+        condition |= equal_so_far & Q(**{f'{field}__{lookup}': value})
+        equal_so_far &= Q(**{field: value})
+    return condition
+
+
+def _reverse_ordering(ordering: list[str]) -> list[str]:
+    return [o[1:] if o.startswith('-') else f'-{o}' for o in ordering]
+
+
+# ============================================================================
+# PAGES
+# ============================================================================
+
+class PrecountedPaginator(Paginator):
+    """Paginator whose total is already known, e.g. from a cache entry."""
+
+    def __init__(self, object_list, per_page, count, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self._count = count
+
+    @cached_property
+    def count(self):
+        return self._count
+
+
+class KeysetPage:
+    """
+    One page of keyset-paginated results.
+
+    Iterable like a Django Page, with cursors for the adjacent pages
+    instead of page numbers.
+    """
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None, total_count=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        # (count, exact) from approximate_count, or None if not requested
+        self.total_count = total_count
+
+    @property
+    def count(self):
+        return self.total_count[0] if self.total_count else None
+
+    @property
+    def count_is_exact(self):
+        return bool(self.total_count and self.total_count[1])
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+def paginate(
+    queryset: QuerySet,
+    sort: str,
+    cursor: Optional[str] = None,
+    per_page: int = PAGE_SIZE,
+    with_count: bool = False,
+) -> KeysetPage:
+    """
+    Fetch one page of ``queryset`` in ``sort`` order after/before ``cursor``.
+
+    Runs a single LIMIT query of ``per_page + 1`` rows (the extra row tells
+    us whether there is another page). ``with_count`` adds an approximate
+    total from ``approximate_count``.
+    """
+    ordering = get_ordering(sort)
+    data = decode_cursor(cursor, sort) if cursor else None
+    backwards = bool(data and data['r'])
+
+    page_qs = queryset
+    if data:
+        page_ordering = _reverse_ordering(ordering) if backwards else ordering
+        page_qs = page_qs.filter(_keyset_filter(queryset, page_ordering, data['v']))
+    else:
+        page_ordering = ordering
+
+    rows = list(page_qs.order_by(*page_ordering)[:per_page + 1])
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if backwards:
+        rows.reverse()
+
+    # Walking backwards we came from a later page, so "more" lies before us
+    if backwards:
+        has_next, has_previous = True, has_more
+    else:
+        has_next, has_previous = has_more, data is not None
+
+    next_cursor = previous_cursor = None
+    if rows:
+        if has_next:
+            next_cursor = encode_cursor(sort, rows[-1])
+        if has_previous:
+            previous_cursor = encode_cursor(sort, rows[0], reverse=True)
+
+    total = approximate_count(queryset) if with_count else None
+    return KeysetPage(rows, next_cursor, previous_cursor, total)
+
+
+def approximate_count(queryset: QuerySet, cap: int = APPROX_COUNT_CAP) -> tuple[int, bool]:
+    """
+    Cheap total for a filtered queryset.
+
+    Returns (count, exact). On PostgreSQL this is the planner's row
+    estimate; elsewhere rows are counted up to ``cap`` and ``exact`` is
+    False when the cap is hit.
+    """
+    if connection.vendor == 'postgresql':
+        sql, params = queryset.order_by().query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows']), False
+
+    count = queryset.order_by()[:cap + 1].count()
+    if count > cap:
+        return cap, False
+    return count, True
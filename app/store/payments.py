@@ -0,0 +1,164 @@
+"""
+Amanzon Payment Gateway
+
+Process-wide adapter around the Razorpay client. Every worker shares one
+``requests`` session, so calls reuse pooled keep-alive connections
+instead of paying a TCP and TLS handshake per request. All calls have
+bounded connect/read timeouts, connection failures are retried with a
+short backoff, and per-operation latency is recorded in memory.
+
+``RAZORPAY_BASE_URL`` can point the adapter at the local simulator
+(``manage.py razorpay_simulator``) to load-test checkout offline.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Optional
+
+import razorpay
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+CONNECT_TIMEOUT = getattr(settings, 'RAZORPAY_CONNECT_TIMEOUT', 3.05)
+READ_TIMEOUT = getattr(settings, 'RAZORPAY_READ_TIMEOUT', 10)
+POOL_SIZE = getattr(settings, 'RAZORPAY_POOL_SIZE', 10)
+# Only retry when the request never reached Razorpay; a retried refund
+# or order creation that did reach it could be applied twice
+CONNECT_RETRIES = 2
+RETRY_BACKOFF = 0.2
+
+_gateway: Optional['PaymentGateway'] = None
+_lock = threading.Lock()
+
+
+class _TimeoutSession(requests.Session):
+    """Session that applies the gateway timeouts to every request."""
+
+    def request(self, *args, **kwargs):
+        kwargs.setdefault('timeout', (CONNECT_TIMEOUT, READ_TIMEOUT))
+        return super().request(*args, **kwargs)
+
+
+def _build_session() -> requests.Session:
+    session = _TimeoutSession()
+    retry = Retry(
+        total=CONNECT_RETRIES,
+        connect=CONNECT_RETRIES,
+        read=0,
+        status=0,
+        other=0,
+        backoff_factor=RETRY_BACKOFF,
+    )
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE, max_retries=retry)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+@dataclass
+class CallStats:
+    """Latency totals for one gateway operation."""
+    calls: int = 0
+    errors: int = 0
+    total_ms: float = 0.0
+    max_ms: float = 0.0
+
+    @property
+    def avg_ms(self) -> float:
+        return self.total_ms / self.calls if self.calls else 0.0
+
+
+class PaymentGateway:
+    """Razorpay operations used by the store, over one shared session."""
+
+    def __init__(self, key_id: str, key_secret: str, base_url: Optional[str] = None):
+        self.session = _build_session()
+        options = {'base_url': base_url} if base_url else {}
+        self.client = razorpay.Client(session=self.session, auth=(key_id, key_secret), **options)
+        self._stats: dict[str, CallStats] = defaultdict(CallStats)
+        self._stats_lock = threading.Lock()
+
+    @contextmanager
+    def _timed(self, operation: str):
+        start = time.perf_counter()
+        failed = False
+        try:
+            yield
+        except Exception:
+            failed = True
+            raise
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            with self._stats_lock:
+                stats = self._stats[operation]
+                stats.calls += 1
+                stats.errors += failed
+                stats.total_ms += elapsed_ms
+                stats.max_ms = max(stats.max_ms, elapsed_ms)
+            logger.debug(f'razorpay {operation} took {elapsed_ms:.1f}ms{" (failed)" if failed else ""}')
+
+    def create_order(self, amount: int, currency: str = 'INR') -> dict[str, Any]:
+        """Create a Razorpay order for ``amount`` paise, captured on payment."""
+        with self._timed('create_order'):
+            return self.client.order.create({
+                'amount': amount,
+                'currency': currency,
+                'payment_capture': 1,
+            })
+
+    def verify_payment_signature(self, razorpay_order_id: str, razorpay_payment_id: str, razorpay_signature: str) -> None:
+        """Raise ``razorpay.errors.SignatureVerificationError`` unless the checkout signature is valid."""
+        with self._timed('verify_signature'):
+            self.client.utility.verify_payment_signature({
+                'razorpay_order_id': razorpay_order_id,
+                'razorpay_payment_id': razorpay_payment_id,
+                'razorpay_signature': razorpay_signature,
+            })
+
+    def refund(self, razorpay_payment_id: str, amount: int) -> dict[str, Any]:
+        """Refund ``amount`` paise of a captured payment."""
+        with self._timed('refund'):
+            return self.client.payment.refund(razorpay_payment_id, {'amount': amount})
+
+    def stats(self) -> dict[str, CallStats]:
+        """Snapshot of per-operation latency since the gateway was created."""
+        with self._stats_lock:
+            return {name: CallStats(**vars(s)) for name, s in self._stats.items()}
+
+
+def is_configured() -> bool:
+    """Whether real Razorpay keys are set (otherwise checkout runs in demo mode)."""
+    return bool(settings.RAZORPAY_KEY_ID and settings.RAZORPAY_KEY_SECRET)
+
+
+def get_gateway() -> PaymentGateway:
+    """The process-wide gateway, created on first use."""
+    global _gateway
+    if _gateway is None:
+        with _lock:
+            if _gateway is None:
+                _gateway = PaymentGateway(
+                    settings.RAZORPAY_KEY_ID,
+                    settings.RAZORPAY_KEY_SECRET,
+                    getattr(settings, 'RAZORPAY_BASE_URL', None),
+                )
+    return _gateway
+
+
+def reset_gateway() -> None:
+    """Drop the shared gateway, e.g. after the Razorpay settings change."""
+    global _gateway
+    with _lock:
+        if _gateway is not None:
+            _gateway.session.close()
+        _gateway = None
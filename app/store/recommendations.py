@@ -0,0 +1,124 @@
+"""
+Amanzon Product Recommendations
+
+"Customers also bought" neighbours from order co-occurrence.
+
+A batch job (``manage.py build_recommendations``) counts how often each
+pair of products appears in the same order, streaming order items in
+chunks into a sparse ``{product: Counter(neighbour -> orders)}`` matrix,
+and stores the top-K neighbours per product in ``RelatedProduct``.
+Product pages then read them with a single indexed lookup.
+"""
+
+from __future__ import annotations
+
+import heapq
+from collections import Counter, defaultdict
+from itertools import combinations
+from typing import TYPE_CHECKING
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import caching
+
+if TYPE_CHECKING:
+    from .models import Product
+
+DEFAULT_TOP_K = 8
+DEFAULT_CHUNK_SIZE = 1000
+RELATED_LIMIT = 4
+
+
+def build_co_purchase_matrix(chunk_size: int = DEFAULT_CHUNK_SIZE) -> dict[int, Counter]:
+    """
+    Count product co-occurrence across all non-cancelled orders.
+
+    Orders are read in primary-key chunks so memory stays bounded by the
+    number of product pairs, not the number of order items.
+    """
+    from .models import Order, OrderItem
+
+    matrix: dict[int, Counter] = defaultdict(Counter)
+    orders = Order.objects.exclude(status='cancelled').order_by('pk')
+    last_pk = 0
+
+    while True:
+        order_ids = list(orders.filter(pk__gt=last_pk).values_list('pk', flat=True)[:chunk_size])
+        if not order_ids:
+            break
+        last_pk = order_ids[-1]
+
+        baskets: dict[int, set[int]] = defaultdict(set)
+        rows = OrderItem.objects.filter(
+            order_id__in=order_ids, product__isnull=False
+        ).values_list('order_id', 'product_id')
+        for order_id, product_id in rows:
+            baskets[order_id].add(product_id)
+
+        for products in baskets.values():
+            for a, b in combinations(sorted(products), 2):
+                matrix[a][b] += 1
+                matrix[b][a] += 1
+
+    return matrix
+
+
+@transaction.atomic
+def store_neighbours(matrix: dict[int, Counter], top_k: int = DEFAULT_TOP_K) -> int:
+    """
+    Replace the stored neighbour table with the top-K of ``matrix``.
+
+    Ties are broken by product id so rebuilds are deterministic. Every
+    row carries the same ``built_at`` stamp, which product page ETags
+    read from the database so all web workers see the rebuild.
+    Returns the number of rows written.
+    """
+    from .models import Product, RelatedProduct
+
+    built_at = timezone.now()
+    existing = set(Product.objects.values_list('pk', flat=True))
+    rows = []
+    for product_id, counts in matrix.items():
+        if product_id not in existing:
+            continue
+        best = heapq.nsmallest(
+            top_k,
+            ((-score, related_id) for related_id, score in counts.items() if related_id in existing),
+        )
+        for rank, (neg_score, related_id) in enumerate(best):
+            rows.append(RelatedProduct(
+                product_id=product_id, related_id=related_id, score=-neg_score, rank=rank, built_at=built_at,
+            ))
+
+    RelatedProduct.objects.all().delete()
+    RelatedProduct.objects.bulk_create(rows, batch_size=1000)
+    # Cached listings in this process; other workers go by built_at
+    transaction.on_commit(caching.bump_catalog_version)
+    return len(rows)
+
+
+def get_related_products(product: 'Product', limit: int = RELATED_LIMIT) -> list['Product']:
+    """
+    Products frequently bought with ``product``.
+
+    Falls back to (and tops up with) other active products from the
+    same category when there are fewer than ``limit`` stored neighbours.
+    """
+    from .models import Product
+
+    related = list(
+        Product.objects.filter(
+            is_active=True,
+            recommended_with__product=product,
+        ).select_related('category').order_by('recommended_with__rank')[:limit]
+    )
+    if len(related) < limit:
+        exclude = [product.pk] + [p.pk for p in related]
+        related += list(
+            Product.objects.filter(category_id=product.category_id, is_active=True)
+            .select_related('category')
+            .exclude(pk__in=exclude)
+            .order_by('-rating_avg', '-created_at')[:limit - len(related)]
+        )
+    return related
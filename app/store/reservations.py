@@ -0,0 +1,113 @@
+"""
+Amanzon Stock Reservations
+
+Checkout holds the cart's quantities for ``RESERVATION_TTL`` seconds
+while the customer pays, so the last units can't be sold to several
+people at once. Holds live in the indexed ``StockReservation`` table;
+a product's available stock is its stock minus the unexpired holds of
+other users.
+
+Paying converts the hold into a real stock decrement (see
+``services.create_order_from_cart``): lines covered by a live hold are
+taken without locking, anything else has to fit in the stock nobody
+else holds. Abandoned holds simply stop counting once they expire and
+are deleted in bulk by ``manage.py sweep_reservations``.
+"""
+
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, Iterable, Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+if TYPE_CHECKING:
+    from .models import User
+
+RESERVATION_TTL = getattr(settings, 'STOCK_RESERVATION_TTL', 60 * 15)
+
+
+def held_quantities(
+    product_ids: Iterable[int],
+    exclude_user: Optional['User'] = None,
+    now: Optional[datetime] = None,
+) -> dict[int, int]:
+    """Map product id -> quantity held by unexpired reservations."""
+    from .models import StockReservation
+
+    holds = StockReservation.objects.filter(
+        product_id__in=list(product_ids), expires_at__gt=now or timezone.now()
+    )
+    if exclude_user is not None:
+        holds = holds.exclude(user=exclude_user)
+    return dict(holds.values('product_id').annotate(held=Sum('quantity')).values_list('product_id', 'held'))
+
+
+def live_holds(user: 'User', now: Optional[datetime] = None) -> dict[int, int]:
+    """Map product id -> quantity ``user`` holds in unexpired reservations."""
+    from .models import StockReservation
+
+    return dict(
+        StockReservation.objects.filter(user=user, expires_at__gt=now or timezone.now())
+        .values_list('product_id', 'quantity')
+    )
+
+
+@transaction.atomic
+def reserve_cart(user: 'User', items: list) -> list[dict]:
+    """
+    Hold stock for every line of a user's cart, replacing earlier holds.
+
+    ``items`` are the cart's loaded items (with products). Products are
+    row-locked in primary-key order so concurrent checkouts for the same
+    units queue here instead of at payment time.
+
+    Returns stock issues in the shape of ``services.validate_cart_stock``
+    with 'available' net of other users' holds; nothing is held if there
+    are any.
+    """
+    from .models import Product, StockReservation
+
+    now = timezone.now()
+    quantities = {item.product_id: item.quantity for item in items}
+    stock = dict(
+        Product.objects.select_for_update().filter(pk__in=quantities).order_by('pk').values_list('pk', 'stock')
+    )
+    held = held_quantities(quantities, exclude_user=user, now=now)
+
+    issues = []
+    for item in items:
+        available = max(stock.get(item.product_id, 0) - held.get(item.product_id, 0), 0)
+        if item.quantity > available:
+            issues.append({
+                'product': item.product,
+                'requested': item.quantity,
+                'available': available,
+            })
+
+    StockReservation.objects.filter(user=user).delete()
+    if not issues:
+        expires_at = now + timedelta(seconds=RESERVATION_TTL)
+        StockReservation.objects.bulk_create([
+            StockReservation(user=user, product_id=product_id, quantity=quantity, expires_at=expires_at)
+            for product_id, quantity in quantities.items()
+        ])
+    return issues
+
+
+def release(user: 'User') -> None:
+    """Drop a user's holds, e.g. once their order has taken the stock."""
+    from .models import StockReservation
+
+    StockReservation.objects.filter(user=user).delete()
+
+
+def sweep_expired(now: Optional[datetime] = None) -> int:
+    """Delete every expired hold in one statement. Returns the number removed."""
+    from .models import StockReservation
+
+    deleted, _ = StockReservation.objects.filter(expires_at__lte=now or timezone.now()).delete()
+    return deleted
@@ -0,0 +1,169 @@
+"""
+Amanzon Product Search
+
+Ranked full-text search over product names and descriptions with
+stemming and prefix matching.
+
+Backends (picked from the database vendor):
+- PostgreSQL: ``Product.search_vector`` tsvector column with a GIN index
+- SQLite: ``store_product_fts`` FTS5 shadow table (porter stemmer)
+- Anything else: ``icontains`` fallback without ranking
+
+Both indexes are kept in sync by the Product signals in ``store.signals``.
+"""
+
+from __future__ import annotations
+
+import logging
+import re
+
+from django.db import DatabaseError, connection
+from django.db.models import FloatField, IntegerField, Q, QuerySet, Value
+from django.db.models.expressions import RawSQL
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = 'store_product_fts'
+SEARCH_CONFIG = 'english'
+MAX_TERMS = 8
+NAME_WEIGHT = 10.0  # bm25 column weight for name vs description
+DESCRIPTION_WEIGHT = 1.0
+
+
+def _terms(query: str) -> list[str]:
+    """Split a user query into lowercase word tokens safe for FTS syntax."""
+    return re.findall(r'\w+', query.lower())[:MAX_TERMS]
+
+
+# ============================================================================
+# QUERYING
+# ============================================================================
+
+def search_products(queryset: QuerySet, query: str) -> QuerySet:
+    """
+    Filter a Product queryset to those matching ``query``.
+
+    Matching products are annotated with ``search_rank`` (higher is
+    better) so callers can order by relevance with ``-search_rank``.
+    """
+    terms = _terms(query)
+    if not terms:
+        return _no_results(queryset)
+
+    if connection.vendor == 'postgresql':
+        return _search_postgres(queryset, terms)
+    if connection.vendor == 'sqlite':
+        try:
+            return _search_sqlite(queryset, terms)
+        except DatabaseError:
+            logger.warning('FTS5 search unavailable, falling back to icontains')
+    return _search_fallback(queryset, query)
+
+
+def _search_postgres(queryset: QuerySet, terms: list[str]) -> QuerySet:
+    from django.contrib.postgres.search import SearchQuery, SearchRank
+    from django.db.models.functions import Cast
+
+    # Every term must match; each one also matches as a prefix
+    search_query = SearchQuery(
+        ' & '.join(f'{term}:*' for term in terms),
+        config=SEARCH_CONFIG,
+        search_type='raw',
+    )
+    # ts_rank() is float4; as float8 the value keyset cursors store and
+    # compare against round-trips exactly, so boundary ranks aren't
+    # repeated or skipped between pages
+    return queryset.filter(search_vector=search_query).annotate(
+        search_rank=Cast(SearchRank('search_vector', search_query), FloatField())
+    )
+
+
+def _search_sqlite(queryset: QuerySet, terms: list[str]) -> QuerySet:
+    match = ' '.join(f'"{term}"*' for term in terms)
+    # Probe eagerly so a missing FTS5 table or module raises DatabaseError
+    # here, where search_products() can fall back, not when the page renders
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT 1 FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s LIMIT 1', [match])
+        if cursor.fetchone() is None:
+            return _no_results(queryset)
+
+    # bm25() is lower-is-better, so negate it to keep "higher is better"
+    product_table = queryset.model._meta.db_table
+    return queryset.filter(
+        pk__in=RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [match])
+    ).annotate(
+        search_rank=RawSQL(
+            f'SELECT -bm25({FTS_TABLE}, %s, %s) FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s AND rowid = "{product_table}"."id"',
+            [NAME_WEIGHT, DESCRIPTION_WEIGHT, match],
+            output_field=FloatField(),
+        )
+    )
+
+
+def _no_results(queryset: QuerySet) -> QuerySet:
+    # Keep the annotation so callers can still order by search_rank
+    return queryset.none().annotate(search_rank=Value(0, output_field=IntegerField()))
+
+
+def _search_fallback(queryset: QuerySet, query: str) -> QuerySet:
+    return queryset.filter(
+        Q(name__icontains=query) | Q(description__icontains=query)
+    ).annotate(search_rank=Value(0, output_field=IntegerField()))
+
+
+# ============================================================================
+# INDEX MAINTENANCE
+# ============================================================================
+
+def index_product(product) -> None:
+    """Add or refresh a product in the search index."""
+    if connection.vendor == 'postgresql':
+        from django.contrib.postgres.search import SearchVector
+        from .models import Product
+
+        Product.objects.filter(pk=product.pk).update(
+            search_vector=(
+                SearchVector('name', weight='A', config=SEARCH_CONFIG)
+                + SearchVector('description', weight='B', config=SEARCH_CONFIG)
+            )
+        )
+    elif connection.vendor == 'sqlite':
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [product.pk])
+                cursor.execute(
+                    f'INSERT INTO {FTS_TABLE} (rowid, name, description) VALUES (%s, %s, %s)',
+                    [product.pk, product.name, product.description],
+                )
+        except DatabaseError as e:
+            logger.warning(f'Failed to index product {product.pk}: {e}')
+
+
+def remove_product(product_id: int) -> None:
+    """Drop a deleted product from the search index."""
+    # The PostgreSQL vector lives on the product row and is deleted with it
+    if connection.vendor == 'sqlite':
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [product_id])
+        except DatabaseError as e:
+            logger.warning(f'Failed to unindex product {product_id}: {e}')
+
+
+def rebuild_index() -> None:
+    """Rebuild the whole search index from the products table."""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(
+                "UPDATE store_product SET search_vector = "
+                "setweight(to_tsvector(%s, coalesce(name, '')), 'A') || "
+                "setweight(to_tsvector(%s, coalesce(description, '')), 'B')",
+                [SEARCH_CONFIG, SEARCH_CONFIG],
+            )
+        elif connection.vendor == 'sqlite':
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, name, description) '
+                f'SELECT id, name, description FROM store_product'
+            )
@@ -5,22 +5,27 @@ Centralized business logic for cart calculations, shipping, order creation, etc.
 """
 
 from __future__ import annotations
-from decimal import Decimal
+import logging
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
 from io import BytesIO
+from dataclasses import dataclass
 from typing import TYPE_CHECKING, Any, Optional
-import razorpay
 from django.conf import settings
-from django.core.mail import send_mail
+from django.core.cache import cache
 from django.core.files.uploadedfile import InMemoryUploadedFile
-from django.db import transaction
-from django.db.models import F
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Case, Count, F, IntegerField, Q, QuerySet, Sum, Value, When
+from django.utils import timezone
 from PIL import Image
 
-from .exceptions import StockError, PaymentError, OrderError
+from . import caching, coupons, outbox, payments, reservations
+from .exceptions import DuplicateOrderError, StockError, PaymentError, OrderError
 
 if TYPE_CHECKING:
     from .models import Cart, Coupon, Order, User
 
+logger = logging.getLogger(__name__)
+
 # ============================================================================
 # CONSTANTS (configurable via settings)
 # ============================================================================
@@ -28,6 +33,7 @@ if TYPE_CHECKING:
 FREE_SHIPPING_THRESHOLD = Decimal(str(getattr(settings, 'FREE_SHIPPING_THRESHOLD', 500)))
 SHIPPING_COST = Decimal(str(getattr(settings, 'SHIPPING_COST', 50)))
 OTP_EXPIRY_SECONDS = getattr(settings, 'OTP_EXPIRY_SECONDS', 600)  # 10 minutes
+USER_COUNTS_TIMEOUT = 60 * 60
 MAX_IMAGE_SIZE = (800, 800)
 IMAGE_QUALITY = 85
 
@@ -108,17 +114,24 @@ def calculate_discount(subtotal: Decimal, coupon: Optional[Coupon]) -> Decimal:
     return (subtotal * coupon.discount_percent) / 100
 
 
-def calculate_cart_totals(cart: Cart, coupon: Optional[Coupon] = None) -> dict[str, Decimal]:
+def calculate_cart_totals(
+    cart: Cart,
+    coupon: Optional[Coupon] = None,
+    items: Optional[list] = None,
+) -> dict[str, Decimal]:
     """
     Calculate all cart totals including subtotal, shipping, discount, and total.
     
+    Pass the already loaded ``items`` to avoid another query; otherwise the
+    subtotal comes from one aggregate query.
+    
     Returns dict with:
         - subtotal: Sum of all item prices
         - shipping: Shipping cost (0 if free shipping applies)
         - discount: Discount amount (0 if no valid coupon)
         - total: Final total (subtotal + shipping - discount)
     """
-    subtotal = cart.subtotal
+    _, subtotal = cart.get_totals(items)
     shipping = calculate_shipping(subtotal)
     discount = calculate_discount(subtotal, coupon)
     total = subtotal + shipping - discount
@@ -131,10 +144,243 @@ def calculate_cart_totals(cart: Cart, coupon: Optional[Coupon] = None) -> dict[s
     }
 
 
+# ============================================================================
+# CART MUTATIONS
+# ============================================================================
+
+@dataclass(frozen=True)
+class CartAddResult:
+    """Outcome of add_to_cart()."""
+    product_name: str
+    stock: int
+    quantity: Optional[int]  # Quantity now in the cart, None if nothing changed
+
+    @property
+    def added(self) -> bool:
+        return self.quantity is not None
+
+
+# One statement: ensure the cart exists, insert the item or bump its
+# quantity unless it already matches the product's stock, and report back
+_ADD_TO_CART_POSTGRES = """
+WITH product AS (
+    SELECT id, name, stock FROM store_product WHERE id = %(product_id)s AND is_active
+), cart AS (
+    INSERT INTO store_cart (user_id, created_at, updated_at)
+    VALUES (%(user_id)s, %(now)s, %(now)s)
+    ON CONFLICT (user_id) DO UPDATE SET updated_at = EXCLUDED.updated_at
+    RETURNING id
+), item AS (
+    INSERT INTO store_cartitem (cart_id, product_id, quantity)
+    SELECT cart.id, product.id, 1 FROM cart, product WHERE product.stock > 0
+    ON CONFLICT (cart_id, product_id) DO UPDATE SET quantity = store_cartitem.quantity + 1
+    WHERE store_cartitem.quantity < (
+        SELECT stock FROM store_product WHERE id = EXCLUDED.product_id
+    )
+    RETURNING quantity
+)
+SELECT product.name, product.stock, (SELECT quantity FROM item) FROM product
+"""
+
+_UPSERT_CART_SQLITE = """
+INSERT INTO store_cart (user_id, created_at, updated_at) VALUES (%s, %s, %s)
+ON CONFLICT (user_id) DO UPDATE SET updated_at = excluded.updated_at
+RETURNING id
+"""
+
+_UPSERT_CART_ITEM_SQLITE = """
+INSERT INTO store_cartitem (cart_id, product_id, quantity)
+SELECT %s, id, 1 FROM store_product WHERE id = %s AND stock > 0
+ON CONFLICT (cart_id, product_id) DO UPDATE SET quantity = quantity + 1
+WHERE quantity < (SELECT stock FROM store_product WHERE id = excluded.product_id)
+RETURNING quantity
+"""
+
+
+def add_to_cart(user: 'User', product_id: int) -> Optional[CartAddResult]:
+    """
+    Add one unit of a product to the user's cart, capped at current stock.
+    
+    The increment is a conditional upsert, so concurrent clicks cannot
+    lose updates or push the quantity past stock. On PostgreSQL the cart,
+    the item and the outcome are handled in a single round trip.
+    Returns None if the product doesn't exist or is inactive.
+    """
+    now = timezone.now()
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(_ADD_TO_CART_POSTGRES, {
+                'product_id': product_id, 'user_id': user.pk, 'now': now,
+            })
+            row = cursor.fetchone()
+    elif connection.vendor == 'sqlite':
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT name, stock FROM store_product WHERE id = %s AND is_active', [product_id]
+            )
+            product = cursor.fetchone()
+            if product is None:
+                return None
+            cursor.execute(_UPSERT_CART_SQLITE, [user.pk, now, now])
+            cart_id = cursor.fetchone()[0]
+            cursor.execute(_UPSERT_CART_ITEM_SQLITE, [cart_id, product_id])
+            item = cursor.fetchone()
+            row = (*product, item[0] if item else None)
+    else:
+        row = _add_to_cart_orm(user, product_id)
+    
+    if row is None:
+        return None
+    result = CartAddResult(*row)
+    if result.added:
+        adjust_user_count(user.pk, 'cart', 1)
+    return result
+
+
+def _add_to_cart_orm(user: 'User', product_id: int) -> Optional[tuple]:
+    from .models import Cart, CartItem, Product
+    
+    product = Product.objects.filter(pk=product_id, is_active=True).values_list('name', 'stock').first()
+    if product is None:
+        return None
+    name, stock = product
+    if stock <= 0:
+        return name, stock, None
+    
+    with transaction.atomic():
+        cart, _ = Cart.objects.get_or_create(user=user)
+        item, created = CartItem.objects.get_or_create(cart=cart, product_id=product_id)
+        if created:
+            return name, stock, 1
+        updated = CartItem.objects.filter(pk=item.pk, quantity__lt=stock).update(quantity=F('quantity') + 1)
+        return name, stock, item.quantity + 1 if updated else None
+
+
+@transaction.atomic
+def update_cart_quantities(user: 'User', quantities: dict[int, int]) -> list[dict[str, Any]]:
+    """
+    Set the quantities of several of the user's cart items at once.
+    
+    All items and their stock are read in one query. If any quantity
+    exceeds stock nothing is written and the problems are returned, in
+    the shape of validate_cart_stock() plus 'item_id'. Otherwise changed
+    items are saved with one bulk_update and zero quantities removed with
+    one DELETE. Ids not in the user's cart are ignored.
+    """
+    from .models import CartItem
+    
+    items = list(
+        CartItem.objects.filter(cart__user=user, pk__in=quantities)
+        .select_related('product')
+        .select_for_update(of=('self',))
+    )
+    issues = [
+        {
+            'item_id': item.pk,
+            'product': item.product,
+            'requested': quantities[item.pk],
+            'available': item.product.stock,
+        }
+        for item in items if quantities[item.pk] > item.product.stock
+    ]
+    if issues:
+        return issues
+    
+    changed, removed = [], []
+    delta = 0
+    for item in items:
+        quantity = quantities[item.pk]
+        if quantity == item.quantity:
+            continue
+        delta += quantity - item.quantity
+        if quantity == 0:
+            removed.append(item.pk)
+        else:
+            item.quantity = quantity
+            changed.append(item)
+    
+    if changed:
+        CartItem.objects.bulk_update(changed, ['quantity'])
+    if removed:
+        CartItem.objects.filter(pk__in=removed).delete()
+    if delta:
+        transaction.on_commit(lambda: adjust_user_count(user.pk, 'cart', delta))
+    return issues
+
+
 # ============================================================================
 # ORDER SERVICES
 # ============================================================================
 
+def _lock_products(product_ids) -> dict[int, int]:
+    """
+    Row-lock products in primary-key order and return their stock.
+
+    Checkouts and cancellations touching overlapping products always take
+    their locks in the same order, so they queue instead of deadlocking.
+    (A no-op on SQLite, which serializes writers on the whole database.)
+    """
+    from .models import Product
+
+    return dict(
+        Product.objects.select_for_update().filter(pk__in=product_ids).order_by('pk').values_list('pk', 'stock')
+    )
+
+
+def _quantity_case(quantities: dict[int, int]) -> Case:
+    """CASE expression mapping each product id to its quantity."""
+    return Case(
+        *[When(pk=pk, then=Value(qty)) for pk, qty in sorted(quantities.items())],
+        output_field=IntegerField(),
+    )
+
+
+def _decrement_stock(user: 'User', items: list) -> None:
+    """
+    Convert the user's checkout holds into a real stock decrement.
+
+    Lines covered by a live hold had their units set aside at checkout,
+    so they are taken without locking. Any other line (no hold, the hold
+    expired, or the cart grew since checkout) must fit in the stock other
+    users don't hold; those products are locked in primary-key order
+    first, the same lock ``reservations.reserve_cart`` takes, so the
+    check can't race a concurrent reservation.
+
+    All lines are then taken off in one UPDATE that only matches rows
+    still holding enough stock. If any line is short StockError is raised
+    and the enclosing transaction rolls the whole order back. The
+    CHECK (stock >= 0) of the PositiveIntegerField backs this up at the
+    database level.
+    """
+    from .models import Product
+
+    quantities: dict[int, int] = {}
+    for item in items:
+        quantities[item.product_id] = quantities.get(item.product_id, 0) + item.quantity
+
+    now = timezone.now()
+    holds = reservations.live_holds(user, now=now)
+    unheld = {pk: qty for pk, qty in quantities.items() if qty > holds.get(pk, 0)}
+    if unheld:
+        stock = _lock_products(unheld)
+        held = reservations.held_quantities(unheld, exclude_user=user, now=now)
+        short = [
+            item.product.name for item in items
+            if item.product_id in unheld
+            and unheld[item.product_id] > stock.get(item.product_id, 0) - held.get(item.product_id, 0)
+        ]
+        if short:
+            raise StockError(f'Insufficient stock for {", ".join(short)}')
+
+    delta = _quantity_case(quantities)
+    updated = Product.objects.filter(pk__in=quantities, stock__gte=delta).update(
+        stock=F('stock') - delta, updated_at=timezone.now()
+    )
+    if updated != len(quantities):
+        short = [item.product.name for item in items if item.quantity > item.product.stock]
+        raise StockError(f'Insufficient stock for {", ".join(short) or "some items"}')
+
+
 @transaction.atomic
 def create_order_from_cart(
     user: 'User',
@@ -149,65 +395,93 @@ def create_order_from_cart(
     
     This function:
     1. Creates the Order with billing details
-    2. Creates OrderItems for each cart item
-    3. Decrements product stock
+    2. Converts the checkout stock reservation into a stock decrement
+    3. Bulk-creates the OrderItems
     4. Records coupon usage if applicable
-    5. Clears the cart
+    5. Clears the cart and releases its checkout stock reservation
+    
+    The number of queries does not depend on the number of cart lines.
+    Raises StockError (rolling everything back) if any line is short, and
+    DuplicateOrderError if ``razorpay_order_id`` already has an order.
     
     Returns the created Order instance.
     """
-    from .models import Order, OrderItem, CouponUsage
-    
-    totals = calculate_cart_totals(cart, coupon)
-    
-    # Create the order
-    order = Order.objects.create(
-        user=user,
-        first_name=billing_data.get('first_name', ''),
-        last_name=billing_data.get('last_name', ''),
-        email=billing_data.get('email', ''),
-        phone=billing_data.get('phone', ''),
-        address_line1=billing_data.get('address_line1', ''),
-        address_line2=billing_data.get('address_line2', ''),
-        city=billing_data.get('city', ''),
-        state=billing_data.get('state', ''),
-        country=billing_data.get('country', 'India'),
-        zip_code=billing_data.get('zip_code', ''),
-        subtotal=totals['subtotal'],
-        shipping_cost=totals['shipping'],
-        discount=totals['discount'],
-        total=totals['total'],
-        razorpay_order_id=razorpay_order_id,
-        razorpay_payment_id=razorpay_payment_id,
-        is_paid=True,
-        status='confirmed',
-    )
+    from .models import Address, Order, OrderItem, CouponUsage
     
-    # Create order items and decrement stock atomically
-    for item in cart.items.select_related('product').all():
-        # C3/C4: Validate stock availability inside transaction
-        if item.quantity > item.product.stock:
-            raise StockError(f'Insufficient stock for {item.product.name}')
-        
-        OrderItem.objects.create(
+    # The caller's usage check may come from a stale per-process cache
+    if coupon and coupons.has_used(user, coupon, fresh=True):
+        logger.warning(f'User {user.pk} already used coupon {coupon.code}; placing order without it')
+        coupon = None
+    
+    items = list(cart.items.select_related('product'))
+    totals = calculate_cart_totals(cart, coupon, items=items)
+    
+    # Insert the order first: a replayed callback for the same Razorpay order
+    # fails here on the unique constraint (waiting for the first one to
+    # commit) before touching stock
+    try:
+        with transaction.atomic():
+            order = Order.objects.create(
+                user=user,
+                first_name=billing_data.get('first_name', ''),
+                last_name=billing_data.get('last_name', ''),
+                email=billing_data.get('email', ''),
+                phone=billing_data.get('phone', ''),
+                address_line1=billing_data.get('address_line1', ''),
+                address_line2=billing_data.get('address_line2', ''),
+                city=billing_data.get('city', ''),
+                state=billing_data.get('state', ''),
+                country=billing_data.get('country', 'India'),
+                zip_code=billing_data.get('zip_code', ''),
+                subtotal=totals['subtotal'],
+                shipping_cost=totals['shipping'],
+                discount=totals['discount'],
+                total=totals['total'],
+                razorpay_order_id=razorpay_order_id,
+                razorpay_payment_id=razorpay_payment_id,
+                is_paid=True,
+                status='confirmed',
+                # Summary for the order history list, so it never reads items
+                item_count=sum(item.quantity for item in items),
+                preview_name=items[0].product.name if items else '',
+                preview_image=(items[0].product.image.name or None) if items else None,
+            )
+    except IntegrityError:
+        existing = Order.objects.filter(razorpay_order_id=razorpay_order_id).values_list('pk', flat=True).first()
+        if existing is None:
+            raise
+        raise DuplicateOrderError(existing)
+    
+    # C3/C4: Convert the checkout hold into a stock decrement inside the transaction
+    _decrement_stock(user, items)
+    
+    OrderItem.objects.bulk_create([
+        OrderItem(
             order=order,
             product=item.product,
             product_name=item.product.name,
             price=item.product.price,
             quantity=item.quantity,
         )
-        
-        # C4: Use F() expression for atomic stock decrement to prevent race conditions
-        from .models import Product
-        Product.objects.filter(pk=item.product.pk).update(stock=F('stock') - item.quantity)
+        for item in items
+    ])
+    
+    # Queryset updates skip signals; in-stock listings and facets change on sell-out
+    if any(item.quantity == item.product.stock for item in items):
+        caching.bump_catalog_version()
     
     # Record coupon usage if applicable
     if coupon:
-        CouponUsage.objects.create(coupon=coupon, user=user, order=order)
+        try:
+            with transaction.atomic():
+                CouponUsage.objects.create(coupon=coupon, user=user, order=order)
+        except IntegrityError:
+            # A concurrent checkout redeemed it first; the payment is already
+            # captured, so keep the order rather than failing it
+            logger.warning(f'Coupon {coupon.code} redeemed concurrently by user {user.pk} (order {order.pk})')
     
     # Auto-save address if user has no saved addresses (first order)
-    from .models import Address
-    if not Address.objects.filter(user=user).exists():
+    if not user.addresses.exists():
         Address.objects.create(
             user=user,
             label='Home',
@@ -223,21 +497,23 @@ def create_order_from_cart(
             is_default=True,
         )
     
-    # Clear cart
+    # Clear cart; the stock it held at checkout is now taken
     cart.items.all().delete()
+    reservations.release(user)
+    transaction.on_commit(lambda: reset_user_count(user.pk, 'cart'))
     
     return order
 
 
 def send_order_confirmation_email(order):
     """
-    Send order confirmation email to customer.
-    Returns True if successful, False otherwise.
+    Queue the order confirmation email for the outbox worker.
+    
+    It is only queued if the order's transaction commits.
     """
-    try:
-        send_mail(
-            subject=f'Order Confirmation - #{order.id}',
-            message=f'''Hi {order.first_name},
+    outbox.enqueue(
+        subject=f'Order Confirmation - #{order.id}',
+        body=f'''Hi {order.first_name},
 
 Thank you for your order!
 
@@ -249,47 +525,160 @@ We'll notify you when your order ships.
 
 Best regards,
 Amanzon Team''',
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[order.email],
-            fail_silently=True,
-        )
-        return True
-    except Exception:
-        return False
+        recipients=[order.email],
+    )
 
 
-@transaction.atomic
 def cancel_order(order):
     """
     Cancel an order, restore stock, and process refund if paid.
     
+    A paid order is first claimed by moving it to 'cancelling', so only
+    one of several concurrent cancellations refunds it. The refund runs
+    outside any transaction; if it fails the claim is reverted and the
+    order keeps its status. Once it succeeds the refund id is recorded
+    on the order, so if restocking then fails (or the process dies) the
+    cancellation can be finished later by calling this again or by
+    ``manage.py finish_cancellations``, without refunding twice.
+    
+    Stock goes back in one set-based ``F()`` update in the same
+    transaction that marks the order cancelled, so concurrent checkouts
+    decrementing the same products are never overwritten and stock is
+    restored exactly once.
+    
     Returns (success, message) tuple.
     """
-    if order.status not in ['pending', 'confirmed']:
+    from .models import Order
+    
+    if not order.is_cancellable:
         return False, 'Order cannot be cancelled in its current state.'
+    if order.status == 'cancelling':
+        # Refunded earlier; only the restock is left
+        return _finish_cancellation(order, 'cancelling')
     
-    # Process Refund FIRST if paid (before restoring stock)
-    if order.is_paid and order.razorpay_payment_id:
-        try:
-            client = razorpay.Client(auth=(settings.RAZORPAY_KEY_ID, settings.RAZORPAY_KEY_SECRET))
-            refund_amount = int(order.total * 100)
-            client.payment.refund(order.razorpay_payment_id, {'amount': refund_amount})
-        except Exception as e:
-            # Refund failed - do not cancel order
-            return False, f'Refund failed: {str(e)}. Order not cancelled.'
-    
-    # Refund succeeded (or order was unpaid) - now restore stock
-    for item in order.items.select_related('product').all():
-        if item.product:  # Product may have been deleted
-            item.product.stock += item.quantity
-            item.product.save(update_fields=['stock'])
+    previous_status = order.status
+    if not (order.is_paid and order.razorpay_payment_id):
+        return _finish_cancellation(order, previous_status)
+    
+    claimed = Order.objects.filter(pk=order.pk, status=previous_status).update(
+        status='cancelling', updated_at=timezone.now()
+    )
+    if not claimed:
+        return False, 'Order cannot be cancelled in its current state.'
+    try:
+        refund_amount = int(order.total * 100)
+        refund = payments.get_gateway().refund(order.razorpay_payment_id, refund_amount)
+    except Exception as e:
+        # Refund failed - give the order its status back
+        Order.objects.filter(pk=order.pk, status='cancelling').update(
+            status=previous_status, updated_at=timezone.now()
+        )
+        return False, f'Refund failed: {str(e)}. Order not cancelled.'
+    
+    # Record the refund before restocking so a failed restock can be resumed
+    order.razorpay_refund_id = str(refund['id'])
+    Order.objects.filter(pk=order.pk).update(razorpay_refund_id=order.razorpay_refund_id, updated_at=timezone.now())
+    order.status = 'cancelling'
+    return _finish_cancellation(order, 'cancelling')
+
+
+@transaction.atomic
+def _finish_cancellation(order, from_status: str):
+    """
+    Move ``order`` from ``from_status`` to cancelled and restore its stock.
+    
+    The conditional status update is the claim: a concurrent cancel (or
+    a second resume) matches no row and restores nothing.
+    """
+    from .models import Order, OrderItem, Product
+    
+    claimed = Order.objects.filter(pk=order.pk, status=from_status).update(
+        status='cancelled', updated_at=timezone.now()
+    )
+    if not claimed:
+        return False, 'Order cannot be cancelled in its current state.'
+    
+    quantities: dict[int, int] = {}
+    # Product may have been deleted
+    lines = OrderItem.objects.filter(order=order, product__isnull=False).values_list('product_id', 'quantity')
+    for product_id, quantity in lines:
+        quantities[product_id] = quantities.get(product_id, 0) + quantity
+    
+    if quantities:
+        _lock_products(quantities)
+        Product.objects.filter(pk__in=quantities).update(
+            stock=F('stock') + _quantity_case(quantities), updated_at=timezone.now()
+        )
+        # Queryset updates skip signals; sold-out products may be back in stock
+        transaction.on_commit(caching.bump_catalog_version)
     
     order.status = 'cancelled'
-    order.save()
     
     return True, 'Order cancelled successfully.'
 
 
+def finish_cancellations() -> tuple[int, int]:
+    """
+    Finish every cancellation that was refunded but never restocked.
+    
+    Returns (finished, unresolved), where unresolved counts 'cancelling'
+    orders with no recorded refund: the process stopped while talking to
+    Razorpay, so staff must check the payment before resolving them.
+    """
+    from .models import Order
+    
+    stuck = Order.objects.filter(status='cancelling')
+    finished = 0
+    for order in stuck.exclude(razorpay_refund_id=''):
+        success, _ = cancel_order(order)
+        finished += success
+    return finished, stuck.filter(razorpay_refund_id='').count()
+
+
+# ============================================================================
+# NAVBAR COUNTS
+# ============================================================================
+
+def _user_count_key(user_id: int, name: str) -> str:
+    return f'user:{user_id}:{name}_count'
+
+
+def get_user_counts(user: 'User') -> dict[str, int]:
+    """
+    Cart quantity and wishlist size for the navbar badges.
+    
+    Each count is cached per user and kept current by the cart and
+    wishlist views via adjust_user_count(), so most page views read both
+    from the cache without a query.
+    """
+    keys = {name: _user_count_key(user.pk, name) for name in ('cart', 'wishlist')}
+    cached = cache.get_many(keys.values())
+    counts = {name: cached.get(key) for name, key in keys.items()}
+    
+    if counts['cart'] is None:
+        from .models import CartItem
+        result = CartItem.objects.filter(cart__user=user).aggregate(total=Sum('quantity'))
+        counts['cart'] = result['total'] or 0
+        cache.set(keys['cart'], counts['cart'], USER_COUNTS_TIMEOUT)
+    if counts['wishlist'] is None:
+        counts['wishlist'] = user.wishlist.count()
+        cache.set(keys['wishlist'], counts['wishlist'], USER_COUNTS_TIMEOUT)
+    return counts
+
+
+def adjust_user_count(user_id: int, name: str, delta: int) -> None:
+    """Apply a known change to a cached count (no-op if it isn't cached)."""
+    try:
+        cache.incr(_user_count_key(user_id, name), delta)
+    except ValueError:
+        pass
+
+
+def reset_user_count(user_id: int, name: str) -> None:
+    """Drop a cached count so it is recounted on the next read."""
+    cache.delete(_user_count_key(user_id, name))
+
+
 # ============================================================================
 # COUPON SERVICES
 # ============================================================================
@@ -302,40 +691,200 @@ def get_valid_coupon(code, user=None):
     If valid, error_message is None.
     If invalid, coupon is None.
     """
-    from .models import Coupon, CouponUsage
-    
     if not code:
         return None, 'Please enter a coupon code.'
     
-    try:
-        coupon = Coupon.objects.get(code__iexact=code.strip())
-    except Coupon.DoesNotExist:
+    # In-memory registry lookup (inactive coupons are not in it)
+    coupon = coupons.get_coupon(code)
+    if coupon is None:
         return None, 'Invalid coupon code.'
     
     if not coupon.is_valid():
         return None, 'This coupon has expired.'
     
     # Check if user has already used this coupon
-    if user and CouponUsage.objects.filter(coupon=coupon, user=user).exists():
+    if user and coupons.has_used(user, coupon):
         return None, 'You have already used this coupon.'
     
     return coupon, None
 
 
+# ============================================================================
+# CATALOG FILTERS
+# ============================================================================
+
+# Query-string parameters understood by filter_products()
+PRODUCT_FILTERS = ('subcategory', 'q', 'min_price', 'max_price', 'rating', 'in_stock')
+
+
+def parse_decimal_param(value: Any) -> Optional[Decimal]:
+    """Parse a query-string value as Decimal, returning None if invalid."""
+    try:
+        return Decimal(str(value)) if value not in (None, '') else None
+    except InvalidOperation:
+        return None
+
+
+def parse_int_param(value: Any) -> Optional[int]:
+    """Parse a query-string value as int, returning None if invalid."""
+    try:
+        return int(value) if value not in (None, '') else None
+    except (ValueError, TypeError):
+        return None
+
+
+def product_filter_conditions(params: Any) -> dict[str, Q]:
+    """
+    Build a Q object for each active shop filter in ``params``.
+    
+    Keys are 'subcategory', 'price', 'rating' and 'in_stock'; inactive or
+    invalid filters are left out. Search (``q``) is handled separately
+    by filter_products() since it needs the search backend.
+    """
+    conditions = {}
+    
+    subcategory_id = parse_int_param(params.get('subcategory'))
+    if subcategory_id is not None:
+        conditions['subcategory'] = Q(subcategory_id=subcategory_id)
+    
+    price = Q()
+    min_price = parse_decimal_param(params.get('min_price'))
+    max_price = parse_decimal_param(params.get('max_price'))
+    if min_price is not None:
+        price &= Q(price__gte=min_price)
+    if max_price is not None:
+        price &= Q(price__lte=max_price)
+    if price:
+        conditions['price'] = price
+    
+    min_rating = parse_int_param(params.get('rating'))
+    if min_rating is not None:
+        conditions['rating'] = Q(rating_avg__gte=min_rating)
+    
+    if params.get('in_stock') == '1':
+        conditions['in_stock'] = Q(stock__gt=0)
+    
+    return conditions
+
+
+def filter_products(queryset: QuerySet, params: Any) -> QuerySet:
+    """
+    Apply the shop's query-string filters to a Product queryset.
+    
+    ``params`` is a QueryDict or dict; invalid values are ignored.
+    A ``q`` search annotates ``search_rank`` on the results.
+    """
+    from . import search
+    
+    for condition in product_filter_conditions(params).values():
+        queryset = queryset.filter(condition)
+    
+    query = (params.get('q') or '').strip()
+    if query:
+        queryset = search.search_products(queryset, query)
+    
+    return queryset
+
+
+# ============================================================================
+# RATING AGGREGATES
+# ============================================================================
+
+def _rating_fields(histogram: list[int]) -> dict[str, Any]:
+    """Build the denormalized Product rating fields from a 1-5 star histogram."""
+    count = sum(histogram)
+    total = sum(stars * n for stars, n in enumerate(histogram, start=1))
+    if count:
+        avg = (Decimal(total) / count).quantize(Decimal('0.1'), rounding=ROUND_HALF_UP)
+    else:
+        avg = Decimal('0')
+    return {
+        'rating_avg': avg,
+        'rating_count': count,
+        'rating_histogram': histogram,
+    }
+
+
+@transaction.atomic
+def apply_review_rating(product_id: int, rating: int, delta: int) -> None:
+    """
+    Incrementally add (delta=1) or remove (delta=-1) a review's rating
+    from the stored aggregates of a product.
+    
+    The product row is locked for the read-modify-write so concurrent
+    reviews on the same product don't lose updates.
+    """
+    from .models import Product
+    
+    histogram = (
+        Product.objects.select_for_update()
+        .filter(pk=product_id)
+        .values_list('rating_histogram', flat=True)
+        .first()
+    )
+    if histogram is None:
+        return  # Product is being deleted
+    
+    histogram = list(histogram) or [0] * 5
+    histogram[rating - 1] = max(0, histogram[rating - 1] + delta)
+    Product.objects.filter(pk=product_id).update(updated_at=timezone.now(), **_rating_fields(histogram))
+
+
+@transaction.atomic
+def rebuild_rating_aggregates(product_ids: list[int]) -> int:
+    """
+    Recompute stored rating aggregates for the given products from their reviews.
+    
+    Uses one grouped query over reviews, one read of the stored histograms
+    and one bulk update of the products whose aggregates changed. Changed
+    products get a new ``updated_at`` (which conditional GETs read from
+    the database) and the catalog version is bumped on commit.
+    Returns the number of products updated.
+    """
+    from .models import Product, Review
+    
+    histograms = {pk: [0] * 5 for pk in product_ids}
+    rows = (
+        Review.objects.filter(product_id__in=product_ids)
+        .values_list('product_id', 'rating')
+        .annotate(n=Count('id'))
+        .order_by()
+    )
+    for product_id, rating, n in rows:
+        histograms[product_id][rating - 1] = n
+    
+    rows = Product.objects.filter(pk__in=product_ids).values('pk', 'rating_avg', 'rating_count', 'rating_histogram')
+    stored = {row.pop('pk'): row for row in rows}
+    now = timezone.now()
+    products = []
+    for pk, histogram in histograms.items():
+        fields = _rating_fields(histogram)
+        if pk in stored and stored[pk] != fields:
+            products.append(Product(pk=pk, updated_at=now, **fields))
+    if products:
+        Product.objects.bulk_update(products, ['rating_avg', 'rating_count', 'rating_histogram', 'updated_at'])
+        # Queryset updates skip signals; listings sorted by rating change
+        transaction.on_commit(caching.bump_catalog_version)
+    return len(products)
+
+
 # ============================================================================
 # STOCK VALIDATION
 # ============================================================================
 
-def validate_cart_stock(cart):
+def validate_cart_stock(cart, items=None):
     """
     Validate that all items in cart are still in stock.
     
+    ``items`` may be the cart's already loaded items (with products).
     Returns list of items with insufficient stock.
     Each item is a dict with 'product', 'requested', 'available'.
     """
     issues = []
+    if items is None:
+        items = cart.items.select_related('product').all()
     
-    for item in cart.items.select_related('product').all():
+    for item in items:
         if item.quantity > item.product.stock:
             issues.append({
                 'product': item.product,
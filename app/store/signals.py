@@ -0,0 +1,91 @@
+"""
+Amanzon Signal Handlers
+
+Keeps denormalized data in sync with the rows it is derived from.
+"""
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import caching, category_tree, coupons, search, services, suggest
+from .models import Category, Coupon, CouponUsage, Product, Review, SubCategory
+
+
+def invalidate_catalog():
+    """
+    Bump the catalog version now and again once the transaction commits,
+    so a request that re-caches old rows mid-transaction is invalidated too.
+    """
+    caching.bump_catalog_version()
+    transaction.on_commit(caching.bump_catalog_version)
+
+
+def invalidate_categories():
+    """Same as invalidate_catalog() for the per-process category tree."""
+    category_tree.invalidate()
+    transaction.on_commit(category_tree.invalidate)
+
+
+@receiver(post_save, sender=Review)
+def review_saved(sender, instance, created, **kwargs):
+    """Update the product's rating aggregates when a review is written."""
+    if created:
+        services.apply_review_rating(instance.product_id, instance.rating, 1)
+    else:
+        # Rating may have been edited (e.g. in admin); recount this product
+        services.rebuild_rating_aggregates([instance.product_id])
+    invalidate_catalog()
+
+
+@receiver(post_delete, sender=Review)
+def review_deleted(sender, instance, **kwargs):
+    """Remove a deleted review from the product's rating aggregates."""
+    services.apply_review_rating(instance.product_id, instance.rating, -1)
+    invalidate_catalog()
+
+
+@receiver(post_save, sender=Product)
+def product_saved(sender, instance, update_fields=None, **kwargs):
+    """Keep the search index in sync with product name/description."""
+    invalidate_catalog()
+    invalidate_categories()  # Product counts per category
+    suggest.update_product(instance, update_fields)
+    if update_fields and not {'name', 'description'} & set(update_fields):
+        return
+    search.index_product(instance)
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted(sender, instance, **kwargs):
+    """Remove a deleted product from the search index."""
+    invalidate_catalog()
+    invalidate_categories()
+    search.remove_product(instance.pk)
+    suggest.remove_product(instance.pk)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=SubCategory)
+@receiver(post_delete, sender=SubCategory)
+def category_changed(sender, **kwargs):
+    """Category edits change listings, facets and navigation."""
+    invalidate_catalog()
+    invalidate_categories()
+
+
+@receiver(post_save, sender=Coupon)
+@receiver(post_delete, sender=Coupon)
+def coupon_changed(sender, **kwargs):
+    """Reload the per-worker coupon registries."""
+    coupons.invalidate()
+    transaction.on_commit(coupons.invalidate)
+
+
+@receiver(post_save, sender=CouponUsage)
+@receiver(post_delete, sender=CouponUsage)
+def coupon_usage_changed(sender, instance, **kwargs):
+    """Drop the user's cached used-coupon set."""
+    coupons.invalidate_usage(instance.user_id)
+    transaction.on_commit(lambda: coupons.invalidate_usage(instance.user_id))
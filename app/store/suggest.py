@@ -0,0 +1,241 @@
+"""
+Amanzon Search Suggestions
+
+Typeahead suggestions served from memory. Each worker holds a sorted
+array of ``(key, product_id)`` pairs, one per word start in every active
+product name ("blue running shoe", "running shoe", "shoe"), and answers a
+prefix with a ``bisect`` into that array. Category names come from the
+per-process category tree and popular queries from a small in-process
+counter, so a suggestion request never touches the database.
+
+Product signals bump a version number in the cache once the transaction
+commits, and the worker that made the change patches its own index in
+place when it was current up to that bump. The version only reaches
+other workers through a shared cache backend; with the default
+per-process LocMemCache (and for bulk updates that skip signals) they
+pick up changes by rebuilding once their index is ``INDEX_TTL`` seconds
+old.
+"""
+
+from __future__ import annotations
+
+import re
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import Counter
+from dataclasses import dataclass
+from typing import Optional
+
+from django.db import transaction
+
+from . import caching, category_tree
+
+SUGGEST_VERSION_KEY = 'catalog:suggest:version'
+INDEX_TTL = 60 * 5
+SUGGEST_LIMIT = 8
+MIN_PREFIX_LENGTH = 2
+MAX_TRACKED_QUERIES = 1000
+POPULAR_QUERIES = 100
+SUGGEST_FIELDS = {'name', 'slug', 'is_active'}  # Product fields the index shows
+
+_index: Optional['PrefixIndex'] = None
+_lock = threading.Lock()
+_query_counts: Counter = Counter()
+
+
+def normalize(text: str) -> str:
+    """Lowercase and collapse whitespace so keys and prefixes compare equal."""
+    return ' '.join(re.findall(r'\w+', text.lower()))
+
+
+def _word_keys(name: str) -> list[str]:
+    normalized = normalize(name)
+    return [normalized[m.start():] for m in re.finditer(r'\w+', normalized)]
+
+
+@dataclass(frozen=True)
+class Suggestion:
+    kind: str  # 'product', 'category' or 'query'
+    label: str
+    slug: str = ''
+
+
+class PrefixIndex:
+    """
+    Sorted ``(key, product_id)`` array over product names.
+
+    Treated as immutable once published: updates build a new index so
+    concurrent readers always see a consistent array.
+    """
+
+    def __init__(self, version: int, keys: list[tuple[str, int]], products: dict[int, Suggestion], loaded_at: float):
+        self.version = version
+        self.keys = keys
+        self.products = products
+        # When the rows were read from the database; patches keep it
+        self.loaded_at = loaded_at
+
+    def is_fresh(self, version: int) -> bool:
+        return self.version == version and time.monotonic() - self.loaded_at < INDEX_TTL
+
+    @classmethod
+    def build(cls, version: int, rows) -> 'PrefixIndex':
+        """Build from ``(id, name, slug)`` rows."""
+        keys = []
+        products = {}
+        for pk, name, slug in rows:
+            products[pk] = Suggestion('product', name, slug)
+            keys.extend((key, pk) for key in _word_keys(name))
+        keys.sort()
+        return cls(version, keys, products, time.monotonic())
+
+    def without(self, product_id: int, version: int) -> 'PrefixIndex':
+        """Copy of this index with ``product_id`` removed."""
+        products = dict(self.products)
+        old = products.pop(product_id, None)
+        keys = list(self.keys)
+        if old is not None:
+            for key in _word_keys(old.label):
+                i = bisect_left(keys, (key, product_id))
+                if i < len(keys) and keys[i] == (key, product_id):
+                    del keys[i]
+        return PrefixIndex(version, keys, products, self.loaded_at)
+
+    def with_product(self, product_id: int, name: str, slug: str, version: int) -> 'PrefixIndex':
+        """Copy of this index with ``product_id`` added or replaced."""
+        index = self.without(product_id, version)
+        index.products[product_id] = Suggestion('product', name, slug)
+        for key in _word_keys(name):
+            insort(index.keys, (key, product_id))
+        return index
+
+    def search(self, prefix: str, limit: int = SUGGEST_LIMIT) -> list[Suggestion]:
+        """Products with a name word starting with ``prefix``, name starts first."""
+        keys = self.keys
+        matches: dict[int, bool] = {}
+        for i in range(bisect_left(keys, (prefix,)), len(keys)):
+            key, pk = keys[i]
+            if not key.startswith(prefix) or len(matches) >= limit * 4:
+                break
+            product = self.products[pk]
+            is_name_start = normalize(product.label) == key
+            matches[pk] = matches.get(pk, False) or is_name_start
+        ranked = sorted(matches, key=lambda pk: (not matches[pk], self.products[pk].label.lower()))
+        return [self.products[pk] for pk in ranked[:limit]]
+
+
+# ============================================================================
+# INDEX LIFECYCLE
+# ============================================================================
+
+def load_index(version: int) -> PrefixIndex:
+    """Build a fresh index from the active products (one query)."""
+    from .models import Product
+
+    rows = Product.objects.filter(is_active=True).values_list('id', 'name', 'slug')
+    return PrefixIndex.build(version, rows.iterator())
+
+
+def get_index() -> PrefixIndex:
+    """Return this process's index, rebuilding it if stale."""
+    global _index
+    version = caching.get_version(SUGGEST_VERSION_KEY)
+    index = _index
+    if index is None or not index.is_fresh(version):
+        with _lock:
+            index = _index
+            if index is None or not index.is_fresh(version):
+                index = _index = load_index(version)
+    return index
+
+
+def _publish(product_id: int, entry: Optional[tuple[str, str]]) -> None:
+    """
+    Bump the shared version and patch the local index to match.
+
+    ``entry`` is the product's (name, slug), or None to drop it. The patch
+    is only safe when the index was built at the version just before this
+    bump; otherwise another worker changed products in between and the
+    index is dropped so the next lookup rebuilds it.
+    """
+    global _index
+    with _lock:
+        version = caching.bump_version(SUGGEST_VERSION_KEY)
+        if _index is None:
+            return
+        if _index.version != version - 1:
+            _index = None
+        elif entry is not None:
+            _index = _index.with_product(product_id, *entry, version)
+        else:
+            _index = _index.without(product_id, version)
+
+
+def update_product(product, update_fields=None) -> None:
+    """Patch the local index for a saved product and notify other workers, on commit."""
+    if update_fields and not SUGGEST_FIELDS & set(update_fields):
+        return
+    entry = (product.name, product.slug) if product.is_active else None
+    index = _index
+    if index is not None and index.version == caching.get_version(SUGGEST_VERSION_KEY):
+        current = index.products.get(product.pk)
+        if (current and (current.label, current.slug)) == (entry or None):
+            return  # Saved without changing anything the index shows
+    product_id = product.pk
+    transaction.on_commit(lambda: _publish(product_id, entry))
+
+
+def remove_product(product_id: int) -> None:
+    """Drop a deleted product from the local index and notify other workers, on commit."""
+    transaction.on_commit(lambda: _publish(product_id, None))
+
+
+# ============================================================================
+# POPULAR QUERIES
+# ============================================================================
+
+def record_query(query: str) -> None:
+    """Count a search that returned results."""
+    query = normalize(query)
+    if len(query) < MIN_PREFIX_LENGTH:
+        return
+    with _lock:
+        _query_counts[query] += 1
+        if len(_query_counts) > MAX_TRACKED_QUERIES:
+            # Keep the head of the distribution, forget the long tail
+            kept = _query_counts.most_common(MAX_TRACKED_QUERIES // 2)
+            _query_counts.clear()
+            _query_counts.update(dict(kept))
+
+
+def popular_queries(prefix: str, limit: int) -> list[Suggestion]:
+    return [
+        Suggestion('query', query)
+        for query, _ in _query_counts.most_common(POPULAR_QUERIES)
+        if query.startswith(prefix) and query != prefix
+    ][:limit]
+
+
+# ============================================================================
+# SUGGESTIONS
+# ============================================================================
+
+def suggest(query: str, limit: int = SUGGEST_LIMIT) -> list[Suggestion]:
+    """
+    Suggestions for a partially typed query.
+
+    Categories first, then popular queries, then products, up to ``limit``.
+    """
+    prefix = normalize(query)
+    if len(prefix) < MIN_PREFIX_LENGTH:
+        return []
+
+    results = [
+        Suggestion('category', node.name, node.slug)
+        for node in category_tree.get_tree().categories
+        if any(key.startswith(prefix) for key in _word_keys(node.name))
+    ][:2]
+    results += popular_queries(prefix, 3)
+    results += get_index().search(prefix, limit - len(results))
+    return results[:limit]
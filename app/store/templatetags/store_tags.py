@@ -2,11 +2,22 @@
 Custom template tags and filters for Amanzon.
 """
 
+import hashlib
+from urllib.parse import quote
+
 from django import template
 from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .. import page_cache
 
 register = template.Library()
 
+PRODUCT_CARD_TIMEOUT = 60 * 60 * 24
+
 
 @register.filter
 def currency(value, symbol=None):
@@ -39,3 +50,74 @@ def alt_default(value, default="Product image"):
         {{ product.name|alt_default:"Default description" }}
     """
     return value if value else default
+
+
+@register.filter
+def lookup(mapping, key):
+    """
+    Look up a dictionary value by a variable key.
+    
+    Usage:
+        {{ facets.categories|lookup:category.id }}
+    """
+    try:
+        return mapping.get(key, 0)
+    except AttributeError:
+        return 0
+
+
+@register.simple_tag
+def query_replace(params, **kwargs):
+    """
+    Re-encode the current query string with some parameters replaced.
+    
+    Pagination position is always dropped; empty values remove the key.
+    
+    Usage:
+        <a href="?{% query_replace request.GET rating=4 %}">
+    """
+    query = params.copy()
+    query.pop('page', None)
+    query.pop('cursor', None)
+    for key, value in kwargs.items():
+        if value in (None, ''):
+            query.pop(key, None)
+        else:
+            query[key] = value
+    return query.urlencode()
+
+
+@register.simple_tag(takes_context=True)
+def product_card(context, product, show_rating=False):
+    """
+    Render a product card from the fragment cache.
+    
+    The card body is cached per product version (updated_at, rating
+    aggregates, category name) and is the same for every visitor. The
+    per-request parts, the return URL and the wishlist heart, are then
+    overlaid with plain string replacement.
+    
+    Usage:
+        {% product_card product show_rating=True %}
+    """
+    version = '|'.join(str(part) for part in (
+        product.pk, product.updated_at.timestamp(), product.rating_avg,
+        product.rating_count, product.category.name, bool(show_rating),
+    ))
+    key = f'product_card:{hashlib.md5(version.encode()).hexdigest()}'
+    html = cache.get(key)
+    if html is None:
+        html = render_to_string('store/_product_card.html', {
+            'product': product,
+            'show_rating': show_rating,
+        })
+        cache.set(key, html, PRODUCT_CARD_TIMEOUT)
+    
+    request = context.get('request')
+    next_url = escape(quote(request.get_full_path(), safe='/')) if request else ''
+    html = html.replace('__card_next__', next_url)
+    
+    # Page cache shells keep the wishlist block for the per-user overlay
+    if not context.get('page_shell'):
+        html = page_cache.apply_wishlist(html, context.get('user'), context.get('wishlist_ids', ()))
+    return mark_safe(html)
@@ -0,0 +1,92 @@
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .. import caching
+from ..models import Category, Product
+
+
+class ShopJsonTest(TestCase):
+    """Tests for the JSON shop listing endpoint."""
+
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(name='Books', slug='books')
+        self.other = Category.objects.create(name='Toys', slug='toys')
+        for i in range(3):
+            Product.objects.create(
+                category=self.category,
+                name=f'Book {i}',
+                slug=f'book-{i}',
+                description='A good read',
+                price=Decimal(100 + i),
+                original_price=Decimal('200.00'),
+                stock=i
+            )
+        Product.objects.create(
+            category=self.other,
+            name='Robot',
+            slug='robot',
+            description='Beeps',
+            price=Decimal('50.00'),
+            original_price=Decimal('50.00'),
+            stock=1
+        )
+
+    def test_returns_filtered_summaries(self):
+        """Test the endpoint applies shop filters and returns compact rows."""
+        response = self.client.get(
+            reverse('store:shop_json_category', args=['books']),
+            {'sort': 'price_low', 'in_stock': '1'},
+        )
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['count'], 2)
+        self.assertEqual([p['name'] for p in data['products']], ['Book 1', 'Book 2'])
+        product = data['products'][0]
+        self.assertEqual(product['price'], '101.00')
+        self.assertEqual(product['discount_percent'], 49)
+        self.assertEqual(product['url'], reverse('store:product_detail', args=['book-1']))
+        self.assertTrue(product['in_stock'])
+
+    def test_if_none_match_returns_304_after_one_query(self):
+        """Test a matching ETag short-circuits after the freshness aggregate."""
+        url = reverse('store:shop_json')
+        response = self.client.get(url)
+        etag = response['ETag']
+        self.assertIn('no-cache', response['Cache-Control'])
+
+        with CaptureQueriesContext(connection) as queries:
+            cached = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(len([q for q in queries if 'store_product' in q['sql']]), 1)
+
+    def test_etag_changes_with_catalog_and_filters(self):
+        """Test the ETag depends on the query and the catalog version."""
+        url = reverse('store:shop_json')
+        etag = self.client.get(url)['ETag']
+        self.assertNotEqual(self.client.get(url, {'sort': 'name'})['ETag'], etag)
+
+        Product.objects.filter(slug='robot').get().save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_etag_follows_database_not_worker_cache(self):
+        """Test a worker that missed the catalog bump still sees product changes."""
+        url = reverse('store:shop_json')
+        etag = self.client.get(url)['ETag']
+        version = caching.get_catalog_version()
+
+        robot = Product.objects.get(slug='robot')
+        robot.price = Decimal('45.00')
+        robot.save()
+        cache.set(caching.CATALOG_VERSION_KEY, version, None)  # Bump went to another process
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
@@ -0,0 +1,295 @@
+from collections import Counter
+from decimal import Decimal
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Category, SubCategory, Product, Review, User
+from .. import caching, category_tree, page_cache, recommendations, services, suggest
+from ..context_processors import cart_wishlist_count
+
+
+class ListingCacheTest(TestCase):
+    """Tests for the versioned shop listing cache."""
+
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(name='Cached', slug='cached')
+        for i in range(15):
+            Product.objects.create(
+                category=self.category,
+                name=f'Cached Product {i}',
+                slug=f'cached-product-{i}',
+                description='desc',
+                price=Decimal(10 + i),
+                original_price=Decimal('50.00'),
+                stock=5
+            )
+
+    def test_filter_signature_is_normalized(self):
+        """Test parameter order and empty values don't change the signature."""
+        self.assertEqual(
+            caching.filter_signature({'q': 'shoe', 'rating': '', 'sort': 'name'}),
+            caching.filter_signature({'sort': 'name', 'q': 'shoe'}),
+        )
+
+    def test_warm_listing_skips_product_queries(self):
+        """Test a warm listing only hydrates the ids on the page."""
+        url = reverse('store:shop')
+        params = {'sort': 'price_low', 'page': 2}
+        cold = self.client.get(url, params)
+        # Drop the rendered page so the view runs against the listing cache
+        cache.delete(page_cache.page_key(RequestFactory().get(url, params)))
+
+        with CaptureQueriesContext(connection) as warm_queries:
+            warm = self.client.get(url, params)
+
+        product_queries = [q['sql'] for q in warm_queries if 'FROM "store_product"' in q['sql']]
+        self.assertEqual(len(product_queries), 1)
+        self.assertNotIn('COUNT(', product_queries[0])
+        self.assertEqual(
+            [p.pk for p in warm.context['products']],
+            [p.pk for p in cold.context['products']],
+        )
+        self.assertEqual(warm.context['products'].paginator.count, 15)
+
+    def test_catalog_changes_invalidate_listing(self):
+        """Test product and category saves bump the catalog version."""
+        version = caching.get_catalog_version()
+        product = Product.objects.get(slug='cached-product-0')
+        product.name = 'Renamed Product'
+        product.save()
+        self.assertNotEqual(caching.get_catalog_version(), version)
+
+        version = caching.get_catalog_version()
+        SubCategory.objects.create(category=self.category, name='Sub', slug='sub')
+        self.assertNotEqual(caching.get_catalog_version(), version)
+
+        response = self.client.get(reverse('store:shop'), {'sort': 'price_low'})
+        self.assertContains(response, 'Renamed Product')
+
+
+class ProductPageConditionalGetTest(TestCase):
+    """Tests for ETag/Last-Modified handling on the product page."""
+
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(name='Conditional', slug='conditional')
+        self.product = Product.objects.create(
+            category=self.category,
+            name='Conditional Product',
+            slug='conditional-product',
+            description='desc',
+            price=Decimal('10.00'),
+            original_price=Decimal('10.00'),
+            stock=5
+        )
+        self.url = reverse('store:product_detail', args=[self.product.slug])
+
+    def test_anonymous_revalidation_returns_304(self):
+        """Test a matching ETag answers 304 after a single freshness query."""
+        response = self.client.get(self.url)
+        self.assertIn('public', response['Cache-Control'])
+        self.assertIn('Cookie', response['Vary'])
+        self.assertIn('Last-Modified', response)
+
+        with CaptureQueriesContext(connection) as queries:
+            cached = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(len(queries), 1)
+
+    def test_new_review_changes_etag(self):
+        """Test a review invalidates the cached page."""
+        etag = self.client.get(self.url)['ETag']
+        user = User.objects.create_user(username='reviewer', password='pass12345')
+        Review.objects.create(user=user, product=self.product, rating=4, comment='Nice')
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_recommendation_rebuild_changes_etag(self):
+        """Test a rebuild in another process (no cache bump here) changes the ETag."""
+        other = Product.objects.create(
+            category=self.category, name='Bought Together', slug='bought-together',
+            description='desc', price=Decimal('5.00'), original_price=Decimal('5.00'), stock=5
+        )
+        etag = self.client.get(self.url)['ETag']
+        version = caching.get_catalog_version()
+
+        recommendations.store_neighbours({self.product.pk: Counter({other.pk: 3})})
+        cache.set(caching.CATALOG_VERSION_KEY, version, None)  # Bump went to the command's process
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_authenticated_pages_are_private(self):
+        """Test signed-in pages skip conditional handling."""
+        User.objects.create_user(username='shopper', password='pass12345')
+        self.client.login(username='shopper', password='pass12345')
+        response = self.client.get(self.url)
+        self.assertNotIn('ETag', response)
+        self.assertIn('private', response['Cache-Control'])
+
+
+class CategoryTreeTest(TestCase):
+    """Tests for the per-process category tree."""
+
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(name='Garden', slug='garden')
+        self.subcategory = SubCategory.objects.create(category=self.category, name='Tools', slug='tools')
+        for i, active in enumerate([True, True, False]):
+            Product.objects.create(
+                category=self.category,
+                subcategory=self.subcategory if i else None,
+                name=f'Garden Product {i}',
+                slug=f'garden-product-{i}',
+                description='desc',
+                price=Decimal('10.00'),
+                original_price=Decimal('10.00'),
+                stock=5,
+                is_active=active
+            )
+
+    def test_tree_counts_active_products(self):
+        """Test category and subcategory nodes carry active product counts."""
+        node = category_tree.get_tree().get('garden')
+        self.assertEqual(node.product_count, 2)
+        self.assertEqual([(s.slug, s.product_count) for s in node.subcategories], [('tools', 1)])
+
+    def test_tree_is_reused_until_invalidated(self):
+        """Test a warm tree costs no queries and category edits reload it."""
+        tree = category_tree.get_tree()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertIs(category_tree.get_tree(), tree)
+        self.assertEqual(len(queries), 0)
+
+        self.category.name = 'Backyard'
+        self.category.save()
+        self.assertEqual(category_tree.get_tree().get('garden').name, 'Backyard')
+
+    def test_tree_expires_without_version_bump(self):
+        """Test a bulk update that skips signals shows up once the tree's TTL runs out."""
+        tree = category_tree.get_tree()
+        Category.objects.filter(pk=self.category.pk).update(name='Backyard')
+        self.assertIs(category_tree.get_tree(), tree)
+
+        with patch('store.category_tree.time.monotonic', return_value=tree.loaded_at + category_tree.TREE_TTL):
+            self.assertEqual(category_tree.get_tree().get('garden').name, 'Backyard')
+
+    def test_unknown_category_returns_404(self):
+        """Test the shop 404s for a slug missing from the tree."""
+        response = self.client.get(reverse('store:shop_category', args=['missing']))
+        self.assertEqual(response.status_code, 404)
+
+
+class PageCacheTest(TestCase):
+    """Tests for the full-page shell cache on the home and shop pages."""
+
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(name='Paged', slug='paged')
+        self.products = [
+            Product.objects.create(
+                category=self.category,
+                name=f'Paged Product {i}',
+                slug=f'paged-product-{i}',
+                description='desc',
+                price=Decimal('10.00'),
+                original_price=Decimal('10.00'),
+                stock=5
+            )
+            for i in range(2)
+        ]
+        self.user = User.objects.create_user(username='pager', password='pass12345')
+        self.user.wishlist.create(product=self.products[0])
+
+    def test_anonymous_hit_runs_no_queries(self):
+        """Test a cached page is served to anonymous users without queries."""
+        url = reverse('store:shop')
+        cold = self.client.get(url, {'sort': 'name'})
+        with CaptureQueriesContext(connection) as queries:
+            warm = self.client.get(url, {'sort': 'name'})
+        self.assertEqual(len(queries), 0)
+        self.assertEqual(warm.content, cold.content)
+        self.assertContains(warm, 'Log In')
+        self.assertNotContains(warm, page_cache.NAV_USER_MARKER)
+        self.assertNotContains(warm, '<!--wishlist:')
+
+    def test_shell_is_shared_with_user_overlay(self):
+        """Test signed-in users reuse the shell with their own nav and hearts."""
+        self.client.get(reverse('store:index'))
+        self.client.login(username='pager', password='pass12345')
+
+        response = self.client.get(reverse('store:index'))
+        self.assertNotContains(response, 'Log In')
+        self.assertContains(response, 'pager')
+        self.assertContains(response, 'Remove Paged Product 0 from wishlist')
+        self.assertContains(response, 'Add Paged Product 1 to wishlist')
+
+    def test_cached_search_is_counted_each_time(self):
+        """Test popular-query counts include searches served from the page cache."""
+        suggest._query_counts.clear()
+        url = reverse('store:shop')
+        self.client.get(url, {'q': 'paged'})
+        self.client.get(url, {'q': 'paged'})
+        self.assertEqual(suggest._query_counts['paged'], 2)
+
+    def test_catalog_change_retires_page(self):
+        """Test product edits invalidate cached pages."""
+        url = reverse('store:shop')
+        self.client.get(url)
+        self.products[1].name = 'Renamed Paged Product'
+        self.products[1].save()
+        self.assertContains(self.client.get(url), 'Renamed Paged Product')
+
+
+class UserCountsTest(TestCase):
+    """Tests for the lazy, cached navbar counts."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='counter', password='pass12345')
+        self.category = Category.objects.create(name='Counted', slug='counted')
+        self.product = Product.objects.create(
+            category=self.category,
+            name='Counted Product',
+            slug='counted-product',
+            description='desc',
+            price=Decimal('10.00'),
+            original_price=Decimal('10.00'),
+            stock=5
+        )
+
+    def test_counts_are_lazy(self):
+        """Test no query runs until a template reads a count."""
+        request = RequestFactory().get('/')
+        request.user = self.user
+        with self.assertNumQueries(0):
+            context = cart_wishlist_count(request)
+        with self.assertNumQueries(2):
+            self.assertEqual(context['cart_count'], 0)
+            self.assertEqual(context['wishlist_count'], 0)
+
+    def test_mutations_keep_cached_counts_current(self):
+        """Test cart and wishlist views update the cached counts in place."""
+        self.client.login(username='counter', password='pass12345')
+        services.get_user_counts(self.user)
+
+        self.client.get(reverse('store:add_to_cart', args=[self.product.pk]))
+        self.client.get(reverse('store:add_to_cart', args=[self.product.pk]))
+        self.client.get(reverse('store:toggle_wishlist', args=[self.product.pk]))
+
+        with self.assertNumQueries(0):
+            counts = services.get_user_counts(self.user)
+        self.assertEqual(counts, {'cart': 2, 'wishlist': 1})
+
+        item = self.user.cart.items.get()
+        self.client.get(reverse('store:remove_from_cart', args=[item.pk]))
+        self.assertEqual(services.get_user_counts(self.user)['cart'], 0)
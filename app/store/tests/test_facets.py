@@ -0,0 +1,84 @@
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from ..models import User, Category, SubCategory, Product, Review
+from .. import facets
+
+
+class FacetCountTest(TestCase):
+    """Tests for the shop sidebar facet counts."""
+
+    def setUp(self):
+        cache.clear()
+        self.electronics = Category.objects.create(name='Electronics', slug='electronics')
+        self.home = Category.objects.create(name='Home', slug='home')
+        self.audio = SubCategory.objects.create(category=self.electronics, name='Audio', slug='audio')
+        self.cheap = self._product('Earbuds', self.electronics, self.audio, '300.00', stock=5)
+        self.mid = self._product('Speaker', self.electronics, self.audio, '800.00', stock=0)
+        self.pricey = self._product('Television', self.electronics, None, '9000.00', stock=2)
+        self.lamp = self._product('Lamp', self.home, None, '450.00', stock=1)
+        user = User.objects.create_user(username='facetuser', password='password')
+        Review.objects.create(user=user, product=self.cheap, rating=5, comment='Great')
+
+    def _product(self, name, category, subcategory, price, stock):
+        return Product.objects.create(
+            category=category,
+            subcategory=subcategory,
+            name=name,
+            slug=name.lower(),
+            description='desc',
+            price=Decimal(price),
+            original_price=Decimal(price),
+            stock=stock
+        )
+
+    def test_counts_without_filters(self):
+        """Test every facet is counted in one pass."""
+        result = facets.compute_facets({})
+        self.assertEqual(result['all'], 4)
+        self.assertEqual(result['categories'], {self.electronics.id: 3, self.home.id: 1})
+        self.assertEqual(result['subcategories'], {self.audio.id: 2})
+        self.assertEqual(result['price'], [2, 1, 0, 1])
+        self.assertEqual(result['rating'][4], 1)
+        self.assertEqual(result['in_stock'], 3)
+
+    def test_counts_are_disjunctive(self):
+        """Test a facet's own filter does not zero out its other values."""
+        result = facets.compute_facets({'min_price': '0', 'max_price': '500', 'in_stock': '1'})
+        # Other price buckets still counted (with the in-stock filter applied)
+        self.assertEqual(result['price'], [2, 0, 0, 1])
+        # In-stock count ignores the in-stock filter but honours price
+        self.assertEqual(result['in_stock'], 2)
+        self.assertEqual(result['categories'], {self.electronics.id: 1, self.home.id: 1})
+
+    def test_search_narrows_all_facets(self):
+        """Test a search query applies to every facet."""
+        result = facets.compute_facets({'q': 'lamp'})
+        self.assertEqual(result['all'], 1)
+        self.assertEqual(result['categories'], {self.home.id: 1})
+
+    def test_category_scope(self):
+        """Test bucket counts are scoped to the current category."""
+        result = facets.compute_facets({}, category_id=self.home.id)
+        self.assertEqual(result['total'], 1)
+        self.assertEqual(result['price'], [1, 0, 0, 0])
+        self.assertEqual(result['categories'][self.electronics.id], 3)
+
+    def test_cache_invalidated_on_product_change(self):
+        """Test cached facets are dropped when a product changes."""
+        self.assertEqual(facets.get_facets({})['all'], 4)
+        with self.assertNumQueries(0):
+            facets.get_facets({})
+
+        self.lamp.is_active = False
+        self.lamp.save()
+        self.assertEqual(facets.get_facets({})['all'], 3)
+
+    def test_shop_sidebar_shows_counts(self):
+        """Test the shop page renders facet counts."""
+        response = self.client.get(reverse('store:shop'))
+        self.assertEqual(response.context['facets']['all'], 4)
+        self.assertContains(response, 'Electronics <span class="small text-muted fw-normal">(3)</span>')
@@ -134,6 +134,22 @@ class CartModelTest(TestCase):
         self.assertEqual(self.cart.total_items, 2)
         self.assertEqual(self.cart.subtotal, Decimal('100.00'))
 
+    def test_cart_totals_single_query(self):
+        """Test totals come from one aggregate query, or none when items are loaded."""
+        other = Product.objects.create(
+            category=self.category, name='Other', slug='other', description='Test',
+            price=Decimal('12.50'), original_price=Decimal('12.50'), stock=10
+        )
+        CartItem.objects.create(cart=self.cart, product=self.product, quantity=2)
+        CartItem.objects.create(cart=self.cart, product=other, quantity=3)
+        
+        with self.assertNumQueries(1):
+            self.assertEqual(self.cart.get_totals(), (5, Decimal('137.50')))
+        
+        items = list(self.cart.items.select_related('product'))
+        with self.assertNumQueries(0):
+            self.assertEqual(self.cart.get_totals(items), (5, Decimal('137.50')))
+
 
 class CouponModelTest(TestCase):
     """Tests for the Coupon model."""
@@ -215,6 +231,20 @@ class ShopViewTest(TestCase):
         response = self.client.get(reverse('store:shop_category', args=['test-filter']))
         self.assertEqual(response.status_code, 200)
     
+    def test_page_links_keep_filters(self):
+        """Test offset pagination links carry every filter, including subcategory."""
+        from django.core.cache import cache
+        cache.clear()
+        subcategory = SubCategory.objects.create(category=self.category, name='Sub', slug='sub')
+        for i in range(13):
+            Product.objects.create(
+                category=self.category, subcategory=subcategory, name=f'Sub Product {i}',
+                slug=f'sub-product-{i}', description='Test', price=Decimal('25.00'),
+                original_price=Decimal('30.00'), stock=5
+            )
+        response = self.client.get(reverse('store:shop'), {'subcategory': subcategory.pk, 'sort': 'name'})
+        self.assertContains(response, f'href="?subcategory={subcategory.pk}&amp;sort=name&page=2"')
+    
     def test_product_detail(self):
         """Test product detail page."""
         response = self.client.get(reverse('store:product_detail', args=['shop-product']))
@@ -291,6 +321,60 @@ class CartViewTest(TestCase):
         # Check cart has item
         cart = Cart.objects.get(user=self.user)
         self.assertEqual(cart.total_items, 1)
+    
+    def test_add_to_cart_capped_at_stock(self):
+        """Test repeated adds stop at the available stock."""
+        from ..services import add_to_cart
+        self.product.stock = 2
+        self.product.save()
+        
+        results = [add_to_cart(self.user, self.product.id) for _ in range(3)]
+        self.assertEqual([r.quantity for r in results], [1, 2, None])
+        self.assertFalse(results[2].added)
+        self.assertEqual(CartItem.objects.get(cart__user=self.user).quantity, 2)
+    
+    def test_batch_update_applies_all_quantities(self):
+        """Test the batch endpoint updates and removes items in one request."""
+        other = Product.objects.create(
+            category=self.category, name='Other', slug='other', description='Test',
+            price=Decimal('20.00'), original_price=Decimal('20.00'), stock=5
+        )
+        cart = Cart.objects.create(user=self.user)
+        keep = CartItem.objects.create(cart=cart, product=self.product, quantity=1)
+        drop = CartItem.objects.create(cart=cart, product=other, quantity=2)
+        self.client.login(username='cartuser', password='test123')
+        
+        response = self.client.post(
+            reverse('store:update_cart_batch'),
+            {'quantities': {keep.id: 4, drop.id: 0}},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['items'], [{'id': keep.id, 'quantity': 4, 'total_price': '400.00'}])
+        self.assertEqual(data['subtotal'], '400.00')
+        self.assertEqual(data['total_items'], 4)
+        self.assertFalse(CartItem.objects.filter(pk=drop.pk).exists())
+    
+    def test_batch_update_rejects_over_stock(self):
+        """Test nothing is saved when one quantity exceeds stock."""
+        cart = Cart.objects.create(user=self.user)
+        item = CartItem.objects.create(cart=cart, product=self.product, quantity=1)
+        self.client.login(username='cartuser', password='test123')
+        
+        response = self.client.post(reverse('store:update_cart_batch'), {f'quantity_{item.id}': 11})
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['errors'][0]['available'], 10)
+        item.refresh_from_db()
+        self.assertEqual(item.quantity, 1)
+    
+    def test_add_unknown_product_returns_404(self):
+        """Test adding an inactive product is a 404."""
+        self.product.is_active = False
+        self.product.save()
+        self.client.login(username='cartuser', password='test123')
+        response = self.client.get(reverse('store:add_to_cart', args=[self.product.id]))
+        self.assertEqual(response.status_code, 404)
 
 
 class ContactViewTest(TestCase):
@@ -482,6 +566,46 @@ class CouponUsageTest(TestCase):
         coupon, error = get_valid_coupon('NOTEXIST', self.user)
         self.assertIsNone(coupon)
         self.assertEqual(error, 'Invalid coupon code.')
+    
+    def test_revalidation_uses_cached_registry(self):
+        """Test warm coupon lookups run no queries and see edits and usage."""
+        from django.core.cache import cache
+        from ..services import get_valid_coupon
+        from ..models import CouponUsage
+        
+        cache.clear()
+        get_valid_coupon('oneuse10', self.user)
+        with self.assertNumQueries(0):
+            coupon, error = get_valid_coupon(' oneuse10 ', self.user)
+        self.assertEqual(coupon, self.coupon)
+        
+        CouponUsage.objects.create(coupon=self.coupon, user=self.user)
+        self.assertEqual(get_valid_coupon('ONEUSE10', self.user)[1], 'You have already used this coupon.')
+        
+        self.coupon.is_active = False
+        self.coupon.save()
+        self.assertEqual(get_valid_coupon('ONEUSE10')[1], 'Invalid coupon code.')
+    
+    def test_order_ignores_stale_usage_cache(self):
+        """Test an order with an already used coupon is placed without it, not failed."""
+        from django.core.cache import cache
+        from ..coupons import _usage_key
+        from ..models import CouponUsage
+        from ..services import create_order_from_cart
+        
+        CouponUsage.objects.create(coupon=self.coupon, user=self.user)
+        cache.set(_usage_key(self.user.pk), frozenset())  # Another worker's stale view
+        product = Product.objects.create(
+            category=Category.objects.create(name='Coupons', slug='coupons'),
+            name='Coupon Product', slug='coupon-product', description='desc',
+            price=Decimal('1000.00'), original_price=Decimal('1000.00'), stock=5
+        )
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, product=product, quantity=1)
+        
+        order = create_order_from_cart(self.user, cart, {}, 'order_coupon', 'pay_coupon', coupon=self.coupon)
+        self.assertEqual(order.discount, 0)
+        self.assertEqual(CouponUsage.objects.filter(user=self.user).count(), 1)
 
 
 class StockValidationTest(TestCase):
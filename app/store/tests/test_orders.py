@@ -1,6 +1,12 @@
 
 import decimal
-from django.test import TestCase
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+from django.core.management import call_command
+from django.db import DatabaseError, OperationalError, connection, transaction
+from django.db.models import F
+from django.test import TestCase, TransactionTestCase
 from django.urls import reverse
 from django.core.files.uploadedfile import SimpleUploadedFile
 from unittest.mock import patch, MagicMock
@@ -53,8 +59,8 @@ class OrderCancellationTest(TestCase):
         order.refresh_from_db()
         self.assertEqual(order.status, 'cancelled')
 
-    @patch('store.services.razorpay.Client')
-    def test_cancel_paid_order_refunds(self, mock_client_cls):
+    @patch('store.payments.get_gateway')
+    def test_cancel_paid_order_refunds(self, mock_get_gateway):
         """Test cancelling a paid order initiates refund."""
         # Create paid order
         order = Order.objects.create(
@@ -72,8 +78,8 @@ class OrderCancellationTest(TestCase):
         self.product.save()
         
         # Mock Razorpay
-        mock_client = MagicMock()
-        mock_client_cls.return_value = mock_client
+        mock_gateway = MagicMock()
+        mock_get_gateway.return_value = mock_gateway
         
         # Cancel order (POST required)
         response = self.client.post(reverse('store:cancel_order', args=[order.id]), follow=True)
@@ -81,12 +87,69 @@ class OrderCancellationTest(TestCase):
         self.assertContains(response, 'Order cancelled successfully')
         
         # Verify refund called
-        mock_client.payment.refund.assert_called_once_with('pay_123', {'amount': 10000}) # 100 * 100
+        mock_gateway.refund.assert_called_once_with('pay_123', 10000) # 100 * 100
         
         # Check stock restored
         self.product.refresh_from_db()
         self.assertEqual(self.product.stock, 10)
 
+    @patch('store.payments.get_gateway')
+    def test_failed_refund_keeps_order(self, mock_get_gateway):
+        """Test a failed refund reverts the cancellation claim and leaves stock alone."""
+        order = Order.objects.create(
+            user=self.user,
+            total=decimal.Decimal('100.00'),
+            subtotal=decimal.Decimal('100.00'),
+            status='confirmed',
+            is_paid=True,
+            razorpay_payment_id='pay_123'
+        )
+        OrderItem.objects.create(order=order, product=self.product, price=self.product.price, quantity=1)
+        mock_get_gateway.return_value.refund.side_effect = OSError('gateway down')
+        
+        response = self.client.post(reverse('store:cancel_order', args=[order.id]), follow=True)
+        
+        self.assertContains(response, 'Refund failed')
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'confirmed')
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 10)
+
+    @patch('store.payments.get_gateway')
+    def test_failed_restock_is_resumed_without_second_refund(self, mock_get_gateway):
+        """Test a cancellation that dies after refunding is finished later, refunding once."""
+        order = Order.objects.create(
+            user=self.user,
+            total=decimal.Decimal('100.00'),
+            subtotal=decimal.Decimal('100.00'),
+            status='confirmed',
+            is_paid=True,
+            razorpay_payment_id='pay_123'
+        )
+        OrderItem.objects.create(order=order, product=self.product, price=self.product.price, quantity=1)
+        Product.objects.filter(pk=self.product.pk).update(stock=9)
+        mock_get_gateway.return_value.refund.return_value = {'id': 'rfnd_123'}
+        
+        with patch('store.services._lock_products', side_effect=DatabaseError('restock failed')):
+            response = self.client.post(reverse('store:cancel_order', args=[order.id]), follow=True)
+        self.assertContains(response, 'An error occurred')
+        order.refresh_from_db()
+        self.assertEqual((order.status, order.razorpay_refund_id), ('cancelling', 'rfnd_123'))
+        self.assertTrue(order.is_cancellable)
+        
+        out = StringIO()
+        call_command('finish_cancellations', stdout=out)
+        self.assertIn('Finished 1 cancellations', out.getvalue())
+        order.refresh_from_db()
+        self.assertEqual(order.status, 'cancelled')
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 10)
+        mock_get_gateway.return_value.refund.assert_called_once_with('pay_123', 10000)
+        
+        # Already finished: a late retry from the customer is refused
+        response = self.client.post(reverse('store:cancel_order', args=[order.id]), follow=True)
+        self.assertContains(response, 'This order cannot be cancelled')
+
     def test_cannot_cancel_shipped_order(self):
         """Test cannot cancel shipped order."""
         order = Order.objects.create(
@@ -137,8 +200,8 @@ class CheckoutFlowTest(TestCase):
         response = self.client.get(reverse('store:checkout'), follow=True)
         self.assertContains(response, 'Your cart is empty')
 
-    @patch('store.views.orders.razorpay.Client')
-    def test_checkout_page_loads_with_items(self, mock_client_cls):
+    @patch('store.payments.get_gateway')
+    def test_checkout_page_loads_with_items(self, mock_get_gateway):
         """Test checkout page loads when cart has items."""
         self.client.login(username='checkoutuser', password='password')
         
@@ -148,17 +211,17 @@ class CheckoutFlowTest(TestCase):
         CartItem.objects.create(cart=cart, product=self.product, quantity=1)
         
         # Mock Razorpay order creation
-        mock_client = MagicMock()
-        mock_client.order.create.return_value = {'id': 'order_test123', 'amount': 5000}
-        mock_client_cls.return_value = mock_client
+        mock_gateway = MagicMock()
+        mock_gateway.create_order.return_value = {'id': 'order_test123', 'amount': 5000}
+        mock_get_gateway.return_value = mock_gateway
         
         response = self.client.get(reverse('store:checkout'))
         self.assertEqual(response.status_code, 200)
         self.assertContains(response, 'Checkout')
 
-    @patch('store.views.orders.razorpay.Client')
+    @patch('store.payments.get_gateway')
     @patch('store.services.send_order_confirmation_email')
-    def test_payment_callback_creates_order(self, mock_email, mock_client_cls):
+    def test_payment_callback_creates_order(self, mock_email, mock_get_gateway):
         """Test successful payment callback creates order."""
         self.client.login(username='checkoutuser', password='password')
         
@@ -168,9 +231,9 @@ class CheckoutFlowTest(TestCase):
         CartItem.objects.create(cart=cart, product=self.product, quantity=2)
         
         # Mock Razorpay
-        mock_client = MagicMock()
-        mock_client.utility.verify_payment_signature.return_value = True
-        mock_client_cls.return_value = mock_client
+        mock_gateway = MagicMock()
+        mock_gateway.verify_payment_signature.return_value = None
+        mock_get_gateway.return_value = mock_gateway
         
         # Submit payment callback
         response = self.client.post(reverse('store:payment_callback'), {
@@ -199,3 +262,340 @@ class CheckoutFlowTest(TestCase):
         
         # Check email sent
         mock_email.assert_called_once()
+
+    @patch('store.services.send_order_confirmation_email')
+    def test_replayed_callback_returns_existing_order(self, mock_email):
+        """Test a resubmitted payment callback redirects to the order it created."""
+        self.client.login(username='checkoutuser', password='password')
+        cart = Cart.objects.create(user=self.user)
+        from ..models import CartItem
+        CartItem.objects.create(cart=cart, product=self.product, quantity=2)
+        data = {
+            'razorpay_payment_id': 'pay_demo_replay',
+            'razorpay_order_id': 'order_demo_replay',
+            'razorpay_signature': '',
+        }
+
+        first = self.client.post(reverse('store:payment_callback'), data)
+        CartItem.objects.create(cart=cart, product=self.product, quantity=1)
+        second = self.client.post(reverse('store:payment_callback'), data)
+
+        order = Order.objects.get(razorpay_order_id='order_demo_replay')
+        self.assertRedirects(first, reverse('store:order_detail', args=[order.id]), fetch_redirect_response=False)
+        self.assertRedirects(second, reverse('store:order_detail', args=[order.id]), fetch_redirect_response=False)
+        self.assertEqual(Order.objects.count(), 1)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 8)
+        mock_email.assert_called_once()
+
+
+class OrderHistoryTest(TestCase):
+    """Tests for the paginated order history list."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='historyuser', password='password')
+        self.orders = [
+            Order.objects.create(
+                user=self.user, subtotal=decimal.Decimal('10.00'), total=decimal.Decimal('10.00'),
+                item_count=i + 1, preview_name=f'Preview {i}',
+            )
+            for i in range(12)
+        ]
+        self.client.login(username='historyuser', password='password')
+
+    def test_orders_paginated_newest_first(self):
+        """Test the history pages through orders without reading order items."""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('store:orders'))
+
+        page = response.context['orders']
+        self.assertEqual([o.id for o in page], [o.id for o in reversed(self.orders)][:10])
+        self.assertTrue(page.has_next())
+        self.assertContains(response, '12 items')
+        self.assertFalse(any('store_orderitem' in q['sql'] for q in ctx.captured_queries))
+
+        response = self.client.get(reverse('store:orders'), {'cursor': page.next_cursor})
+        self.assertEqual([o.id for o in response.context['orders']], [self.orders[1].id, self.orders[0].id])
+
+    def test_order_summary_written_at_creation(self):
+        """Test create_order_from_cart stores the item count and first-item preview."""
+        from ..models import CartItem
+        from ..services import create_order_from_cart
+        category = Category.objects.create(name='History Cat', slug='history-cat')
+        products = [
+            Product.objects.create(
+                category=category, name=f'History Product {i}', slug=f'history-product-{i}',
+                description='desc', price=decimal.Decimal('10.00'),
+                original_price=decimal.Decimal('10.00'), stock=5,
+            )
+            for i in range(2)
+        ]
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, product=products[0], quantity=2)
+        CartItem.objects.create(cart=cart, product=products[1], quantity=1)
+
+        order = create_order_from_cart(self.user, cart, {}, 'order_history', 'pay_history')
+
+        order.refresh_from_db()
+        self.assertEqual(order.item_count, 3)
+        self.assertEqual(order.preview_name, 'History Product 0')
+
+
+class OrderCreationTest(TestCase):
+    """Tests for the bulk order creation path."""
+
+    BILLING = {
+        'first_name': 'Bulk', 'last_name': 'Buyer', 'email': 'bulk@test.com',
+        'phone': '1234567890', 'address_line1': '1 Bulk St', 'city': 'Pune',
+        'state': 'MH', 'zip_code': '411001',
+    }
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='bulkbuyer', password='password')
+        self.category = Category.objects.create(name='Bulk Cat', slug='bulk-cat')
+        self.products = [
+            Product.objects.create(
+                category=self.category,
+                name=f'Bulk Product {i}',
+                slug=f'bulk-product-{i}',
+                description='desc',
+                price=decimal.Decimal('10.00'),
+                original_price=decimal.Decimal('10.00'),
+                stock=5,
+            )
+            for i in range(4)
+        ]
+
+    def _cart(self, user, products, quantity=1):
+        from ..models import CartItem
+        cart = Cart.objects.create(user=user)
+        for product in products:
+            CartItem.objects.create(cart=cart, product=product, quantity=quantity)
+        return cart
+
+    def _queries_for(self, user, products):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from ..services import create_order_from_cart
+        cart = self._cart(user, products)
+        with CaptureQueriesContext(connection) as ctx:
+            create_order_from_cart(user, cart, self.BILLING, f'order_{user.pk}', f'pay_{user.pk}')
+        return len(ctx.captured_queries)
+
+    def test_query_count_independent_of_cart_size(self):
+        """Test order creation runs the same number of queries for 1 or 4 lines."""
+        other = User.objects.create_user(username='bulkbuyer2', password='password')
+        single = self._queries_for(self.user, self.products[:1])
+        multiple = self._queries_for(other, self.products)
+        self.assertEqual(single, multiple)
+
+        order = Order.objects.get(user=other)
+        self.assertEqual(order.items.count(), 4)
+        self.products[0].refresh_from_db()
+        self.assertEqual(self.products[0].stock, 3)
+
+    def test_short_line_rolls_back_whole_order(self):
+        """Test one short line leaves stock, order and cart untouched."""
+        from ..exceptions import StockError
+        from ..services import create_order_from_cart
+        cart = self._cart(self.user, self.products, quantity=2)
+        Product.objects.filter(pk=self.products[2].pk).update(stock=1)
+
+        with self.assertRaises(StockError):
+            create_order_from_cart(self.user, cart, self.BILLING, 'order_short', 'pay_short')
+
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(cart.items.count(), 4)
+        stocks = sorted(Product.objects.values_list('stock', flat=True))
+        self.assertEqual(stocks, [1, 5, 5, 5])
+
+    def test_first_address_saved_once(self):
+        """Test the billing address is saved only on the first order."""
+        from ..models import CartItem
+        from ..services import create_order_from_cart
+        cart = self._cart(self.user, self.products[:1])
+        create_order_from_cart(self.user, cart, self.BILLING, 'order_a1', 'pay_a1')
+        CartItem.objects.create(cart=cart, product=self.products[1], quantity=1)
+        create_order_from_cart(self.user, cart, dict(self.BILLING, city='Goa'), 'order_a2', 'pay_a2')
+
+        addresses = self.user.addresses.all()
+        self.assertEqual(len(addresses), 1)
+        self.assertTrue(addresses[0].is_default)
+        self.assertEqual(addresses[0].city, 'Pune')
+
+    def test_duplicate_razorpay_order_rolls_back(self):
+        """Test a second order for the same Razorpay order fails on the constraint before touching stock."""
+        from ..exceptions import DuplicateOrderError
+        from ..services import create_order_from_cart
+        other = User.objects.create_user(username='bulkbuyer2', password='password')
+        first = create_order_from_cart(self.user, self._cart(self.user, self.products[:1]), self.BILLING, 'order_dup', 'pay_dup')
+
+        with self.assertRaises(DuplicateOrderError) as ctx:
+            create_order_from_cart(other, self._cart(other, self.products[:1]), self.BILLING, 'order_dup', 'pay_dup')
+
+        self.assertEqual(ctx.exception.order_id, first.id)
+        self.assertEqual(Order.objects.count(), 1)
+        self.products[0].refresh_from_db()
+        self.assertEqual(self.products[0].stock, 4)
+
+    def test_stock_constraint_rejects_negative(self):
+        """Test the database refuses negative stock."""
+        from django.db import IntegrityError, transaction
+        from django.db.models import F
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Product.objects.filter(pk=self.products[0].pk).update(stock=F('stock') - 6)
+
+
+class StockConcurrencyTest(TransactionTestCase):
+    """Parallel checkouts and cancellations against the same products."""
+
+    BUYERS = 6
+    INITIAL_STOCK = 20
+
+    def setUp(self):
+        category = Category.objects.create(name='Race Cat', slug='race-cat')
+        self.products = [
+            Product.objects.create(
+                category=category,
+                name=f'Race Product {i}',
+                slug=f'race-product-{i}',
+                description='desc',
+                price=decimal.Decimal('10.00'),
+                original_price=decimal.Decimal('10.00'),
+                stock=self.INITIAL_STOCK,
+            )
+            for i in range(3)
+        ]
+        self.users = [
+            User.objects.create_user(username=f'racer{i}', password='password')
+            for i in range(self.BUYERS)
+        ]
+        # Half the buyers already have an order to cancel
+        self.cancellable = {}
+        for user in self.users[::2]:
+            order = Order.objects.create(
+                user=user, subtotal=decimal.Decimal('30.00'), total=decimal.Decimal('30.00'),
+                status='confirmed',
+            )
+            self.cancellable[user.pk] = order.pk
+            for product in self.products:
+                OrderItem.objects.create(order=order, product=product, product_name=product.name,
+                                         price=product.price, quantity=2)
+        Product.objects.update(stock=F('stock') - 2 * len(self.users[::2]))
+
+    def _with_retry(self, fn):
+        # SQLite reports concurrent writers as "locked" instead of queueing them
+        try:
+            for _ in range(50):
+                try:
+                    return fn()
+                except OperationalError:
+                    time.sleep(0.01)
+            raise AssertionError('Database stayed locked')
+        finally:
+            connection.close()
+
+    def _checkout(self, user):
+        from ..models import CartItem
+        from ..reservations import reserve_cart
+        from ..services import create_order_from_cart
+
+        def fill_cart():
+            with transaction.atomic():
+                cart, _ = Cart.objects.get_or_create(user=user)
+                cart.items.all().delete()
+                # Reverse order on odd buyers so lock ordering is exercised
+                products = self.products[::-1] if user.pk % 2 else self.products
+                for product in products:
+                    CartItem.objects.create(cart=cart, product=product, quantity=1)
+                # Odd buyers pay without a hold, taking the locked path
+                if not user.pk % 2:
+                    self.assertEqual(reserve_cart(user, list(cart.items.select_related('product'))), [])
+
+        def pay():
+            cart = Cart.objects.get(user=user)
+            create_order_from_cart(user, cart, {}, f'order_race_{user.pk}', f'pay_race_{user.pk}')
+
+        self._with_retry(fill_cart)
+        self._with_retry(pay)
+
+    def _cancel(self, user):
+        from ..services import cancel_order
+        self._with_retry(lambda: cancel_order(Order.objects.get(pk=self.cancellable[user.pk])))
+
+    def test_parallel_checkouts_and_cancellations(self):
+        """Test concurrent decrements and restores never lose an update."""
+        jobs = [(self._checkout, user) for user in self.users]
+        jobs += [(self._cancel, user) for user in self.users[::2]]
+        with ThreadPoolExecutor(max_workers=len(jobs)) as pool:
+            for future in [pool.submit(fn, user) for fn, user in jobs]:
+                future.result()
+
+        self.assertEqual(Order.objects.filter(status='cancelled').count(), len(self.users[::2]))
+        # Every buyer bought one of each; every cancellation gave its two back
+        for product in Product.objects.all():
+            self.assertEqual(product.stock, self.INITIAL_STOCK - self.BUYERS)
+
+    def test_double_cancellation_restores_once(self):
+        """Test two racing cancellations of one order restore stock once."""
+        from ..services import cancel_order
+        order = Order.objects.get(pk=self.cancellable[self.users[0].pk])
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            results = list(pool.map(
+                lambda _: self._with_retry(lambda: cancel_order(Order.objects.get(pk=order.pk))),
+                range(2),
+            ))
+
+        self.assertEqual(sorted(ok for ok, _ in results), [False, True])
+        expected = self.INITIAL_STOCK - 2 * (len(self.users[::2]) - 1)
+        for product in Product.objects.all():
+            self.assertEqual(product.stock, expected)
+
+    def test_double_cancellation_of_paid_order_refunds_once(self):
+        """Test two racing cancellations of one paid order issue a single refund."""
+        from ..services import cancel_order
+        order_pk = self.cancellable[self.users[0].pk]
+        Order.objects.filter(pk=order_pk).update(is_paid=True, razorpay_payment_id='pay_race')
+        gateway = MagicMock()
+        gateway.refund.side_effect = lambda *args: time.sleep(0.05) or {'id': 'rfnd_race'}  # Keep the claim held
+
+        with patch('store.payments.get_gateway', return_value=gateway), ThreadPoolExecutor(max_workers=2) as pool:
+            results = list(pool.map(
+                lambda _: self._with_retry(lambda: cancel_order(Order.objects.get(pk=order_pk))),
+                range(2),
+            ))
+
+        self.assertEqual(sorted(ok for ok, _ in results), [False, True])
+        gateway.refund.assert_called_once_with('pay_race', 3000)
+        self.assertEqual(Order.objects.get(pk=order_pk).status, 'cancelled')
+        expected = self.INITIAL_STOCK - 2 * (len(self.users[::2]) - 1)
+        for product in Product.objects.all():
+            self.assertEqual(product.stock, expected)
+
+    def test_concurrent_duplicate_callbacks_create_one_order(self):
+        """Test racing orders for one Razorpay order serialize on the unique constraint."""
+        from ..exceptions import DuplicateOrderError
+        from ..models import CartItem
+        from ..reservations import reserve_cart
+        from ..services import create_order_from_cart
+
+        def place(user):
+            def run():
+                cart, _ = Cart.objects.get_or_create(user=user)
+                CartItem.objects.get_or_create(cart=cart, product=self.products[0], defaults={'quantity': 1})
+                reserve_cart(user, list(cart.items.select_related('product')))
+                try:
+                    create_order_from_cart(user, cart, {}, 'order_race_dup', 'pay_race_dup')
+                    return 'created'
+                except DuplicateOrderError:
+                    return 'duplicate'
+            return self._with_retry(run)
+
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            results = list(pool.map(place, self.users[:4]))
+
+        self.assertEqual(sorted(results), ['created', 'duplicate', 'duplicate', 'duplicate'])
+        self.assertEqual(Order.objects.filter(razorpay_order_id='order_race_dup').count(), 1)
+        self.assertEqual(Product.objects.get(pk=self.products[0].pk).stock, self.INITIAL_STOCK - 2 * 3 - 1)
@@ -0,0 +1,112 @@
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
+
+from django.core import mail
+from django.core.management import call_command
+from django.db import transaction
+from django.test import TestCase
+from django.utils import timezone
+
+from .. import outbox
+from ..models import OutboxEmail
+
+
+class OutboxTest(TestCase):
+    """Tests for the transactional email outbox."""
+
+    def _enqueue(self, n=1):
+        with self.captureOnCommitCallbacks(execute=True):
+            for i in range(n):
+                outbox.enqueue(f'Subject {i}', 'Body', [f'user{i}@example.com'])
+
+    def test_enqueue_waits_for_commit(self):
+        """Test nothing is queued when the transaction rolls back."""
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    outbox.enqueue('Rolled back', 'Body', ['user@example.com'])
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        self.assertFalse(OutboxEmail.objects.exists())
+
+        self._enqueue()
+        self.assertEqual(OutboxEmail.objects.get().status, 'pending')
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_batch_shares_one_connection(self):
+        """Test a batch is sent over a single backend connection."""
+        self._enqueue(3)
+        with patch('store.outbox.get_connection', wraps=outbox.get_connection) as get_connection:
+            self.assertEqual(outbox.drain(), (3, 0))
+        get_connection.assert_called_once()
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertFalse(OutboxEmail.objects.exclude(status='sent').exists())
+
+    def test_failures_back_off_then_give_up(self):
+        """Test failed sends are retried later and eventually marked failed."""
+        self._enqueue()
+        now = timezone.now()
+        with patch('django.core.mail.backends.locmem.EmailBackend.send_messages', side_effect=OSError('down')):
+            self.assertEqual(outbox.drain(now=now), (0, 1))
+            email = OutboxEmail.objects.get()
+            self.assertEqual(email.status, 'pending')
+            self.assertEqual(email.next_attempt_at, now + timedelta(seconds=outbox.BACKOFF_BASE))
+            self.assertEqual(outbox.drain(now=now), (0, 0))  # Not due yet
+
+            for _ in range(outbox.MAX_ATTEMPTS - 1):
+                outbox.drain(now=OutboxEmail.objects.get().next_attempt_at)
+
+        email = OutboxEmail.objects.get()
+        self.assertEqual(email.status, 'failed')
+        self.assertEqual(email.attempts, outbox.MAX_ATTEMPTS)
+        self.assertIn('down', email.last_error)
+
+    def test_connection_failure_backs_off_batch(self):
+        """Test a mail server that can't be reached backs off every claimed email."""
+        self._enqueue(2)
+        now = timezone.now()
+        with patch('django.core.mail.backends.locmem.EmailBackend.open', side_effect=OSError('refused')):
+            self.assertEqual(outbox.drain(now=now), (0, 2))
+        for email in OutboxEmail.objects.all():
+            self.assertEqual(email.status, 'pending')
+            self.assertEqual(email.attempts, 1)
+            self.assertEqual(email.next_attempt_at, now + timedelta(seconds=outbox.BACKOFF_BASE))
+            self.assertIn('refused', email.last_error)
+
+    def test_claimed_rows_are_leased(self):
+        """Test claimed emails are skipped by other workers until their lease expires."""
+        self._enqueue(2)
+        now = timezone.now()
+        claimed = outbox._claim(1, now)
+        self.assertEqual(len(claimed), 1)
+        self.assertEqual(OutboxEmail.objects.get(pk=claimed[0].pk).status, 'sending')
+
+        # Another worker only gets the unclaimed email
+        self.assertEqual(outbox.drain(now=now), (1, 0))
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(outbox.drain(now=now), (0, 0))
+
+        # The first worker died; the lease runs out and the email is sent
+        self.assertEqual(outbox.drain(now=now + timedelta(seconds=outbox.LEASE)), (1, 0))
+        self.assertFalse(OutboxEmail.objects.exclude(status='sent').exists())
+
+    def test_sensitive_bodies_redacted_after_sending(self):
+        """Test OTP-style bodies are cleared once sent; ordinary ones are kept."""
+        with self.captureOnCommitCallbacks(execute=True):
+            outbox.enqueue('OTP', 'Your OTP is 123456', ['user@example.com'], sensitive=True)
+            outbox.enqueue('Order', 'Thanks for your order', ['user@example.com'])
+        self.assertEqual(outbox.drain(), (2, 0))
+
+        self.assertEqual(mail.outbox[0].body, 'Your OTP is 123456')
+        self.assertEqual(OutboxEmail.objects.get(subject='OTP').body, outbox.REDACTED_BODY)
+        self.assertEqual(OutboxEmail.objects.get(subject='Order').body, 'Thanks for your order')
+
+    def test_run_outbox_once(self):
+        """Test the worker command drains everything due and exits."""
+        self._enqueue(3)
+        out = StringIO()
+        call_command('run_outbox', '--once', '--batch-size', '2', stdout=out)
+        self.assertIn('Sent 3 emails', out.getvalue())
+        self.assertEqual(len(mail.outbox), 3)
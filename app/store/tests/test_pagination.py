@@ -0,0 +1,82 @@
+from decimal import Decimal
+
+from django.test import TestCase
+from django.urls import reverse
+
+from ..models import Category, Product
+from .. import pagination
+
+
+class KeysetPaginationTest(TestCase):
+    """Tests for cursor-based shop pagination."""
+
+    def setUp(self):
+        self.category = Category.objects.create(name='Paging', slug='paging')
+        # Repeated prices and names exercise the id tie-breaker
+        for i in range(30):
+            Product.objects.create(
+                category=self.category,
+                name=f'Product {i % 7}',
+                slug=f'paging-product-{i}',
+                description='desc',
+                price=Decimal(10 + i % 4),
+                original_price=Decimal('20.00'),
+                rating_avg=Decimal(i % 5),
+                stock=5
+            )
+
+    def _walk_forward(self, sort, per_page=7):
+        queryset = Product.objects.all()
+        seen, cursor = [], None
+        while True:
+            page = pagination.paginate(queryset, sort, cursor, per_page=per_page)
+            seen.extend(p.pk for p in page)
+            if not page.has_next():
+                return seen, page
+            cursor = page.next_cursor
+
+    def test_every_sort_visits_each_product_once_in_order(self):
+        """Test walking all pages matches the full ordering for every sort."""
+        for sort in ['-created_at', 'price_low', 'price_high', 'name', 'rating']:
+            with self.subTest(sort=sort):
+                expected = list(
+                    Product.objects.order_by(*pagination.get_ordering(sort)).values_list('pk', flat=True)
+                )
+                seen, _ = self._walk_forward(sort)
+                self.assertEqual(seen, expected)
+
+    def test_previous_cursor_returns_prior_page(self):
+        """Test following previous_cursor returns the page before."""
+        queryset = Product.objects.all()
+        first = pagination.paginate(queryset, 'price_low', per_page=7)
+        second = pagination.paginate(queryset, 'price_low', first.next_cursor, per_page=7)
+        back = pagination.paginate(queryset, 'price_low', second.previous_cursor, per_page=7)
+
+        self.assertFalse(first.has_previous())
+        self.assertEqual([p.pk for p in back], [p.pk for p in first])
+        self.assertFalse(back.has_previous())
+        self.assertTrue(back.has_next())
+
+    def test_tampered_or_mismatched_cursor_falls_back_to_first_page(self):
+        """Test invalid cursors are ignored."""
+        queryset = Product.objects.all()
+        first = pagination.paginate(queryset, 'name', per_page=7)
+        tampered = pagination.paginate(queryset, 'name', first.next_cursor + 'x', per_page=7)
+        other_sort = pagination.paginate(queryset, 'price_low', first.next_cursor, per_page=7)
+
+        self.assertEqual([p.pk for p in tampered], [p.pk for p in first])
+        self.assertEqual(len(other_sort), 7)
+        self.assertFalse(other_sort.has_previous())
+
+    def test_approximate_count(self):
+        """Test the capped count reports exactness."""
+        self.assertEqual(pagination.approximate_count(Product.objects.all()), (30, True))
+        self.assertEqual(pagination.approximate_count(Product.objects.all(), cap=10), (10, False))
+
+    def test_shop_cursor_mode(self):
+        """Test the shop view switches to keyset pages when given a cursor."""
+        response = self.client.get(reverse('store:shop'), {'sort': 'price_low', 'cursor': ''})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['cursor_mode'])
+        self.assertEqual(len(response.context['products']), 12)
+        self.assertContains(response, 'cursor=')
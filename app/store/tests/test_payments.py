@@ -0,0 +1,75 @@
+import threading
+from unittest.mock import patch
+
+import requests
+from django.test import SimpleTestCase, override_settings
+
+from .. import payments
+from ..management.commands.razorpay_simulator import make_server
+
+
+class PaymentGatewayTest(SimpleTestCase):
+    """Tests for the shared Razorpay adapter against the local simulator."""
+
+    def setUp(self):
+        self.server = make_server(port=0)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        host, port = self.server.server_address
+        self.settings = override_settings(
+            RAZORPAY_KEY_ID='rzp_test_sim',
+            RAZORPAY_KEY_SECRET='sim_secret',
+            RAZORPAY_BASE_URL=f'http://{host}:{port}',
+        )
+        self.settings.enable()
+        payments.reset_gateway()
+
+    def tearDown(self):
+        payments.reset_gateway()
+        self.settings.disable()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_gateway_is_shared(self):
+        """Test every caller gets the same gateway and session."""
+        self.assertIs(payments.get_gateway(), payments.get_gateway())
+        self.assertIs(payments.get_gateway().client.session, payments.get_gateway().session)
+
+    def test_calls_reuse_one_connection(self):
+        """Test consecutive calls go over one keep-alive connection."""
+        gateway = payments.get_gateway()
+        connections = []
+        original = self.server.process_request
+
+        def track(request, client_address):
+            connections.append(client_address)
+            return original(request, client_address)
+
+        self.server.process_request = track
+        order = gateway.create_order(5000)
+        refund = gateway.refund('pay_sim', 5000)
+
+        self.assertTrue(order['id'].startswith('order_sim_'))
+        self.assertEqual(order['amount'], 5000)
+        self.assertEqual(refund['payment_id'], 'pay_sim')
+        self.assertEqual(len(connections), 1)
+
+    def test_latency_metrics(self):
+        """Test per-operation call counts, errors and latency are recorded."""
+        gateway = payments.get_gateway()
+        gateway.create_order(100)
+        self.server.failure_rate = 1.0
+        with self.assertRaises(Exception):
+            gateway.create_order(100)
+
+        stats = gateway.stats()['create_order']
+        self.assertEqual(stats.calls, 2)
+        self.assertEqual(stats.errors, 1)
+        self.assertGreater(stats.max_ms, 0)
+        self.assertGreaterEqual(stats.max_ms, stats.avg_ms)
+
+    def test_read_timeout(self):
+        """Test a slow gateway fails fast instead of tying up the worker."""
+        self.server.latency = 0.5
+        with patch.object(payments, 'READ_TIMEOUT', 0.1):
+            with self.assertRaises(requests.exceptions.Timeout):
+                payments.get_gateway().create_order(100)
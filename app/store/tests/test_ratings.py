@@ -0,0 +1,134 @@
+from decimal import Decimal
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from .. import caching, services
+from ..models import User, Category, Product, Review
+
+
+class RatingAggregateTest(TestCase):
+    """Tests for the denormalized rating aggregates on Product."""
+
+    def setUp(self):
+        self.category = Category.objects.create(name='Ratings', slug='ratings')
+        self.product = Product.objects.create(
+            category=self.category,
+            name='Rated Product',
+            slug='rated-product',
+            description='desc',
+            price=Decimal('100.00'),
+            original_price=Decimal('100.00'),
+            stock=5
+        )
+        self.users = [
+            User.objects.create_user(username=f'rater{i}', password='password')
+            for i in range(3)
+        ]
+
+    def test_review_create_updates_aggregates(self):
+        """Test creating reviews updates avg, count and histogram."""
+        Review.objects.create(user=self.users[0], product=self.product, rating=5, comment='Great')
+        Review.objects.create(user=self.users[1], product=self.product, rating=4, comment='Good')
+
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.rating_count, 2)
+        self.assertEqual(self.product.rating_avg, Decimal('4.5'))
+        self.assertEqual(self.product.rating_histogram, [0, 0, 0, 1, 1])
+
+    def test_review_delete_updates_aggregates(self):
+        """Test deleting a review removes it from the aggregates."""
+        review = Review.objects.create(user=self.users[0], product=self.product, rating=1, comment='Bad')
+        Review.objects.create(user=self.users[1], product=self.product, rating=5, comment='Great')
+        review.delete()
+
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.rating_count, 1)
+        self.assertEqual(self.product.rating_avg, Decimal('5.0'))
+        self.assertEqual(self.product.rating_histogram, [0, 0, 0, 0, 1])
+
+    def test_rebuild_ratings_command(self):
+        """Test the rebuild command repairs stale aggregates."""
+        Review.objects.create(user=self.users[0], product=self.product, rating=3, comment='Ok')
+        Product.objects.filter(pk=self.product.pk).update(rating_avg=0, rating_count=0, rating_histogram=[])
+
+        call_command('rebuild_ratings', chunk_size=1, stdout=StringIO())
+
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.rating_count, 1)
+        self.assertEqual(self.product.rating_avg, Decimal('3.0'))
+        self.assertEqual(self.product.rating_histogram, [0, 0, 1, 0, 0])
+
+    def test_rebuild_touches_only_changed_products(self):
+        """Test a rebuild stamps and re-caches repaired products and leaves correct ones alone."""
+        Review.objects.create(user=self.users[0], product=self.product, rating=3, comment='Ok')
+        self.product.refresh_from_db()
+        self.assertEqual(services.rebuild_rating_aggregates([self.product.pk]), 0)
+
+        Product.objects.filter(pk=self.product.pk).update(rating_avg=0)
+        version = caching.get_catalog_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(services.rebuild_rating_aggregates([self.product.pk]), 1)
+        self.assertNotEqual(caching.get_catalog_version(), version)
+        updated_at = self.product.updated_at
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.rating_avg, Decimal('3.0'))
+        self.assertGreater(self.product.updated_at, updated_at)
+
+    def test_shop_rating_filter_uses_stored_average(self):
+        """Test the shop rating filter reads the stored average."""
+        Product.objects.create(
+            category=self.category, name='Unrated Product', slug='unrated-product',
+            description='desc', price=Decimal('10.00'), original_price=Decimal('10.00'), stock=5
+        )
+        Review.objects.create(user=self.users[0], product=self.product, rating=4, comment='Good')
+
+        response = self.client.get(reverse('store:shop'), {'rating': 4})
+        self.assertContains(response, 'Rated Product')
+        self.assertNotContains(response, 'Unrated Product')
+
+
+class ReviewPaginationTest(TestCase):
+    """Tests for the paginated reviews on the product page."""
+
+    def setUp(self):
+        self.category = Category.objects.create(name='Reviewed', slug='reviewed')
+        self.product = Product.objects.create(
+            category=self.category,
+            name='Reviewed Product',
+            slug='reviewed-product',
+            description='desc',
+            price=Decimal('100.00'),
+            original_price=Decimal('100.00'),
+            stock=5
+        )
+        for i in range(13):
+            user = User.objects.create_user(username=f'critic{i:02d}', password='password')
+            Review.objects.create(user=user, product=self.product, rating=4, comment=f'Comment {i:02d}')
+
+    def test_first_page_rendered_with_product(self):
+        """Test the product page renders only the first page of reviews."""
+        response = self.client.get(reverse('store:product_detail', args=[self.product.slug]))
+        reviews = response.context['reviews']
+        self.assertEqual(len(reviews), 10)
+        self.assertTrue(reviews.has_next())
+        self.assertContains(response, 'Comment 12')
+        self.assertNotContains(response, 'Comment 02')
+        self.assertContains(response, reverse('store:product_reviews', args=[self.product.slug]))
+
+    def test_endpoint_returns_remaining_reviews(self):
+        """Test following the cursor loads the rest without repeats."""
+        first = self.client.get(reverse('store:product_detail', args=[self.product.slug]))
+        cursor = first.context['reviews'].next_cursor
+
+        response = self.client.get(
+            reverse('store:product_reviews', args=[self.product.slug]), {'cursor': cursor}
+        )
+        self.assertEqual(
+            [review.comment for review in response.context['reviews']],
+            ['Comment 02', 'Comment 01', 'Comment 00'],
+        )
+        self.assertFalse(response.context['reviews'].has_next())
+        self.assertNotContains(response, 'Load more reviews')
@@ -0,0 +1,68 @@
+from decimal import Decimal
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from ..models import User, Category, Product, Order, OrderItem, RelatedProduct
+from .. import recommendations
+
+
+class CoPurchaseRecommendationTest(TestCase):
+    """Tests for "customers also bought" recommendations."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='buyer', password='password')
+        self.category = Category.objects.create(name='Recs', slug='recs')
+        self.other_category = Category.objects.create(name='Other', slug='other')
+        self.camera = self._product('Camera', self.category)
+        self.lens = self._product('Lens', self.other_category)
+        self.tripod = self._product('Tripod', self.other_category)
+        self.bag = self._product('Camera Bag', self.category)
+
+        self._order(self.camera, self.lens, self.tripod)
+        self._order(self.camera, self.lens)
+        self._order(self.camera, self.tripod, status='cancelled')
+
+    def _product(self, name, category):
+        return Product.objects.create(
+            category=category,
+            name=name,
+            slug=name.lower().replace(' ', '-'),
+            description='desc',
+            price=Decimal('100.00'),
+            original_price=Decimal('100.00'),
+            stock=10
+        )
+
+    def _order(self, *products, status='confirmed'):
+        order = Order.objects.create(
+            user=self.user, subtotal=Decimal('0'), total=Decimal('0'), status=status
+        )
+        for product in products:
+            OrderItem.objects.create(order=order, product=product, product_name=product.name, price=product.price)
+
+    def test_matrix_counts_pairs_in_chunks(self):
+        """Test co-occurrence counts skip cancelled orders across chunks."""
+        matrix = recommendations.build_co_purchase_matrix(chunk_size=1)
+        self.assertEqual(matrix[self.camera.pk][self.lens.pk], 2)
+        self.assertEqual(matrix[self.camera.pk][self.tripod.pk], 1)
+        self.assertEqual(matrix[self.lens.pk][self.camera.pk], 2)
+
+    def test_command_stores_ranked_neighbours(self):
+        """Test the command keeps the top-K neighbours in score order."""
+        call_command('build_recommendations', top_k=1, stdout=StringIO())
+        neighbours = RelatedProduct.objects.filter(product=self.camera)
+        self.assertEqual([(n.related_id, n.score, n.rank) for n in neighbours], [(self.lens.pk, 2, 0)])
+
+    def test_related_products_prefer_co_purchases(self):
+        """Test stored neighbours come first, topped up from the category."""
+        recommendations.store_neighbours(recommendations.build_co_purchase_matrix())
+        related = recommendations.get_related_products(self.camera)
+        self.assertEqual(related, [self.lens, self.tripod, self.bag])
+
+    def test_product_page_falls_back_to_category(self):
+        """Test products without neighbours show same-category products."""
+        response = self.client.get(reverse('store:product_detail', args=['camera']))
+        self.assertEqual(list(response.context['related_products']), [self.bag])
@@ -0,0 +1,136 @@
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from .. import reservations
+from ..models import Cart, CartItem, Category, Order, Product, StockReservation, User
+
+
+class StockReservationTest(TestCase):
+    """Tests for checkout stock holds."""
+
+    def setUp(self):
+        self.category = Category.objects.create(name='Hold Cat', slug='hold-cat')
+        self.product = Product.objects.create(
+            category=self.category,
+            name='Last Units',
+            slug='last-units',
+            description='desc',
+            price=Decimal('100.00'),
+            original_price=Decimal('100.00'),
+            stock=3,
+        )
+        self.alice = User.objects.create_user(username='alice', email='alice@test.com', password='password')
+        self.bob = User.objects.create_user(username='bob', email='bob@test.com', password='password')
+
+    def _items(self, user, quantity):
+        cart, _ = Cart.objects.get_or_create(user=user)
+        CartItem.objects.update_or_create(cart=cart, product=self.product, defaults={'quantity': quantity})
+        return list(cart.items.select_related('product'))
+
+    def test_holds_reduce_available_stock_for_others(self):
+        """Test a hold blocks other carts from the same units."""
+        self.assertEqual(reservations.reserve_cart(self.alice, self._items(self.alice, 2)), [])
+
+        issues = reservations.reserve_cart(self.bob, self._items(self.bob, 2))
+        self.assertEqual(len(issues), 1)
+        self.assertEqual(issues[0]['available'], 1)
+        self.assertFalse(StockReservation.objects.filter(user=self.bob).exists())
+
+    def test_reserving_again_replaces_own_hold(self):
+        """Test re-entering checkout doesn't count a user's old hold against them."""
+        reservations.reserve_cart(self.alice, self._items(self.alice, 3))
+        self.assertEqual(reservations.reserve_cart(self.alice, self._items(self.alice, 3)), [])
+        self.assertEqual(StockReservation.objects.get(user=self.alice).quantity, 3)
+
+    def test_expired_holds_stop_counting_and_are_swept(self):
+        """Test expired holds free their stock and are deleted in bulk."""
+        reservations.reserve_cart(self.alice, self._items(self.alice, 3))
+        StockReservation.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        self.assertEqual(reservations.held_quantities([self.product.pk]), {})
+        self.assertEqual(reservations.reserve_cart(self.bob, self._items(self.bob, 3)), [])
+
+        out = StringIO()
+        call_command('sweep_reservations', stdout=out)
+        self.assertIn('Deleted 1 expired', out.getvalue())
+        self.assertEqual(list(StockReservation.objects.values_list('user', flat=True)), [self.bob.pk])
+
+    def _pay(self, user, ref):
+        from ..services import create_order_from_cart
+        return create_order_from_cart(user, Cart.objects.get(user=user), {}, f'order_{ref}', f'pay_{ref}')
+
+    def test_expired_hold_cannot_take_units_held_by_others(self):
+        """Test a buyer whose hold expired can't pay for units another buyer now holds."""
+        from ..exceptions import StockError
+        reservations.reserve_cart(self.alice, self._items(self.alice, 2))
+        StockReservation.objects.filter(user=self.alice).update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(reservations.reserve_cart(self.bob, self._items(self.bob, 3)), [])
+
+        with self.assertRaises(StockError):
+            self._pay(self.alice, 'expired')
+
+        self._pay(self.bob, 'held')
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 0)
+
+    def test_grown_cart_cannot_take_units_held_by_others(self):
+        """Test quantity added after checkout must fit in the stock nobody else holds."""
+        from ..exceptions import StockError
+        reservations.reserve_cart(self.alice, self._items(self.alice, 1))
+        self.assertEqual(reservations.reserve_cart(self.bob, self._items(self.bob, 2)), [])
+        self._items(self.alice, 2)
+
+        with self.assertRaises(StockError):
+            self._pay(self.alice, 'grown')
+
+        self._pay(self.bob, 'held')
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 1)
+
+    def test_unheld_line_uses_free_stock(self):
+        """Test a line without a hold still sells from stock nobody holds."""
+        reservations.reserve_cart(self.bob, self._items(self.bob, 2))
+        self._items(self.alice, 1)
+
+        self._pay(self.alice, 'free')
+
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 2)
+        self.assertEqual(reservations.held_quantities([self.product.pk]), {self.product.pk: 2})
+
+    def test_checkout_rejects_stock_held_by_others(self):
+        """Test checkout sends the user back to the cart when others hold the units."""
+        reservations.reserve_cart(self.alice, self._items(self.alice, 3))
+        self._items(self.bob, 1)
+        self.client.login(username='bob', password='password')
+
+        response = self.client.get(reverse('store:checkout'))
+
+        self.assertRedirects(response, reverse('store:cart'), fetch_redirect_response=False)
+
+    @patch('store.services.send_order_confirmation_email')
+    def test_payment_converts_hold(self, mock_email):
+        """Test paying takes the stock and releases the hold."""
+        self._items(self.alice, 2)
+        self.client.login(username='alice', password='password')
+        self.client.get(reverse('store:checkout'))
+        self.assertEqual(reservations.held_quantities([self.product.pk]), {self.product.pk: 2})
+
+        self.client.post(reverse('store:payment_callback'), {
+            'razorpay_payment_id': 'pay_demo_hold',
+            'razorpay_order_id': 'order_demo_hold',
+            'razorpay_signature': '',
+            'billing_first_name': 'Alice',
+        })
+
+        self.assertTrue(Order.objects.filter(user=self.alice).exists())
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 1)
+        self.assertFalse(StockReservation.objects.exists())
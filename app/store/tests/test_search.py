@@ -0,0 +1,182 @@
+from decimal import Decimal
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Category, Product
+from .. import caching, pagination, search, suggest
+
+
+class ProductSearchTest(TestCase):
+    """Tests for the full-text product search backend."""
+
+    def setUp(self):
+        self.category = Category.objects.create(name='Search', slug='search')
+        self.headphones = self._product('Studio Headphones', 'Closed-back monitors for mixing.')
+        self.shoes = self._product('Trail Shoes', 'Built for running on rough ground.')
+        self.runner = self._product('Running Jacket', 'Lightweight shell.')
+
+    def _product(self, name, description):
+        return Product.objects.create(
+            category=self.category,
+            name=name,
+            slug=name.lower().replace(' ', '-'),
+            description=description,
+            price=Decimal('50.00'),
+            original_price=Decimal('50.00'),
+            stock=5
+        )
+
+    def _search(self, query):
+        return list(search.search_products(Product.objects.all(), query).order_by('-search_rank'))
+
+    def test_prefix_match(self):
+        """Test partial words match as prefixes."""
+        self.assertEqual(self._search('headph'), [self.headphones])
+
+    def test_stemming(self):
+        """Test inflected forms match the same stem."""
+        results = self._search('runs')
+        self.assertIn(self.shoes, results)
+        self.assertIn(self.runner, results)
+
+    def test_name_match_ranks_first(self):
+        """Test a match in the name outranks a match in the description."""
+        self.assertEqual(self._search('running'), [self.runner, self.shoes])
+
+    def test_relevance_pages_follow_rank(self):
+        """Test keyset pages over relevance order match the full ranked list."""
+        for i in range(25):
+            self._product(f'Trail Pack {i}', 'trail ' * (i % 4 + 1))
+        ranked = self._search('trail')
+        self.assertEqual(len(ranked), 26)
+
+        paged, cursor = [], None
+        while True:
+            queryset = search.search_products(Product.objects.all(), 'trail')
+            page = pagination.paginate(queryset, 'relevance', cursor, per_page=10)
+            paged += page.object_list
+            if not page.has_next():
+                break
+            cursor = page.next_cursor
+        self.assertEqual([p.pk for p in paged], [p.pk for p in sorted(ranked, key=lambda p: (-p.search_rank, -p.pk))])
+
+    def test_index_follows_updates_and_deletes(self):
+        """Test the index is kept in sync by product signals."""
+        self.headphones.name = 'Studio Speakers'
+        self.headphones.save()
+        self.assertEqual(self._search('speakers'), [self.headphones])
+        self.assertEqual(self._search('headphones'), [])
+
+        self.headphones.delete()
+        self.assertEqual(self._search('speakers'), [])
+
+    def test_shop_search(self):
+        """Test the shop q parameter uses the search backend."""
+        response = self.client.get(reverse('store:shop'), {'q': 'headphone'})
+        self.assertContains(response, 'Studio Headphones')
+        self.assertNotContains(response, 'Trail Shoes')
+
+
+class SearchSuggestTest(TestCase):
+    """Tests for the in-memory typeahead index."""
+
+    def setUp(self):
+        cache.clear()
+        suggest._query_counts.clear()
+        self.category = Category.objects.create(name='Footwear', slug='footwear')
+        self.runner = self._product('Trail Runner', 'trail-runner')
+        self._product('Running Socks', 'running-socks')
+        self._product('Hidden Runner', 'hidden-runner', is_active=False)
+
+    def _product(self, name, slug, is_active=True):
+        return Product.objects.create(
+            category=self.category,
+            name=name,
+            slug=slug,
+            description='desc',
+            price=Decimal('10.00'),
+            original_price=Decimal('10.00'),
+            stock=5,
+            is_active=is_active
+        )
+
+    def test_matches_word_prefixes_name_starts_first(self):
+        """Test any word in a name matches and whole-name prefixes rank first."""
+        labels = [s.label for s in suggest.suggest('run')]
+        self.assertEqual(labels, ['Running Socks', 'Trail Runner'])
+
+    def test_warm_suggestions_skip_database(self):
+        """Test a warm index answers without queries."""
+        suggest.suggest('tr')
+        with CaptureQueriesContext(connection) as queries:
+            labels = [s.label for s in suggest.suggest('tr')]
+        self.assertEqual(labels, ['Trail Runner'])
+        self.assertEqual(len(queries), 0)
+
+    def test_product_changes_update_index(self):
+        """Test renames and deactivation are reflected incrementally once committed."""
+        suggest.suggest('tr')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.runner.name = 'Mountain Runner'
+            self.runner.save()
+            self.assertEqual([s.label for s in suggest.suggest('trail')], ['Trail Runner'])
+        with patch.object(suggest, 'load_index') as load_index:
+            self.assertEqual([s.label for s in suggest.get_index().search('mou')], ['Mountain Runner'])
+            self.assertEqual(suggest.get_index().search('trail'), [])
+        load_index.assert_not_called()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.runner.is_active = False
+            self.runner.save()
+        self.assertEqual(suggest.suggest('mou'), [])
+
+    def test_unrelated_saves_keep_version(self):
+        """Test saves that don't touch name, slug or is_active leave the index alone."""
+        suggest.suggest('tr')
+        version = caching.get_version(suggest.SUGGEST_VERSION_KEY)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.runner.stock = 1
+            self.runner.save()
+            self.runner.save(update_fields=['stock'])
+        self.assertEqual(caching.get_version(suggest.SUGGEST_VERSION_KEY), version)
+
+    def test_missed_bump_rebuilds_index(self):
+        """Test a worker that missed another worker's bump rebuilds instead of patching."""
+        suggest.suggest('tr')
+        caching.bump_version(suggest.SUGGEST_VERSION_KEY)  # Another worker's change
+        Product.objects.filter(pk=self.runner.pk).update(name='Ridge Runner')
+        with self.captureOnCommitCallbacks(execute=True):
+            self._product('Trail Socks', 'trail-socks')
+        self.assertIsNone(suggest._index)
+        self.assertEqual([s.label for s in suggest.suggest('ri')], ['Ridge Runner'])
+
+    def test_index_expires_without_version_bump(self):
+        """Test changes made elsewhere show up once the index's TTL runs out."""
+        index = suggest.get_index()
+        Product.objects.filter(pk=self.runner.pk).update(name='Ridge Runner')  # No signals, no bump
+        self.assertIs(suggest.get_index(), index)
+
+        with patch('store.suggest.time.monotonic', return_value=index.loaded_at + suggest.INDEX_TTL):
+            self.assertEqual([s.label for s in suggest.get_index().search('ri')], ['Ridge Runner'])
+
+    def test_endpoint_includes_categories_and_popular_queries(self):
+        """Test the JSON endpoint merges categories, queries and products."""
+        self.client.get(reverse('store:shop'), {'q': 'running socks'})
+        response = self.client.get(reverse('store:search_suggest'), {'q': 'f'})
+        self.assertEqual(response.json()['suggestions'], [])
+
+        response = self.client.get(reverse('store:search_suggest'), {'q': 'ru'})
+        suggestions = response.json()['suggestions']
+        self.assertEqual(
+            [(s['type'], s['label']) for s in suggestions],
+            [('query', 'running socks'), ('product', 'Running Socks'), ('product', 'Trail Runner')],
+        )
+        self.assertEqual(suggestions[1]['url'], reverse('store:product_detail', args=['running-socks']))
+
+        response = self.client.get(reverse('store:search_suggest'), {'q': 'foot'})
+        self.assertEqual(response.json()['suggestions'][0]['url'], reverse('store:shop_category', args=['footwear']))
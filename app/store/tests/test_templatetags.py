@@ -0,0 +1,70 @@
+from decimal import Decimal
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.template import Context, Template
+from django.test import RequestFactory, TestCase
+
+from ..models import User, Category, Product, Review
+
+
+class ProductCardTagTest(TestCase):
+    """Tests for the cached product_card template tag."""
+
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(name='Cards', slug='cards')
+        self.product = Product.objects.create(
+            category=self.category,
+            name='Card Product',
+            slug='card-product',
+            description='desc',
+            price=Decimal('80.00'),
+            original_price=Decimal('100.00'),
+            stock=5
+        )
+        self.user = User.objects.create_user(username='carduser', password='password')
+        self.template = Template('{% load store_tags %}{% product_card product show_rating=True %}')
+
+    def _render(self, user, wishlist_ids=(), path='/shop/?sort=name'):
+        request = RequestFactory().get(path)
+        product = Product.objects.select_related('category').get(pk=self.product.pk)
+        return self.template.render(Context({
+            'request': request,
+            'user': user,
+            'product': product,
+            'wishlist_ids': list(wishlist_ids),
+        }))
+
+    def test_anonymous_card_has_no_wishlist_button(self):
+        """Test the wishlist overlay is dropped for anonymous users."""
+        html = self._render(AnonymousUser())
+        self.assertIn('Card Product', html)
+        self.assertIn('-20%', html)
+        self.assertNotIn('bi-heart', html)
+        self.assertNotIn('__', html)
+
+    def test_wishlist_overlay_per_user(self):
+        """Test the same cached card shows each user's wishlist state."""
+        empty = self._render(self.user)
+        filled = self._render(self.user, wishlist_ids=[self.product.pk])
+        self.assertIn('bi bi-heart"', empty)
+        self.assertIn('Add Card Product to wishlist', empty)
+        self.assertIn('bi bi-heart-fill', filled)
+        self.assertIn('Remove Card Product from wishlist', filled)
+
+    def test_next_url_is_current_page(self):
+        """Test action links return to the current page with its filters."""
+        html = self._render(AnonymousUser(), path='/shop/?sort=name&q=card')
+        self.assertIn('?next=/shop/%3Fsort%3Dname%26q%3Dcard', html)
+
+    def test_card_is_cached_until_product_changes(self):
+        """Test warm renders skip the template and new versions re-render."""
+        self._render(AnonymousUser())
+        Product.objects.filter(pk=self.product.pk).update(name='Stale Name')
+        self.assertIn('Card Product', self._render(AnonymousUser()))
+
+        Review.objects.create(user=self.user, product=self.product, rating=4, comment='Nice')
+        html = self._render(AnonymousUser())
+        self.assertIn('Stale Name', html)
+        self.assertIn('(1)', html)
@@ -3,6 +3,7 @@ from django.test import TestCase
 from django.urls import reverse
 from django.core.cache import cache
 from django.core import mail
+from .. import outbox
 from ..models import User
 
 
@@ -14,12 +15,13 @@ class EmailVerificationTest(TestCase):
 
     def test_registration_flow(self):
         """Test registration sends email and creates inactive user."""
-        response = self.client.post(reverse('store:register'), {
-            'username': 'verifyuser',
-            'email': 'verify@example.com',
-            'password': 'TestPass123!',
-            'confirm_password': 'TestPass123!'
-        })
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('store:register'), {
+                'username': 'verifyuser',
+                'email': 'verify@example.com',
+                'password': 'TestPass123!',
+                'confirm_password': 'TestPass123!'
+            })
         self.assertEqual(response.status_code, 302)
         self.assertRedirects(response, reverse('store:verification_sent'))
 
@@ -28,7 +30,9 @@ class EmailVerificationTest(TestCase):
         self.assertFalse(user.is_active)
         self.assertIsNotNone(user.verification_token)
 
-        # Check email sent
+        # Check email queued, then sent by the outbox worker
+        self.assertEqual(len(mail.outbox), 0)
+        outbox.drain()
         self.assertEqual(len(mail.outbox), 1)
         self.assertIn(user.verification_token, mail.outbox[0].body)
         self.assertIn('Verify your Amanzon account', mail.outbox[0].subject)
@@ -8,7 +8,11 @@ urlpatterns = [
     path('', shop.index, name='index'),
     path('shop/', shop.shop, name='shop'),
     path('shop/<slug:category_slug>/', shop.shop, name='shop_category'),
+    path('api/shop/', shop.shop_json, name='shop_json'),
+    path('api/shop/<slug:category_slug>/', shop.shop_json, name='shop_json_category'),
+    path('search/suggest/', shop.search_suggest, name='search_suggest'),
     path('product/<slug:slug>/', shop.product_detail, name='product_detail'),
+    path('product/<slug:slug>/reviews/', shop.product_reviews, name='product_reviews'),
     path('product/<int:product_id>/wishlist/', shop.toggle_wishlist, name='toggle_wishlist'),
     path('wishlist/', shop.wishlist, name='wishlist'),
     path('product/<int:product_id>/review/', shop.add_review, name='add_review'),
@@ -16,6 +20,7 @@ urlpatterns = [
     # Cart
     path('cart/', cart.cart, name='cart'),
     path('cart/add/<int:product_id>/', cart.add_to_cart, name='add_to_cart'),
+    path('cart/update/', cart.update_cart_batch, name='update_cart_batch'),
     path('cart/update/<int:item_id>/', cart.update_cart, name='update_cart'),
     path('cart/remove/<int:item_id>/', cart.remove_from_cart, name='remove_from_cart'),
     path('cart/apply-coupon/', cart.apply_coupon, name='apply_coupon'),
@@ -5,11 +5,11 @@ from django.contrib.auth import login, logout, authenticate
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.http import require_POST
 from django.contrib import messages
-from django.core.mail import send_mail
 from django.conf import settings
 from django.utils import timezone
 from django.utils.http import url_has_allowed_host_and_scheme
 
+from .. import outbox
 from ..models import User
 from ..forms import RegisterForm, LoginForm, ProfileForm, PasswordResetForm, PasswordResetConfirmForm
 
@@ -80,27 +80,14 @@ def register(request):
                 reverse('store:verify_email', kwargs={'token': user.verification_token})
             )
             
-            # H3: Handle email failures gracefully
-            try:
-                send_mail(
-                    'Verify your Amanzon account',
-                    f'Click the link to verify your email: {verification_link}',
-                    settings.DEFAULT_FROM_EMAIL,
-                    [user.email],
-                    fail_silently=False,
-                )
-                return redirect('store:verification_sent')
-            except Exception:
-                # If email fails, activate user anyway and show message
-                user.is_active = True
-                user.verification_token = None
-                user.verification_token_created_at = None
-                user.save()
-                messages.warning(
-                    request, 
-                    'Account created but verification email failed. You can login directly.'
-                )
-                return redirect('store:login')
+            # Sent by the outbox worker, not inside the request
+            outbox.enqueue(
+                'Verify your Amanzon account',
+                f'Click the link to verify your email: {verification_link}',
+                [user.email],
+                sensitive=True,
+            )
+            return redirect('store:verification_sent')
     else:
         form = RegisterForm()
     
@@ -173,12 +160,11 @@ def password_reset(request):
                 user.save()
                 
                 # Send email
-                send_mail(
+                outbox.enqueue(
                     'Amanzon - Password Reset OTP',
                     f'Your OTP for password reset is: {otp}\n\nThis OTP is valid for 10 minutes.',
-                    settings.DEFAULT_FROM_EMAIL,
                     [email],
-                    fail_silently=False,
+                    sensitive=True,
                 )
                 
                 request.session['reset_email'] = email
@@ -1,38 +1,48 @@
+import json
+
+from django.http import Http404, JsonResponse
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.http import require_POST
 from django.contrib import messages
 from django.utils.http import url_has_allowed_host_and_scheme
 
-from ..models import Cart, CartItem, Product, Coupon, CouponUsage
-from .. import services
+from ..models import Cart, CartItem
+from .. import coupons, services
 
-@login_required
-def cart(request):
-    """Shopping cart page."""
-    cart_obj, _ = Cart.objects.get_or_create(user=request.user)
-    cart_items = cart_obj.items.select_related('product').all()
-    
-    # Get coupon from session
+def _session_coupon(request, warn=True):
+    """Return the coupon stored in the session if it is still usable, else None."""
     coupon_code = request.session.get('coupon_code')
     coupon = None
     
     if coupon_code:
-        try:
-            coupon = Coupon.objects.get(code__iexact=coupon_code)
-            # Check if user already used this coupon
-            if CouponUsage.objects.filter(coupon=coupon, user=request.user).exists():
-                coupon = None
-                request.session.pop('coupon_code', None)
+        coupon = coupons.get_coupon(coupon_code)
+        if coupon is None:
+            request.session.pop('coupon_code', None)
+        # Check if user already used this coupon
+        elif coupons.has_used(request.user, coupon):
+            coupon = None
+            request.session.pop('coupon_code', None)
+            if warn:
                 messages.warning(request, 'You have already used this coupon.')
-            elif not coupon.is_valid():
-                coupon = None
-                request.session.pop('coupon_code', None)
-        except Coupon.DoesNotExist:
+        elif not coupon.is_valid():
+            coupon = None
             request.session.pop('coupon_code', None)
     
+    return coupon
+
+
+@login_required
+def cart(request):
+    """Shopping cart page."""
+    cart_obj, _ = Cart.objects.get_or_create(user=request.user)
+    cart_items = list(cart_obj.items.select_related('product'))
+    
+    # Get coupon from session
+    coupon = _session_coupon(request)
+    
     # Use services layer for calculations
-    totals = services.calculate_cart_totals(cart_obj, coupon)
+    totals = services.calculate_cart_totals(cart_obj, coupon, items=cart_items)
     
     return render(request, 'store/cart.html', {
         'cart': cart_obj,
@@ -48,34 +58,17 @@ def cart(request):
 @login_required
 def add_to_cart(request, product_id):
     """Add product to cart."""
-    product = get_object_or_404(Product, id=product_id, is_active=True)
+    # Single conditional upsert, capped at current stock
+    result = services.add_to_cart(request.user, product_id)
+    if result is None:
+        raise Http404('No Product matches the given query.')
     
-    # Check stock availability
-    if product.stock <= 0:
-        messages.error(request, f'Sorry, "{product.name}" is out of stock.')
-        # SEC-02: Validate redirect URL to prevent open redirect
-        next_url = request.GET.get('next') or request.META.get('HTTP_REFERER', '')
-        if not next_url or not url_has_allowed_host_and_scheme(next_url, allowed_hosts={request.get_host()}):
-            next_url = 'store:shop'
-        return redirect(next_url)
-    
-    cart_obj, _ = Cart.objects.get_or_create(user=request.user)
-    
-    cart_item, created = CartItem.objects.get_or_create(
-        cart=cart_obj, product=product,
-        defaults={'quantity': 1}
-    )
-    
-    if not created:
-        # Check if adding more would exceed stock
-        if cart_item.quantity >= product.stock:
-            messages.warning(request, f'Only {product.stock} units of "{product.name}" available.')
-        else:
-            cart_item.quantity += 1
-            cart_item.save()
-            messages.success(request, f'Added "{product.name}" to cart.')
+    if result.added:
+        messages.success(request, f'Added "{result.product_name}" to cart.')
+    elif result.stock <= 0:
+        messages.error(request, f'Sorry, "{result.product_name}" is out of stock.')
     else:
-        messages.success(request, f'Added "{product.name}" to cart.')
+        messages.warning(request, f'Only {result.stock} units of "{result.product_name}" available.')
     
     # SEC-02: Validate redirect URL to prevent open redirect
     next_url = request.GET.get('next') or request.META.get('HTTP_REFERER', '')
@@ -98,22 +91,75 @@ def update_cart(request, item_id):
         else:
             cart_item.quantity += 1
             cart_item.save()
+            services.adjust_user_count(request.user.pk, 'cart', 1)
     elif action == 'decrease':
         if cart_item.quantity > 1:
             cart_item.quantity -= 1
             cart_item.save()
         else:
             cart_item.delete()
+        services.adjust_user_count(request.user.pk, 'cart', -1)
     
     return redirect('store:cart')
 
 
+@login_required
+@require_POST
+def update_cart_batch(request):
+    """
+    Set several cart item quantities at once and return the new totals.
+    
+    Accepts a JSON body ``{"quantities": {"<item_id>": <quantity>, ...}}``
+    or form fields ``quantity_<item_id>=<quantity>``. A quantity of 0
+    removes the item. Nothing is saved if any quantity exceeds stock.
+    """
+    try:
+        if request.content_type == 'application/json':
+            raw = json.loads(request.body).get('quantities', {})
+        else:
+            raw = {
+                key.removeprefix('quantity_'): value
+                for key, value in request.POST.items() if key.startswith('quantity_')
+            }
+        quantities = {int(item_id): int(quantity) for item_id, quantity in raw.items()}
+    except (ValueError, TypeError, AttributeError):
+        return JsonResponse({'error': 'Invalid quantities.'}, status=400)
+    if any(quantity < 0 for quantity in quantities.values()):
+        return JsonResponse({'error': 'Quantities cannot be negative.'}, status=400)
+    
+    issues = services.update_cart_quantities(request.user, quantities)
+    
+    cart_obj, _ = Cart.objects.get_or_create(user=request.user)
+    cart_items = list(cart_obj.items.select_related('product'))
+    totals = services.calculate_cart_totals(cart_obj, _session_coupon(request, warn=False), items=cart_items)
+    
+    return JsonResponse({
+        'ok': not issues,
+        'errors': [
+            {
+                'item_id': issue['item_id'],
+                'product': issue['product'].name,
+                'requested': issue['requested'],
+                'available': issue['available'],
+            }
+            for issue in issues
+        ],
+        'items': [
+            {'id': item.id, 'quantity': item.quantity, 'total_price': str(item.total_price)}
+            for item in cart_items
+        ],
+        'total_items': sum(item.quantity for item in cart_items),
+        **{key: str(value) for key, value in totals.items()},
+    }, status=409 if issues else 200)
+
+
 @login_required
 def remove_from_cart(request, item_id):
     """Remove item from cart."""
     cart_item = get_object_or_404(CartItem, id=item_id, cart__user=request.user)
     product_name = cart_item.product.name
     cart_item.delete()
+    services.adjust_user_count(request.user.pk, 'cart', -cart_item.quantity)
     messages.success(request, f'Removed "{product_name}" from cart.')
     return redirect('store:cart')
 
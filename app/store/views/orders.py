@@ -9,9 +9,10 @@ from django.views.decorators.http import require_POST
 from django.db import transaction
 from django.contrib import messages
 
-from ..models import Cart, Coupon, CouponUsage, Order
+from ..models import Cart, Order
+from ..exceptions import DuplicateOrderError
 from ..forms import CheckoutForm
-from .. import services
+from .. import coupons, pagination, payments, reservations, services
 
 logger = logging.getLogger(__name__)
 
@@ -21,18 +22,18 @@ def checkout(request):
     from ..models import Address
     
     # Check if Razorpay keys are configured
-    razorpay_configured = bool(settings.RAZORPAY_KEY_ID and settings.RAZORPAY_KEY_SECRET)
+    razorpay_configured = payments.is_configured()
     
     # H2: Use get_or_create instead of get_object_or_404 to handle users without cart
     cart_obj, _ = Cart.objects.get_or_create(user=request.user)
-    cart_items = cart_obj.items.select_related('product').all()
+    cart_items = list(cart_obj.items.select_related('product'))
     
-    if not cart_items.exists():
+    if not cart_items:
         messages.warning(request, 'Your cart is empty.')
         return redirect('store:shop')
     
-    # Validate stock before checkout
-    stock_issues = services.validate_cart_stock(cart_obj)
+    # Validate stock and hold it while the customer pays
+    stock_issues = reservations.reserve_cart(request.user, cart_items)
     if stock_issues:
         for issue in stock_issues:
             messages.error(
@@ -45,25 +46,20 @@ def checkout(request):
     coupon = None
     coupon_code = request.session.get('coupon_code')
     if coupon_code:
-        try:
-            coupon = Coupon.objects.get(code__iexact=coupon_code)
-            if not coupon.is_valid() or CouponUsage.objects.filter(coupon=coupon, user=request.user).exists():
-                coupon = None
-                request.session.pop('coupon_code', None)
-        except Coupon.DoesNotExist:
+        coupon = coupons.get_coupon(coupon_code)
+        # Checked against the database: this prices the Razorpay order
+        if coupon is None or not coupon.is_valid() or coupons.has_used(request.user, coupon, fresh=True):
+            coupon = None
             request.session.pop('coupon_code', None)
     
     # Calculate totals using services layer
-    totals = services.calculate_cart_totals(cart_obj, coupon)
+    totals = services.calculate_cart_totals(cart_obj, coupon, items=cart_items)
     
     # Create Razorpay order (or dummy order in demo mode)
     if razorpay_configured:
-        client = razorpay.Client(auth=(settings.RAZORPAY_KEY_ID, settings.RAZORPAY_KEY_SECRET))
-        razorpay_order = client.order.create({
-            'amount': int(totals['total'] * 100),  # Amount in paise
-            'currency': 'INR',
-            'payment_capture': 1,
-        })
+        razorpay_order = payments.get_gateway().create_order(
+            int(totals['total'] * 100),  # Amount in paise
+        )
     else:
         # Demo mode: Create a dummy order object
         razorpay_order = {
@@ -135,25 +131,28 @@ def payment_callback(request):
     razorpay_order_id = request.POST.get('razorpay_order_id')
     razorpay_signature = request.POST.get('razorpay_signature')
     
-    # SEC-03: Idempotency check - prevent duplicate order creation
-    if Order.objects.filter(razorpay_order_id=razorpay_order_id).exists():
-        existing_order = Order.objects.get(razorpay_order_id=razorpay_order_id)
+    if not razorpay_order_id or not razorpay_payment_id:
+        messages.error(request, 'Payment details are missing. Please try again.')
+        return redirect('store:checkout')
+    
+    # SEC-03: Idempotency check - a replayed callback gets the order it created,
+    # from one lookup on the unique razorpay_order_id index
+    existing_order_id = Order.objects.filter(
+        razorpay_order_id=razorpay_order_id
+    ).values_list('id', flat=True).first()
+    if existing_order_id is not None:
         messages.info(request, 'Order already processed.')
-        return redirect('store:order_detail', order_id=existing_order.id)
+        return redirect('store:order_detail', order_id=existing_order_id)
     
     # Check if we are in demo mode
-    razorpay_configured = bool(settings.RAZORPAY_KEY_ID and settings.RAZORPAY_KEY_SECRET)
+    razorpay_configured = payments.is_configured()
     
     if razorpay_configured:
-        client = razorpay.Client(auth=(settings.RAZORPAY_KEY_ID, settings.RAZORPAY_KEY_SECRET))
-        
         try:
             # Verify payment signature first
-            client.utility.verify_payment_signature({
-                'razorpay_order_id': razorpay_order_id,
-                'razorpay_payment_id': razorpay_payment_id,
-                'razorpay_signature': razorpay_signature,
-            })
+            payments.get_gateway().verify_payment_signature(
+                razorpay_order_id, razorpay_payment_id, razorpay_signature,
+            )
         except razorpay.errors.SignatureVerificationError:
             logger.warning(f'Payment signature verification failed for order {razorpay_order_id}')
             messages.error(request, 'Payment verification failed. Please try again.')
@@ -186,11 +185,8 @@ def payment_callback(request):
         coupon = None
         coupon_code = request.session.get('coupon_code')
         if coupon_code:
-            try:
-                coupon = Coupon.objects.get(code__iexact=coupon_code)
-                if not coupon.is_valid():
-                    coupon = None
-            except Coupon.DoesNotExist:
+            coupon = coupons.get_coupon(coupon_code)
+            if coupon is not None and not coupon.is_valid():
                 coupon = None
         
         # Create order using services layer (handles stock deduction, coupon tracking)
@@ -206,11 +202,16 @@ def payment_callback(request):
         # Clear session data
         request.session.pop('coupon_code', None)
         
-        # Send order confirmation email
+        # Queue order confirmation email (sent by the outbox worker)
         services.send_order_confirmation_email(order)
         
         messages.success(request, 'Order placed successfully!')
         return redirect('store:order_detail', order_id=order.id)
+    
+    except DuplicateOrderError as e:
+        # A concurrent duplicate of this callback created the order first
+        messages.info(request, 'Order already processed.')
+        return redirect('store:order_detail', order_id=e.order_id)
         
     except Exception as e:
         logger.exception(f'Error processing payment callback: {e}')
@@ -220,11 +221,19 @@ def payment_callback(request):
 
 @login_required
 def orders(request):
-    """Order history page."""
-    user_orders = Order.objects.filter(user=request.user).prefetch_related('items')
+    """Order history page, newest first, one keyset page at a time."""
+    # Only the Order row: item_count and the preview are stored on it
+    user_orders = Order.objects.filter(user=request.user).only(
+        'id', 'user_id', 'total', 'is_paid', 'status', 'razorpay_refund_id', 'created_at',
+        'item_count', 'preview_name', 'preview_image',
+    )
+    page = pagination.paginate(
+        user_orders, pagination.DEFAULT_SORT, request.GET.get('cursor'),
+        per_page=pagination.ORDER_PAGE_SIZE,
+    )
     
     return render(request, 'store/orders.html', {
-        'orders': user_orders,
+        'orders': page,
     })
 
 
@@ -247,7 +256,7 @@ def cancel_order(request, order_id):
     """Cancel an order."""
     order = get_object_or_404(Order, id=order_id, user=request.user)
     
-    if order.status in ['pending', 'confirmed']:
+    if order.is_cancellable:
         try:
             success, message = services.cancel_order(order)
             if success:
@@ -1,28 +1,29 @@
+from django.conf import settings
+from django.http import Http404, JsonResponse
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
 from django.contrib.auth.decorators import login_required
-from django.views.decorators.http import require_POST
+from django.views.decorators.http import condition, require_GET, require_POST
 from django.contrib import messages
-from django.core.paginator import Paginator
-from django.db.models import Q, Count, Avg
-from django.db.models.functions import Round  # CR-4: For rounding avg_rating
-from django.utils.http import url_has_allowed_host_and_scheme
+from django.core.paginator import Page, Paginator
+from django.db.models import Count, Max, OuterRef, Subquery
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import url_has_allowed_host_and_scheme, urlencode
 
-from ..models import Category, Product, Wishlist, Review
+from ..models import Product, RelatedProduct, Wishlist, Review
 from ..forms import ReviewForm
+from .. import caching, category_tree, facets, page_cache, pagination, recommendations, services, suggest
 
+@page_cache.cache_page_shell
 def index(request):
     """Homepage with featured products."""
-    categories = Category.objects.prefetch_related('subcategories').all()[:6]
-    # Annotate avg_rating to prevent N+1 queries if show_rating is enabled
-    # CR-4: Round avg_rating to 1 decimal for consistency with Product.average_rating
-    featured_products = Product.objects.filter(is_active=True).select_related('category').annotate(
-        review_count=Count('reviews'),
-        avg_rating=Round(Avg('reviews__rating'), 1)
-    )[:8]
+    categories = category_tree.get_tree().categories[:6]
+    # Ratings are read from the denormalized rating_avg/rating_count columns
+    featured_products = Product.objects.filter(is_active=True).select_related('category')[:8]
     
     # Wishlist IDs for current user
     wishlist_ids = []
-    if request.user.is_authenticated:
+    if request.user.is_authenticated and not page_cache.is_shell_render(request):
         wishlist_ids = list(request.user.wishlist.values_list('product_id', flat=True))
     
     return render(request, 'store/index.html', {
@@ -32,75 +33,72 @@ def index(request):
     })
 
 
-def shop(request, category_slug=None):
-    """Shop page with filtering and pagination."""
-    # CR-4: Round avg_rating to 1 decimal for consistency with Product.average_rating
-    products = Product.objects.filter(is_active=True).select_related('category', 'subcategory').annotate(
-        review_count=Count('reviews'),
-        avg_rating=Round(Avg('reviews__rating'), 1)
-    )
-    categories = Category.objects.prefetch_related('subcategories').all()
+def _shop_products(request, category_slug=None):
+    """
+    Filtered and sorted queryset of active products for the shop query string.
+    
+    Returns (products, current_category, query, sort).
+    """
+    products = Product.objects.filter(is_active=True).select_related('category', 'subcategory')
     
     # Filter by category
     current_category = None
     if category_slug:
-        current_category = get_object_or_404(Category, slug=category_slug)
-        products = products.filter(category=current_category)
-    
-    # Filter by subcategory
-    subcategory_id = request.GET.get('subcategory')
-    if subcategory_id:
-        products = products.filter(subcategory_id=subcategory_id)
-    
-    # Search
-    query = request.GET.get('q')
-    if query:
-        products = products.filter(Q(name__icontains=query) | Q(description__icontains=query))
-    
-    # Price filter
-    min_price = request.GET.get('min_price')
-    max_price = request.GET.get('max_price')
-    if min_price:
-        products = products.filter(price__gte=min_price)
-    if max_price:
-        products = products.filter(price__lte=max_price)
-    
-    # Rating filter
-    min_rating = request.GET.get('rating')
-    if min_rating:
-        try:
-            min_rating = int(min_rating)
-            products = products.filter(avg_rating__gte=min_rating)
-        except (ValueError, TypeError):
-            pass
-    
-    # In-stock filter
-    in_stock = request.GET.get('in_stock')
-    if in_stock == '1':
-        products = products.filter(stock__gt=0)
-    
-    # Sorting
-    sort = request.GET.get('sort', '-created_at')
-    if sort == 'price_low':
-        products = products.order_by('price')
-    elif sort == 'price_high':
-        products = products.order_by('-price')
-    elif sort == 'name':
-        products = products.order_by('name')
-    elif sort == 'rating':
-        products = products.order_by('-avg_rating')
-    else:
-        products = products.order_by('-created_at')
+        current_category = category_tree.get_tree().get(category_slug)
+        if current_category is None:
+            raise Http404('No category matches the given query.')
+        products = products.filter(category_id=current_category.id)
+    
+    # Subcategory, search, price, rating and stock filters
+    products = services.filter_products(products, request.GET)
+    query = request.GET.get('q', '').strip()
+    
+    # Sorting (search results default to relevance order)
+    sort = request.GET.get('sort') or ('relevance' if query else pagination.DEFAULT_SORT)
+    if sort not in pagination.SORT_ORDERINGS or (sort == 'relevance' and not query):
+        sort = pagination.DEFAULT_SORT
+    products = products.order_by(*pagination.get_ordering(sort))
+    
+    return products, current_category, query, sort
+
+
+def _shop_listing(request, category_slug=None):
+    """
+    Filter, sort and paginate active products from the shop query string.
+    
+    Shared by the HTML shop page and its JSON endpoint.
+    Returns (page, current_category, query, cursor_mode).
+    """
+    products, current_category, query, sort = _shop_products(request, category_slug)
+    
+    # Pagination: keyset cursors avoid COUNT(*) and deep OFFSET scans
+    cursor_mode = 'cursor' in request.GET or getattr(settings, 'SHOP_PAGINATION', 'offset') == 'cursor'
+    page = _listing_page(request, products, sort, current_category, cursor_mode)
+    
+    return page, current_category, query, cursor_mode
+
+
+@page_cache.cache_page_shell
+def shop(request, category_slug=None):
+    """Shop page with filtering and pagination."""
+    products, current_category, query, cursor_mode = _shop_listing(request, category_slug)
+    categories = category_tree.get_tree().categories
+    if query and products:
+        # Counted on cache hits too, not only when the shell is rendered
+        page_cache.on_serve(request, suggest.record_query, query)
+    
+    # Sidebar counts for the current filter set (single grouped query, cached)
+    facet_counts = facets.get_facets(request.GET, current_category.id if current_category else None)
     
     # Wishlist IDs for current user
     wishlist_ids = []
-    if request.user.is_authenticated:
+    if request.user.is_authenticated and not page_cache.is_shell_render(request):
         wishlist_ids = list(request.user.wishlist.values_list('product_id', flat=True))
     
-    # Pagination
-    paginator = Paginator(products, 12)
-    page = request.GET.get('page', 1)
-    products = paginator.get_page(page)
+    # Current filters without the page position, for pagination links
+    querystring = request.GET.copy()
+    querystring.pop('page', None)
+    querystring.pop('cursor', None)
     
     return render(request, 'store/shop.html', {
         'products': products,
@@ -108,31 +106,263 @@ def shop(request, category_slug=None):
         'current_category': current_category,
         'wishlist_ids': wishlist_ids,
         'query': query,
+        'cursor_mode': cursor_mode,
+        'querystring': querystring.urlencode(),
+        'facets': facet_counts,
     })
 
 
+def _shop_json_etag(request, category_slug=None):
+    """
+    Strong ETag for a shop JSON response.
+    
+    Built from the newest ``updated_at`` and the row count of the filtered
+    products, read from the database in one aggregate query, so every
+    worker agrees on it whatever its cached catalog version. Stock and
+    rating updates stamp ``updated_at`` too; deactivated or deleted
+    products change the count.
+    """
+    products, _, _, _ = _shop_products(request, category_slug)
+    stamp = products.order_by().aggregate(updated=Max('updated_at'), count=Count('id'))
+    params = dict(request.GET.items())
+    params.update({
+        'category': category_slug,
+        'updated': stamp['updated'].isoformat() if stamp['updated'] else '',
+        'count': stamp['count'],
+    })
+    return caching.catalog_key('shop-json', params)
+
+
+def _product_summary(product):
+    """Compact JSON representation of a product for listings."""
+    return {
+        'id': product.pk,
+        'name': product.name,
+        'url': reverse('store:product_detail', args=[product.slug]),
+        'image': product.image.url if product.image else None,
+        'category': product.category.name,
+        'price': str(product.price),
+        'original_price': str(product.original_price),
+        'discount_percent': product.discount_percent,
+        'rating': str(product.rating_avg),
+        'rating_count': product.rating_count,
+        'in_stock': product.stock > 0,
+    }
+
+
+@require_GET
+@condition(etag_func=_shop_json_etag)
+def shop_json(request, category_slug=None):
+    """
+    JSON version of the shop listing for AJAX filtering.
+    
+    Accepts the same query parameters as shop(). Responses carry a strong
+    ETag derived from the matching products' freshness, so unchanged
+    listings are answered with 304 after a single aggregate query.
+    """
+    page, current_category, query, cursor_mode = _shop_listing(request, category_slug)
+    
+    data = {
+        'products': [_product_summary(product) for product in page],
+        'category': current_category.slug if current_category else None,
+        'query': query,
+    }
+    if cursor_mode:
+        data.update({
+            'count': page.count,
+            'count_exact': page.count_is_exact,
+            'next_cursor': page.next_cursor,
+            'previous_cursor': page.previous_cursor,
+        })
+    else:
+        data.update({
+            'count': page.paginator.count,
+            'count_exact': True,
+            'page': page.number,
+            'num_pages': page.paginator.num_pages,
+        })
+    
+    response = JsonResponse(data)
+    # Same for every visitor; caches may store it but must revalidate the ETag
+    patch_cache_control(response, public=True, no_cache=True)
+    return response
+
+
+@require_GET
+def search_suggest(request):
+    """Typeahead suggestions for the search box, served from memory."""
+    query = request.GET.get('q', '')
+    
+    suggestions = []
+    for suggestion in suggest.suggest(query):
+        if suggestion.kind == 'product':
+            url = reverse('store:product_detail', args=[suggestion.slug])
+        elif suggestion.kind == 'category':
+            url = reverse('store:shop_category', args=[suggestion.slug])
+        else:
+            url = f"{reverse('store:shop')}?{urlencode({'q': suggestion.label})}"
+        suggestions.append({'type': suggestion.kind, 'label': suggestion.label, 'url': url})
+    
+    response = JsonResponse({'query': query, 'suggestions': suggestions})
+    patch_cache_control(response, public=True, max_age=60)
+    return response
+
+
+def _listing_page(request, products, sort, category, cursor_mode):
+    """
+    Return the requested page of ``products`` for the shop template.
+    
+    Only the product ids of each page are cached, keyed by the normalized
+    filters under the catalog version; a hit costs one query to load the
+    12 products on the page.
+    """
+    listing_key = {key: request.GET.get(key) for key in services.PRODUCT_FILTERS}
+    listing_key.update({
+        'q': ' '.join(request.GET.get('q', '').lower().split()),
+        'category': category.id if category else None,
+        'sort': sort,
+        'mode': 'cursor' if cursor_mode else 'offset',
+    })
+    
+    if cursor_mode:
+        cursor = request.GET.get('cursor')
+        listing_key['cursor'] = cursor
+        
+        def build():
+            page = pagination.paginate(products, sort, cursor, per_page=pagination.PAGE_SIZE, with_count=True)
+            return {
+                'ids': [product.pk for product in page],
+                'next': page.next_cursor,
+                'previous': page.previous_cursor,
+                'count': page.total_count,
+            }
+        
+        entry = caching.get_or_build('listing', listing_key, build, caching.LISTING_CACHE_TIMEOUT)
+        return pagination.KeysetPage(
+            caching.hydrate_products(entry['ids']), entry['next'], entry['previous'], entry['count']
+        )
+    
+    page_number = services.parse_int_param(request.GET.get('page')) or 1
+    listing_key['page'] = page_number
+    
+    def build():
+        page = Paginator(products.values_list('pk', flat=True), pagination.PAGE_SIZE).get_page(page_number)
+        return {'ids': list(page), 'count': page.paginator.count, 'number': page.number}
+    
+    entry = caching.get_or_build('listing', listing_key, build, caching.LISTING_CACHE_TIMEOUT)
+    paginator = pagination.PrecountedPaginator(products, pagination.PAGE_SIZE, entry['count'])
+    return Page(caching.hydrate_products(entry['ids']), entry['number'], paginator)
+
+
+def _product_freshness(request, slug):
+    """
+    (updated_at, latest_review_at, rating_count, related_built_at) for an
+    active product.
+    
+    One indexed query, memoized on the request because the ETag and
+    Last-Modified callbacks both need it. None for unknown products.
+    """
+    if not hasattr(request, '_product_freshness'):
+        related_built_at = RelatedProduct.objects.filter(product=OuterRef('pk')).values('built_at')[:1]
+        request._product_freshness = (
+            Product.objects.filter(slug=slug, is_active=True)
+            .annotate(latest_review_at=Max('reviews__created_at'), related_built_at=Subquery(related_built_at))
+            .values_list('updated_at', 'latest_review_at', 'rating_count', 'related_built_at')
+            .first()
+        )
+    return request._product_freshness
+
+
+def _is_shared_page(request):
+    # Signed-in pages carry cart, wishlist and review state; pending
+    # flash messages must be rendered rather than answered with 304
+    return not request.user.is_authenticated and not len(messages.get_messages(request))
+
+
+def _product_detail_etag(request, slug):
+    """ETag for an anonymous product page: product, reviews, recommendations and catalog version."""
+    freshness = _product_freshness(request, slug) if _is_shared_page(request) else None
+    if freshness is None:
+        return None
+    updated_at, latest_review_at, rating_count, related_built_at = freshness
+    # The recommendations build stamp comes from the database so a rebuild
+    # reaches every worker; the catalog version covers category names
+    return caching.catalog_key('product-page', {
+        'slug': slug,
+        'updated': updated_at.isoformat(),
+        'review': latest_review_at.isoformat() if latest_review_at else '',
+        'reviews': rating_count,
+        'related': related_built_at.isoformat() if related_built_at else '',
+    })
+
+
+def _product_detail_last_modified(request, slug):
+    """Last-Modified for an anonymous product page."""
+    freshness = _product_freshness(request, slug) if _is_shared_page(request) else None
+    if freshness is None:
+        return None
+    updated_at, latest_review_at, _, related_built_at = freshness
+    return max(filter(None, [updated_at, latest_review_at, related_built_at]))
+
+
+@condition(etag_func=_product_detail_etag, last_modified_func=_product_detail_last_modified)
 def product_detail(request, slug):
     """Product detail page."""
     product = get_object_or_404(
-        Product.objects.select_related('category', 'subcategory').prefetch_related('reviews__user'),
+        Product.objects.select_related('category', 'subcategory'),
         slug=slug, is_active=True
     )
     
-    # Related products
-    related_products = Product.objects.filter(
-        category=product.category, is_active=True
-    ).exclude(id=product.id)[:4]
+    # First page of reviews; the rest load through product_reviews
+    reviews = _review_page(product.pk)
+    
+    # Related products: precomputed co-purchases, topped up from the category
+    related_products = recommendations.get_related_products(product)
     
     # Check if in wishlist
     in_wishlist = False
     if request.user.is_authenticated:
         in_wishlist = Wishlist.objects.filter(user=request.user, product=product).exists()
     
-    return render(request, 'store/product_detail.html', {
+    response = render(request, 'store/product_detail.html', {
         'product': product,
+        'reviews': reviews,
         'related_products': related_products,
         'in_wishlist': in_wishlist,
     })
+    # Anonymous pages may be stored by shared caches but are revalidated
+    # against the ETag; signed-in pages stay in the browser cache only
+    if request.user.is_authenticated:
+        patch_cache_control(response, private=True, no_cache=True)
+    else:
+        patch_cache_control(response, public=True, no_cache=True)
+    patch_vary_headers(response, ['Cookie'])
+    return response
+
+
+def _review_page(product_id, cursor=None):
+    """One keyset page of a product's reviews, newest first."""
+    reviews = (
+        Review.objects.filter(product_id=product_id)
+        .select_related('user')
+        .only('rating', 'comment', 'created_at', 'product_id', 'user__username')
+    )
+    # Reviews share the products' newest-first (created_at, id) ordering
+    return pagination.paginate(
+        reviews, pagination.DEFAULT_SORT, cursor, per_page=pagination.REVIEW_PAGE_SIZE
+    )
+
+
+@require_GET
+def product_reviews(request, slug):
+    """Next page of a product's reviews as an HTML fragment."""
+    product = get_object_or_404(Product.objects.only('pk', 'slug'), slug=slug, is_active=True)
+    reviews = _review_page(product.pk, request.GET.get('cursor'))
+    
+    return render(request, 'store/_review_list.html', {
+        'product': product,
+        'reviews': reviews,
+    })
 
 
 @login_required
@@ -153,8 +383,10 @@ def toggle_wishlist(request, product_id):
     
     if not created:
         wishlist_item.delete()
+        services.adjust_user_count(request.user.pk, 'wishlist', -1)
         messages.info(request, f'Removed "{product.name}" from wishlist.')
     else:
+        services.adjust_user_count(request.user.pk, 'wishlist', 1)
         messages.success(request, f'Added "{product.name}" to wishlist.')
     
     # SEC-02: Validate redirect URL to prevent open redirect